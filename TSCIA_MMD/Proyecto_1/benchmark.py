@@ -0,0 +1,402 @@
+"""
+Mediciones de rendimiento de las operaciones del gestor de archivos.
+
+Genera una database sintética con el esquema de la real (clientes,
+factura_enc, factura_det, localidades, ...) escalada a la cantidad de filas
+pedida para factura_det, y mide sin pedir datos al operador:
+leer_archivo (en frío y desde la caché), guardar_archivo, _buscar_fila_csv
+(por ID y por texto), comparador._comparar_csv y convertir_csv_a_json.
+
+Cada caso corre en un proceso nuevo (así el pico de memoria es solo el suyo)
+y se repite varias veces: se informan los percentiles 50/95/99 de la
+latencia, las filas por segundo y el pico de RSS del proceso. Los resultados
+se pueden guardar como base y comparar en corridas siguientes: si un caso es
+más lento o usa más memoria que la base, más allá de la tolerancia, el
+programa termina con código 1.
+
+Uso:
+    python benchmark.py --filas 10000 1000000 --guardar-base
+    python benchmark.py --filas 10000 1000000 --comparar [--tolerancia 0.25]
+    python benchmark.py --filas 10000000 --carpeta /tmp/bench --repeticiones 3
+
+La database sintética se genera en una carpeta aparte (nunca en database/ ni
+tablas_hist/ del proyecto); con --carpeta se conserva y se reutiliza entre
+corridas con la misma cantidad de filas.
+"""
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import builtins
+import argparse
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.abspath(__file__))
+ARCHIVO_BASE = os.path.join(DIRECTORIO_PROYECTO, "benchmark_base.json")
+
+# Tablas chicas que se copian tal cual de la database del proyecto
+TABLAS_FIJAS = ("pais.csv", "provincias.csv", "rubro.csv", "productos.csv",
+                "sucursales.csv", "condicion_iva.csv", "proveedores.csv")
+
+# Filas por bloque al generar (la memoria no depende del tamaño pedido)
+FILAS_POR_BLOQUE = 1_000_000
+
+NOMBRES = ("Lucía", "Martín", "Camila", "Juan", "Sofía", "Diego", "Valentina", "Pablo")
+APELLIDOS = ("Fernández", "Gómez", "Rodríguez", "López", "Martínez", "Pérez", "García", "Sosa")
+CALLES = ("Calle Falsa", "Avenida Imaginaria", "Pasaje Inventado", "Diagonal Norte")
+
+# Texto buscado en clientes.csv por el caso buscar_texto
+TEXTO_BUSCADO = "Sosa"
+
+# --- Generación de la database sintética ---
+
+def _escribir_bloques(ruta, bloques):
+    """Escribe los DataFrame de bloques uno detrás de otro, sin encabezado (como la database)"""
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        for bloque in bloques:
+            bloque.to_csv(f, header=False, index=False)
+
+def _contar_filas(ruta):
+    with open(ruta, 'rb') as f:
+        return sum(1 for _ in f)
+
+def _rangos(total):
+    for inicio in range(0, total, FILAS_POR_BLOQUE):
+        yield inicio, min(inicio + FILAS_POR_BLOQUE, total)
+
+def _localidades(cantidad, provincias, rng):
+    for inicio, fin in _rangos(cantidad):
+        ids = np.arange(inicio + 1, fin + 1)
+        yield pd.DataFrame({
+            0: ids,
+            1: pd.Series(ids).map(lambda i: f"Localidad {i}"),
+            2: rng.integers(1, provincias + 1, fin - inicio),
+        })
+
+def _clientes(cantidad, localidades, rng):
+    for inicio, fin in _rangos(cantidad):
+        n = fin - inicio
+        ids = np.arange(inicio + 1, fin + 1)
+        nombres = np.char.add(np.char.add(np.array(NOMBRES)[rng.integers(0, len(NOMBRES), n)], " "),
+                              np.array(APELLIDOS)[rng.integers(0, len(APELLIDOS), n)])
+        calles = np.char.add(np.char.add(np.array(CALLES)[rng.integers(0, len(CALLES), n)], " "),
+                             rng.integers(1, 5000, n).astype(str))
+        yield pd.DataFrame({
+            0: ids,
+            1: nombres,
+            2: 10_000_000 + ids,
+            3: calles,
+            4: rng.integers(1, localidades + 1, n),
+        })
+
+def _facturas_enc(cantidad, clientes, sucursales, rng):
+    inicio_fechas = np.datetime64('2025-01-01')
+    for inicio, fin in _rangos(cantidad):
+        n = fin - inicio
+        ids = np.arange(inicio + 1, fin + 1)
+        sucursal = rng.integers(1, sucursales + 1, n)
+        numeros = pd.Series(sucursal).map("F{:04d}-".format) + pd.Series(ids).map("{:08d}".format)
+        yield pd.DataFrame({
+            0: ids,
+            1: numeros,
+            2: (inicio_fechas + rng.integers(0, 365, n)).astype(str),
+            3: rng.integers(1, clientes + 1, n),
+            4: sucursal,
+        })
+
+def _facturas_det(cantidad, facturas, productos, rng):
+    """Bloques (database, histórico) de factura_det: el histórico difiere en ~1,5% de las filas"""
+    for inicio, fin in _rangos(cantidad):
+        n = fin - inicio
+        ids = np.arange(inicio + 1, fin + 1)
+        actual = pd.DataFrame({
+            0: ids,
+            1: np.sort(rng.integers(1, facturas + 1, n)),
+            2: rng.integers(1, productos + 1, n),
+            3: rng.integers(1, 11, n),
+        })
+        hist = actual.copy()
+        hist.loc[ids % 100 == 0, 3] += 1          # Modificadas desde el histórico
+        hist = hist[ids % 200 != 1]                # Agregadas después del histórico
+        extra = hist[ids[hist.index] % 400 == 7].copy()
+        extra[0] += cantidad                       # Eliminadas desde el histórico
+        yield actual, pd.concat([hist, extra])
+
+def generar_database(carpeta, filas, semilla=0):
+    """
+    Genera en carpeta una database (y su tablas_hist) con el esquema de la real,
+    con filas filas en factura_det y las demás tablas en proporción.
+    """
+    marca = os.path.join(carpeta, "generado.json")
+    if os.path.exists(marca):
+        with open(marca, 'r', encoding='utf-8') as f:
+            if json.load(f) == {'filas': filas, 'semilla': semilla}:
+                return
+    shutil.rmtree(carpeta, ignore_errors=True)
+    database = os.path.join(carpeta, "database")
+    hist = os.path.join(carpeta, "tablas_hist")
+    os.makedirs(database)
+    os.makedirs(hist)
+
+    origen = os.path.join(DIRECTORIO_PROYECTO, "database")
+    for nombre in TABLAS_FIJAS:
+        shutil.copy(os.path.join(origen, nombre), os.path.join(database, nombre))
+    cantidad = {nombre: _contar_filas(os.path.join(database, nombre)) for nombre in TABLAS_FIJAS}
+
+    rng = np.random.default_rng(semilla)
+    localidades = max(filas // 1000, _contar_filas(os.path.join(origen, "localidades.csv")))
+    clientes = max(filas // 20, 30)
+    facturas = max(filas // 4, 1)
+    _escribir_bloques(os.path.join(database, "localidades.csv"),
+                      _localidades(localidades, cantidad["provincias.csv"], rng))
+    _escribir_bloques(os.path.join(database, "clientes.csv"), _clientes(clientes, localidades, rng))
+    _escribir_bloques(os.path.join(database, "factura_enc.csv"),
+                      _facturas_enc(facturas, clientes, cantidad["sucursales.csv"], rng))
+
+    with open(os.path.join(database, "factura_det.csv"), 'w', encoding='utf-8', newline='') as f_db, \
+         open(os.path.join(hist, "factura_det_hist.csv"), 'w', encoding='utf-8', newline='') as f_hist:
+        for actual, anterior in _facturas_det(filas, facturas, cantidad["productos.csv"], rng):
+            actual.to_csv(f_db, header=False, index=False)
+            anterior.to_csv(f_hist, header=False, index=False)
+
+    with open(marca, 'w', encoding='utf-8') as f:
+        json.dump({'filas': filas, 'semilla': semilla}, f)
+
+# --- Casos medidos ---
+# Cada caso es (preparar, medir, filas procesadas). preparar corre antes de
+# cada repetición fuera de la medición y devuelve el argumento de medir.
+
+class _Respuestas:
+    """Reemplaza input() por respuestas fijas, para correr las funciones interactivas"""
+    def __init__(self, respuestas):
+        self.respuestas = list(respuestas)
+
+    def __enter__(self):
+        self.original = builtins.input
+        pendientes = iter(self.respuestas)
+        builtins.input = lambda mensaje="": next(pendientes)
+        return self
+
+    def __exit__(self, *error):
+        builtins.input = self.original
+
+def _casos(filas):
+    from herramientas import (leer_archivo, guardar_archivo, limpiar_cache, _buscar_fila_csv,
+                              ruta_database, ruta_hist)
+    from comparador import _comparar_csv
+    from json_csv import convertir_csv_a_json
+
+    clientes = _contar_filas(ruta_database("clientes.csv"))
+
+    def sin_preparar():
+        return None
+
+    def leer_frio(_):
+        limpiar_cache()
+        leer_archivo("factura_det.csv")
+
+    def leer_cache(_):
+        leer_archivo("factura_det.csv")
+
+    def preparar_guardar():
+        return leer_archivo("factura_det.csv")
+
+    def guardar(df):
+        guardar_archivo(df, "factura_det.csv")
+
+    def buscar_id(_):
+        with _Respuestas(["1", str(filas // 2)]):
+            _buscar_fila_csv("factura_det.csv")
+
+    def buscar_texto(_):
+        # La última respuesta cierra el paginador de resultados
+        with _Respuestas(["3", TEXTO_BUSCADO, ""]):
+            _buscar_fila_csv("clientes.csv")
+
+    def comparar(_):
+        _comparar_csv("factura_det.csv", ruta_database("factura_det.csv"), ruta_hist("factura_det.csv"))
+
+    def preparar_convertir():
+        # Se convierte una copia: la conversión reemplaza el CSV por el JSON
+        if os.path.exists(ruta_database("factura_conv.json")):
+            os.remove(ruta_database("factura_conv.json"))
+        shutil.copy(ruta_database("factura_det.csv"), ruta_database("factura_conv.csv"))
+
+    def convertir(_):
+        convertir_csv_a_json("factura_conv.csv")
+
+    return {
+        'leer_frio': (sin_preparar, leer_frio, filas),
+        'leer_cache': (sin_preparar, leer_cache, filas),
+        'buscar_id': (sin_preparar, buscar_id, filas),
+        'buscar_texto': (sin_preparar, buscar_texto, clientes),
+        'comparar_csv': (sin_preparar, comparar, filas),
+        'guardar': (preparar_guardar, guardar, filas),
+        'convertir_json': (preparar_convertir, convertir, filas),
+    }
+
+CASOS = ('leer_frio', 'leer_cache', 'buscar_id', 'buscar_texto', 'comparar_csv', 'guardar', 'convertir_json')
+
+def _pico_rss_mb():
+    """Pico de memoria residente del proceso, en MB (None si no se puede saber)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB y macOS bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+def _correr_caso(carpeta, filas, caso, repeticiones, calentamiento, cola):
+    """Proceso hijo: mide un caso y devuelve el resultado por la cola"""
+    try:
+        os.chdir(carpeta)
+        salida = io.StringIO()
+        with redirect_stdout(salida):
+            preparar, medir, procesadas = _casos(filas)[caso]
+            latencias = []
+            for i in range(calentamiento + repeticiones):
+                argumento = preparar()
+                inicio = time.perf_counter()
+                medir(argumento)
+                duracion = time.perf_counter() - inicio
+                if i >= calentamiento:
+                    latencias.append(duracion)
+                salida.seek(0)
+                salida.truncate()
+        p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+        cola.put({
+            'p50_ms': p50 * 1000, 'p95_ms': p95 * 1000, 'p99_ms': p99 * 1000,
+            'filas_por_s': procesadas / p50 if p50 > 0 else None,
+            'rss_mb': _pico_rss_mb(), 'repeticiones': repeticiones,
+        })
+    except Exception as e:
+        cola.put({'error': f"{type(e).__name__}: {e}"})
+
+def medir_caso(carpeta, filas, caso, repeticiones=5, calentamiento=1):
+    """Mide un caso en un proceso nuevo. Devuelve el dict de resultados"""
+    contexto = multiprocessing.get_context('spawn')
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=_correr_caso,
+                               args=(carpeta, filas, caso, repeticiones, calentamiento, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+# --- Informe y comparación con la base ---
+
+def _clave(caso, filas):
+    return f"{caso}@{filas}"
+
+def _formato(valor, decimales=1):
+    return "-" if valor is None else f"{valor:,.{decimales}f}"
+
+def informar(filas, resultados):
+    print(f"\nFilas en factura_det: {filas:,}")
+    print(f"{'Caso':<16}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'filas/s':>16}{'RSS MB':>10}")
+    print("-" * 78)
+    for caso, r in resultados.items():
+        if 'error' in r:
+            print(f"{caso:<16}✗ {r['error']}")
+            continue
+        print(f"{caso:<16}{_formato(r['p50_ms']):>12}{_formato(r['p95_ms']):>12}{_formato(r['p99_ms']):>12}"
+              f"{_formato(r['filas_por_s'], 0):>16}{_formato(r['rss_mb']):>10}")
+
+def cargar_base(ruta):
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def guardar_base(ruta, resultados):
+    """Agrega los resultados a la base (reemplaza los casos ya medidos)"""
+    base = cargar_base(ruta)
+    base.update({clave: r for clave, r in resultados.items() if 'error' not in r})
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(base, f, indent=2, sort_keys=True)
+    print(f"✓ Base guardada en: {ruta}")
+
+def regresiones(resultados, base, tolerancia, margen_ms=5.0):
+    """
+    Casos más lentos (p50) o con más memoria (RSS) que la base más allá de la
+    tolerancia relativa. Las diferencias de latencia menores a margen_ms no
+    cuentan: en los casos de pocos milisegundos son ruido.
+    """
+    encontradas = []
+    for clave, r in resultados.items():
+        anterior = base.get(clave)
+        if anterior is None or 'error' in r:
+            continue
+        limite = anterior['p50_ms'] * (1 + tolerancia)
+        if r['p50_ms'] > limite and r['p50_ms'] - anterior['p50_ms'] > margen_ms:
+            encontradas.append((clave, 'p50', anterior['p50_ms'], r['p50_ms'], 'ms'))
+        if r.get('rss_mb') and anterior.get('rss_mb') and r['rss_mb'] > anterior['rss_mb'] * (1 + tolerancia):
+            encontradas.append((clave, 'RSS', anterior['rss_mb'], r['rss_mb'], 'MB'))
+    return encontradas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mediciones de rendimiento sobre una database sintética")
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000],
+                        help="filas de factura_det de cada escala (ej: 10000 1000000 10000000)")
+    parser.add_argument('--casos', nargs='+', choices=CASOS, default=list(CASOS))
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--calentamiento', type=int, default=1, help="repeticiones previas que no se miden")
+    parser.add_argument('--carpeta', help="carpeta para la database sintética (se conserva)")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--base', default=ARCHIVO_BASE, help="archivo JSON con la base de comparación")
+    parser.add_argument('--guardar-base', action='store_true', help="guarda los resultados como base")
+    parser.add_argument('--comparar', action='store_true', help="falla si hay regresiones respecto de la base")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="aumento relativo admitido (0.25 = 25%%)")
+    parser.add_argument('--salida', help="guarda los resultados de esta corrida en un JSON")
+    args = parser.parse_args(argv)
+
+    raiz = os.path.abspath(args.carpeta) if args.carpeta else tempfile.mkdtemp(prefix="benchmark_")
+    resultados = {}
+    try:
+        for filas in args.filas:
+            carpeta = os.path.join(raiz, f"filas_{filas}")
+            print(f"Generando database sintética ({filas:,} filas) en {carpeta}...")
+            generar_database(carpeta, filas, args.semilla)
+            por_caso = {}
+            for caso in args.casos:
+                por_caso[caso] = medir_caso(carpeta, filas, caso, args.repeticiones, args.calentamiento)
+                resultados[_clave(caso, filas)] = por_caso[caso]
+            informar(filas, por_caso)
+    finally:
+        if not args.carpeta:
+            shutil.rmtree(raiz, ignore_errors=True)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, sort_keys=True)
+    if args.guardar_base:
+        guardar_base(args.base, resultados)
+
+    codigo = 1 if any('error' in r for r in resultados.values()) else 0
+    if args.comparar:
+        base = cargar_base(args.base)
+        if not base:
+            print(f"✗ No hay base para comparar en {args.base} (usar --guardar-base)")
+            return 1
+        encontradas = regresiones(resultados, base, args.tolerancia)
+        for clave, medida, anterior, actual, unidad in encontradas:
+            print(f"✗ Regresión en {clave}: {medida} {actual:,.1f} {unidad} "
+                  f"(base {anterior:,.1f} {unidad}, {actual / anterior - 1:+.0%})")
+        if encontradas:
+            codigo = 1
+        else:
+            print(f"✓ Sin regresiones respecto de la base (tolerancia {args.tolerancia:.0%})")
+    return codigo
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Módulo de bloqueos entre procesos sobre las tablas de database.
+
+Varios operadores pueden trabajar sobre la misma carpeta (por ejemplo, en un
+recurso compartido). Cada tabla tiene un archivo de bloqueo en
+metadatos/bloqueos: las lecturas toman un bloqueo compartido (pueden leer
+muchos a la vez) y las escrituras uno exclusivo (un solo escritor, y nadie
+lee la tabla a mitad de una escritura). Se usan bloqueos POSIX (fcntl.lockf),
+que también funcionan sobre NFS. En sistemas sin fcntl (Windows) no se
+bloquea entre procesos.
+
+Los bloqueos son reentrantes dentro del proceso: una escritura que relee la
+tabla o actualiza sus metadatos no se bloquea a sí misma. Solo duran lo que
+dura la lectura o la escritura; lo que el operador hace entre una y otra lo
+protege la verificación de versión de herramientas.guardar_archivo.
+"""
+import os
+import time
+import errno
+from contextlib import contextmanager, ExitStack
+from herramientas import CARPETA_META
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+CARPETA_BLOQUEOS = os.path.join(CARPETA_META, "bloqueos")
+
+# Segundos que se espera un bloqueo antes de desistir
+TIEMPO_ESPERA = 30
+# Segundos de espera a partir de los cuales se avisa al operador
+AVISO_ESPERA = 1
+INTERVALO_REINTENTO = 0.05
+
+# Bloqueos tomados por este proceso: tabla -> {'archivo', 'exclusivo'}
+_tomados = {}
+
+class TablaBloqueada(OSError):
+    """Otro proceso retuvo la tabla más allá del tiempo de espera"""
+
+def _ruta_bloqueo(nombre_archivo):
+    return os.path.join(CARPETA_BLOQUEOS, os.path.basename(nombre_archivo) + ".lock")
+
+def _tomar(archivo, nombre_archivo, exclusivo):
+    """Toma el bloqueo reintentando hasta TIEMPO_ESPERA segundos"""
+    modo = (fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH) | fcntl.LOCK_NB
+    inicio = time.monotonic()
+    avisado = False
+    while True:
+        try:
+            fcntl.lockf(archivo, modo)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EACCES, errno.EAGAIN):
+                raise
+        esperado = time.monotonic() - inicio
+        if esperado >= TIEMPO_ESPERA:
+            raise TablaBloqueada(f"la tabla {nombre_archivo} está en uso por otro operador")
+        if not avisado and esperado >= AVISO_ESPERA:
+            print(f"Esperando a que otro operador libere {nombre_archivo}...")
+            avisado = True
+        time.sleep(INTERVALO_REINTENTO)
+
+@contextmanager
+def _bloqueo(nombre_archivo, exclusivo):
+    if fcntl is None:
+        yield
+        return
+
+    tomado = _tomados.get(nombre_archivo)
+    if tomado is not None:
+        # Ya lo tiene este proceso: si hace falta se pasa a exclusivo y al salir se vuelve
+        subir = exclusivo and not tomado['exclusivo']
+        if subir:
+            _tomar(tomado['archivo'], nombre_archivo, True)
+            tomado['exclusivo'] = True
+        try:
+            yield
+        finally:
+            if subir:
+                fcntl.lockf(tomado['archivo'], fcntl.LOCK_SH)
+                tomado['exclusivo'] = False
+        return
+
+    os.makedirs(CARPETA_BLOQUEOS, exist_ok=True)
+    archivo = open(_ruta_bloqueo(nombre_archivo), 'a+')
+    try:
+        _tomar(archivo, nombre_archivo, exclusivo)
+    except BaseException:
+        archivo.close()
+        raise
+    _tomados[nombre_archivo] = {'archivo': archivo, 'exclusivo': exclusivo}
+    try:
+        yield
+    finally:
+        del _tomados[nombre_archivo]
+        fcntl.lockf(archivo, fcntl.LOCK_UN)
+        archivo.close()
+
+def bloqueo_lectura(nombre_archivo):
+    """Bloqueo compartido de la tabla (context manager)"""
+    return _bloqueo(nombre_archivo, exclusivo=False)
+
+@contextmanager
+def bloqueo_escritura(*nombres_archivo):
+    """
+    Bloqueo exclusivo de una o más tablas (context manager). Se toman siempre en
+    el mismo orden para que dos escritores no se esperen mutuamente.
+    """
+    with ExitStack() as pila:
+        for nombre_archivo in sorted(set(nombres_archivo)):
+            pila.enter_context(_bloqueo(nombre_archivo, exclusivo=True))
+        yield
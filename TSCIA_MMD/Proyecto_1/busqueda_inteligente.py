@@ -1,9 +1,18 @@
-import pandas as pd
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+np = modulo_perezoso("numpy")
 import os
 import unicodedata
-from herramientas import CARPETA_DATABASE, CARPETA_HIST, leer_archivo
+from herramientas import CARPETA_DATABASE, CARPETA_HIST, leer_archivo, ruta_lectura, firma_archivo
+from metricas import medir, contar_cache
 import json 
 
+# Diccionarios de búsqueda cacheados: (tabla, columna_id, columna_nombre) -> entrada
+_cache_busqueda = {}
+
+# Cantidad de textos que pasan a la comparación por distancia de edición
+MAX_PRESELECCION_DIFUSA = 50
+
 def normalizar_texto(texto):
     """
     Normaliza texto: quita acentos, convierte a minúsculas, elimina espacios extras Y COMILLAS
@@ -22,49 +31,12 @@ def normalizar_texto(texto):
     texto = ' '.join(texto.split())
     return texto
 
-def crear_diccionario_busqueda(tabla_referencia, columna_id=0, columna_nombre=1):
-    """
-    Crea un diccionario de búsqueda: texto_normalizado -> ID
-    """
-    diccionario = {}
-    
-    if isinstance(tabla_referencia, pd.DataFrame):
-        # Es un DataFrame CSV
-        print(f"🔍 Procesando DataFrame con {len(tabla_referencia)} filas")
-        for idx, fila in tabla_referencia.iterrows():
-            if len(fila) > max(columna_id, columna_nombre):
-                id_valor = str(fila[columna_id])
-                nombre_valor = str(fila[columna_nombre])
-                
-                # DEBUG: Mostrar lo que se está procesando
-                print(f"   Fila {idx}: ID='{id_valor}', Nombre='{nombre_valor}'")
-                
-                texto_normalizado = normalizar_texto(nombre_valor)
-                if texto_normalizado:
-                    diccionario[texto_normalizado] = id_valor
-                    print(f"   ✅ Agregado: '{texto_normalizado}' -> {id_valor}")
-    else:
-        # Es JSON
-        print(f"🔍 Procesando JSON con {len(tabla_referencia)} elementos")
-        for item in tabla_referencia:
-            if isinstance(item, dict):
-                # Buscar campos ID y nombre
-                id_valor = None
-                nombre_valor = None
-                for key, value in item.items():
-                    if 'id' in key.lower() or key == 'columna_0':
-                        id_valor = str(value)
-                    elif 'nombre' in key.lower() or 'descripcion' in key.lower() or key == 'columna_1':
-                        nombre_valor = str(value)
-                
-                if id_valor and nombre_valor:
-                    texto_normalizado = normalizar_texto(nombre_valor)
-                    if texto_normalizado:
-                        diccionario[texto_normalizado] = id_valor
-                        print(f"   ✅ Agregado: '{texto_normalizado}' -> {id_valor}")
-    
-    print(f"📚 Diccionario final: {len(diccionario)} entradas")
-    return diccionario
+def normalizar_serie(serie):
+    """Versión vectorizada de normalizar_texto para una columna completa"""
+    texto = serie.astype(str).where(serie.notna(), '')
+    texto = texto.str.strip('"\'').str.normalize('NFKD')
+    texto = texto.str.encode('ascii', 'ignore').str.decode('ascii')
+    return texto.str.lower().str.replace(r'\s+', ' ', regex=True).str.strip()
 
 def cargar_tabla_referencia(nombre_tabla):
     """
@@ -89,28 +61,7 @@ def cargar_tabla_referencia(nombre_tabla):
     
     return None
 
-def buscar_id_por_nombre(nombre_tabla, texto_busqueda, columna_id=0, columna_nombre=1):
-    """
-    Busca un ID por nombre en una tabla de referencia
-    """
-    tabla = cargar_tabla_referencia(nombre_tabla)
-    if tabla is None:
-        return None
-    
-    diccionario = crear_diccionario_busqueda(tabla, columna_id, columna_nombre)
-    texto_normalizado = normalizar_texto(texto_busqueda)
-    
-    # Búsqueda exacta
-    if texto_normalizado in diccionario:
-        return diccionario[texto_normalizado]
-    
-    # Búsqueda parcial
-    for texto_ref, id_valor in diccionario.items():
-        if texto_normalizado in texto_ref or texto_ref in texto_normalizado:
-            return id_valor
-    
-    return None
-
+@medir('crear_diccionario_busqueda', filas=lambda diccionario, tabla, *args, **kwargs: len(tabla))
 def crear_diccionario_busqueda(tabla_referencia, columna_id=0, columna_nombre=1):
     """
     Crea un diccionario de búsqueda: texto_normalizado -> ID
@@ -118,14 +69,14 @@ def crear_diccionario_busqueda(tabla_referencia, columna_id=0, columna_nombre=1)
     diccionario = {}
     
     if isinstance(tabla_referencia, pd.DataFrame):
-        # Es un DataFrame CSV
-        for idx, fila in tabla_referencia.iterrows():
-            if len(fila) > max(columna_id, columna_nombre):
-                id_valor = str(fila[columna_id])
-                nombre_valor = str(fila[columna_nombre])
-                texto_normalizado = normalizar_texto(nombre_valor)
-                if texto_normalizado:
-                    diccionario[texto_normalizado] = id_valor
+        # Es un DataFrame CSV (vectorizado por columna)
+        if columna_id not in tabla_referencia.columns or columna_nombre not in tabla_referencia.columns:
+            return diccionario
+        ids = tabla_referencia[columna_id].astype(str).tolist()
+        nombres = normalizar_serie(tabla_referencia[columna_nombre]).tolist()
+        for texto_normalizado, id_valor in zip(nombres, ids):
+            if texto_normalizado:
+                diccionario[texto_normalizado] = id_valor
     else:
         # Es JSON
         for item in tabla_referencia:
@@ -146,6 +97,129 @@ def crear_diccionario_busqueda(tabla_referencia, columna_id=0, columna_nombre=1)
     
     return diccionario
 
+def obtener_diccionario_busqueda(nombre_tabla, columna_id=0, columna_nombre=1):
+    """
+    Devuelve el diccionario de búsqueda de la tabla desde la caché. Se vuelve a
+    crear solo si el archivo de la tabla cambió (mtime/tamaño).
+    """
+    ruta = ruta_lectura(nombre_tabla)
+    firma = firma_archivo(ruta) if ruta else None
+    clave = (nombre_tabla, columna_id, columna_nombre)
+    
+    entrada = _cache_busqueda.get(clave)
+    acierto = entrada is not None and entrada['firma'] == firma
+    contar_cache('busqueda', acierto)
+    if acierto:
+        return entrada
+    
+    tabla = cargar_tabla_referencia(nombre_tabla)
+    if tabla is None:
+        return None
+    
+    diccionario = crear_diccionario_busqueda(tabla, columna_id, columna_nombre)
+    entrada = {
+        'firma': firma,
+        'diccionario': diccionario,
+        # Orden de inserción: desempata igual que el recorrido lineal original
+        'orden': {texto: i for i, texto in enumerate(diccionario)},
+        'trigramas': None,
+        'difuso': None,
+    }
+    _cache_busqueda[clave] = entrada
+    return entrada
+
+def _trigramas_busqueda(entrada):
+    """Índice trigrama -> textos del diccionario (se arma la primera vez que se usa)"""
+    if entrada['trigramas'] is None:
+        trigramas = {}
+        for texto in entrada['diccionario']:
+            for i in range(len(texto) - 2):
+                trigramas.setdefault(texto[i:i + 3], set()).add(texto)
+        entrada['trigramas'] = trigramas
+    return entrada['trigramas']
+
+def _textos_que_contienen(entrada, texto_normalizado):
+    """Textos del diccionario que contienen la búsqueda (vía trigramas)"""
+    if len(texto_normalizado) < 3:
+        return [t for t in entrada['diccionario'] if texto_normalizado in t]
+    trigramas = _trigramas_busqueda(entrada)
+    candidatos = None
+    for i in range(len(texto_normalizado) - 2):
+        textos = trigramas.get(texto_normalizado[i:i + 3], set())
+        candidatos = textos if candidatos is None else candidatos & textos
+        if not candidatos:
+            return []
+    return [t for t in candidatos if texto_normalizado in t]
+
+def _textos_contenidos_en(entrada, texto_normalizado):
+    """Textos del diccionario que aparecen dentro de la búsqueda"""
+    diccionario = entrada['diccionario']
+    largo = len(texto_normalizado)
+    encontrados = []
+    for inicio in range(largo):
+        for fin in range(inicio + 1, largo + 1):
+            if texto_normalizado[inicio:fin] in diccionario:
+                encontrados.append(texto_normalizado[inicio:fin])
+    return encontrados
+
+def buscar_id_por_nombre(nombre_tabla, texto_busqueda, columna_id=0, columna_nombre=1):
+    """
+    Busca un ID por nombre en una tabla de referencia
+    """
+    entrada = obtener_diccionario_busqueda(nombre_tabla, columna_id, columna_nombre)
+    if entrada is None:
+        return None
+    
+    diccionario = entrada['diccionario']
+    texto_normalizado = normalizar_texto(texto_busqueda)
+    
+    # Búsqueda exacta
+    if texto_normalizado in diccionario:
+        return diccionario[texto_normalizado]
+    
+    if not texto_normalizado:
+        return _buscar_sin_normalizar(nombre_tabla, texto_busqueda, columna_id, columna_nombre)
+    
+    # Búsqueda parcial: gana el primero en el orden de la tabla
+    coincidencias = _textos_que_contienen(entrada, texto_normalizado)
+    coincidencias += _textos_contenidos_en(entrada, texto_normalizado)
+    if coincidencias:
+        return diccionario[min(coincidencias, key=entrada['orden'].get)]
+    
+    return None
+
+def _pares_id_nombre(tabla, columna_id, columna_nombre):
+    """(id, nombre) de cada fila, con los mismos campos que crear_diccionario_busqueda"""
+    if isinstance(tabla, pd.DataFrame):
+        if columna_id in tabla.columns and columna_nombre in tabla.columns:
+            yield from zip(tabla[columna_id].astype(str), tabla[columna_nombre])
+        return
+    for item in tabla:
+        if not isinstance(item, dict):
+            continue
+        id_valor = nombre_valor = None
+        for key, value in item.items():
+            if 'id' in key.lower() or key == 'columna_0':
+                id_valor = str(value)
+            elif 'nombre' in key.lower() or 'descripcion' in key.lower() or key == 'columna_1':
+                nombre_valor = value
+        if id_valor and nombre_valor is not None:
+            yield id_valor, nombre_valor
+
+def _buscar_sin_normalizar(nombre_tabla, texto_busqueda, columna_id, columna_nombre):
+    """
+    Búsqueda de solo signos que la normalización descarta (¿, °, ...): primer ID
+    cuyo nombre contiene el texto tal cual, sin distinguir mayúsculas.
+    """
+    buscado = str(texto_busqueda).strip().lower()
+    tabla = cargar_tabla_referencia(nombre_tabla) if buscado else None
+    if tabla is None:
+        return None
+    for id_valor, nombre in _pares_id_nombre(tabla, columna_id, columna_nombre):
+        if not pd.isna(nombre) and buscado in str(nombre).lower():
+            return id_valor
+    return None
+
 def mostrar_opciones_tabla(nombre_tabla, columna_nombre=1):
     """
     Muestra las opciones disponibles en una tabla de referencia
@@ -169,9 +243,80 @@ def mostrar_opciones_tabla(nombre_tabla, columna_nombre=1):
                         print(f"  - {value}")
                         break
 
-def input_con_busqueda_inteligente(prompt, nombre_tabla_referencia, columna_id=0, columna_nombre=1):
+def _distancia_edicion(a, b, limite):
+    """Distancia de Levenshtein entre a y b; corta y devuelve limite + 1 si lo supera"""
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        if min(actual) > limite:
+            return limite + 1
+        anterior = actual
+    return anterior[-1]
+
+def _trigramas_con_borde(texto):
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+def _indice_difuso(entrada):
+    """Índice trigrama (con bordes) -> posiciones de los textos, para la búsqueda difusa"""
+    if entrada.get('difuso') is None:
+        textos = list(entrada['diccionario'])
+        trigramas = {}
+        for pos, texto in enumerate(textos):
+            for trigrama in _trigramas_con_borde(texto):
+                trigramas.setdefault(trigrama, []).append(pos)
+        trigramas = {t: np.array(posiciones, dtype=np.int32) for t, posiciones in trigramas.items()}
+        entrada['difuso'] = (textos, trigramas)
+    return entrada['difuso']
+
+def buscar_candidatos(nombre_tabla, texto_busqueda, k=5, columna_id=0, columna_nombre=1):
+    """
+    Búsqueda tolerante a errores de tipeo (ej: 'tandl' -> 'tandil').
+    Preselecciona por trigramas compartidos y ordena por distancia de edición.
+    Devuelve hasta k tuplas (texto, id, puntaje) con puntaje entre 0 y 1.
+    """
+    entrada = obtener_diccionario_busqueda(nombre_tabla, columna_id, columna_nombre)
+    texto_normalizado = normalizar_texto(texto_busqueda)
+    if entrada is None or not texto_normalizado:
+        return []
+    
+    textos, trigramas = _indice_difuso(entrada)
+    trigramas_busqueda = _trigramas_con_borde(texto_normalizado)
+    
+    # Los trigramas muy comunes casi no discriminan: se usan solo si no hay otros
+    limite_comun = max(50, len(textos) // 5)
+    listas = [trigramas[t] for t in trigramas_busqueda if t in trigramas]
+    raras = [lista for lista in listas if len(lista) <= limite_comun]
+    
+    if not listas:
+        return []
+    compartidos = np.bincount(np.concatenate(raras or listas), minlength=len(textos))
+    cantidad = min(MAX_PRESELECCION_DIFUSA, len(textos))
+    preseleccion = np.argpartition(-compartidos, cantidad - 1)[:cantidad]
+    preseleccion = [int(pos) for pos in preseleccion if compartidos[pos] > 0]
+    
+    resultados = []
+    for pos in preseleccion:
+        texto = textos[pos]
+        largo = max(len(texto), len(texto_normalizado))
+        limite = max(1, largo // 2)
+        distancia = _distancia_edicion(texto_normalizado, texto, limite)
+        if distancia <= limite:
+            resultados.append((texto, entrada['diccionario'][texto], round(1 - distancia / largo, 3), pos))
+    
+    resultados.sort(key=lambda r: (-r[2], r[3]))
+    return [(texto, id_valor, puntaje) for texto, id_valor, puntaje, _ in resultados[:k]]
+
+def input_con_busqueda_inteligente(prompt, nombre_tabla_referencia, columna_id=0, columna_nombre=1,
+                                   permitir_vacio=False):
     """
-    Input que permite búsqueda inteligente en tablas de referencia
+    Input que permite búsqueda inteligente en tablas de referencia.
+    Si no hay coincidencia ofrece sugerencias aproximadas (errores de tipeo).
+    Con permitir_vacio=True, enter devuelve '' (para conservar el valor actual).
     """
     # QUITAR EL DEBUG DE LA TABLA COMPLETA
     # Mostrar opciones disponibles (solo las primeras 10 para no saturar)
@@ -199,39 +344,62 @@ def input_con_busqueda_inteligente(prompt, nombre_tabla_referencia, columna_id=0
             mostrar_opciones_tabla(nombre_tabla_referencia, columna_nombre)
             continue
         
+        if entrada == "" and permitir_vacio:
+            return ""
+        
         # Buscar ID correspondiente
         id_encontrado = buscar_id_por_nombre(nombre_tabla_referencia, entrada, columna_id, columna_nombre)
         
         if id_encontrado:
             print(f"✓ Encontrado: '{entrada}' -> ID {id_encontrado}")
             return id_encontrado
+        
+        sugerencias = buscar_candidatos(nombre_tabla_referencia, entrada, 5, columna_id, columna_nombre)
+        if sugerencias:
+            print("✗ No se encontró coincidencia exacta. ¿Quiso decir...?")
+            for i, (texto, id_valor, puntaje) in enumerate(sugerencias, 1):
+                print(f"  #{i}. {texto} (ID {id_valor}) - {puntaje:.0%}")
+            id_manual = input("Elija '#n', ingrese el ID manualmente o enter para reintentar: ").strip()
+            if id_manual.startswith('#') and id_manual[1:].isdigit():
+                opcion = int(id_manual[1:])
+                if 1 <= opcion <= len(sugerencias):
+                    texto, id_valor, _ = sugerencias[opcion - 1]
+                    print(f"✓ Seleccionado: '{texto}' -> ID {id_valor}")
+                    return id_valor
+                print("Sugerencia fuera de rango.")
+                continue
         else:
             print("✗ No se encontró coincidencia. Intente nuevamente o ingrese el ID manualmente.")
             id_manual = input("O ingrese el ID manualmente (enter para reintentar): ").strip()
-            if id_manual:
-                return id_manual
+        if id_manual:
+            return id_manual
 
-# Mapeo de tablas hijas a sus tablas padre
+# Mapeo de tablas hijas a sus tablas padre (columna de la clave foránea -> tabla)
 RELACIONES_TABLAS = {
     "clientes.csv": {
         "columna_4": "localidades.csv"  # ← EXPLÍCITO: columna 4 usa localidades.csv
     },
-    "proveedores.csv": {
-        "columna_4": "localidades.csv"   # ← Misma lógica
-    },
     "sucursales.csv": {
-        "columna_3": "localidades.csv"   # ← Ajustar según la columna correcta
+        "columna_2": "localidades.csv",
+        "columna_3": "provincias.csv"
     },
     "productos.csv": {
-        "rubro": "rubros.csv",
-        "proveedor": "proveedores.csv"
+        "columna_3": "proveedores.csv",
+        "columna_4": "rubro.csv"
     },
     "factura_enc.csv": {
-        "cliente": "clientes.csv",
-        "sucursal": "sucursales.csv"
+        "columna_3": "clientes.csv",
+        "columna_4": "sucursales.csv"
     },
     "factura_det.csv": {
-        "producto": "productos.csv"
+        "columna_1": "factura_enc.csv",
+        "columna_2": "productos.csv"
+    },
+    "localidades.csv": {
+        "columna_2": "provincias.csv"
+    },
+    "provincias.csv": {
+        "columna_2": "pais.csv"
     }
 }
 
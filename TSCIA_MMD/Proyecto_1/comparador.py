@@ -1,7 +1,13 @@
 import os
-import pandas as pd
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
 import json
-from herramientas import CARPETA_DATABASE, CARPETA_HIST, obtener_formato_archivo
+from herramientas import CARPETA_DATABASE, CARPETA_HIST, FORMATOS_TABLA, obtener_formato_archivo, ruta_hist
+from manifiestos import son_identicos, obtener_manifiesto, bloques_distintos, _canonizar_df
+from metricas import medir, anotar
+
+# Filas por lote al comparar CSV (la memoria no depende del tamaño de la tabla)
+TAMANO_LOTE = 100_000
 
 def listar_archivos_comparables():
     """
@@ -17,8 +23,8 @@ def listar_archivos_comparables():
     for archivo_db in archivos_database:
         # Buscar correspondiente en históricos
         for archivo_hist in archivos_historicos:
-            base_db = archivo_db.replace('.csv', '').replace('.json', '')
-            base_hist = archivo_hist.replace('_hist.csv', '').replace('_hist.json', '')
+            base_db = os.path.splitext(archivo_db)[0]
+            base_hist = os.path.splitext(archivo_hist)[0].replace('_hist', '')
             
             if base_db == base_hist:
                 comparables.append(archivo_db)
@@ -38,7 +44,11 @@ def mostrar_opciones_comparacion():
     
     print("\nArchivos disponibles para comparación:")
     for i, archivo in enumerate(comparables, 1):
-        print(f"{i}. {archivo}")
+        # Solo se usan manifiestos ya calculados: listar no debe leer tablas
+        ruta_h = ruta_hist(archivo)
+        sin_cambios = os.path.exists(ruta_h) and son_identicos(
+            os.path.join(CARPETA_DATABASE, archivo), ruta_h, calcular=False)
+        print(f"{i}. {archivo}{' (sin cambios)' if sin_cambios else ''}")
     
     try:
         seleccion = int(input("Seleccione el número del archivo a comparar: ")) - 1
@@ -62,8 +72,8 @@ def comparar_archivos(nombre_archivo):
     archivo_hist_correspondiente = None
     
     for archivo_hist in archivos_hist:
-        base_nombre = nombre_archivo.replace('.csv', '').replace('.json', '')
-        base_hist = archivo_hist.replace('_hist.csv', '').replace('_hist.json', '')
+        base_nombre = os.path.splitext(nombre_archivo)[0]
+        base_hist = os.path.splitext(archivo_hist)[0].replace('_hist', '')
         
         if base_nombre == base_hist:
             archivo_hist_correspondiente = archivo_hist
@@ -86,87 +96,207 @@ def comparar_archivos(nombre_archivo):
     formato = obtener_formato_archivo(nombre_archivo)
     
     try:
-        if formato == 'csv':
+        # Misma raíz en los manifiestos: el contenido es idéntico, no hace falta comparar
+        if formato == obtener_formato_archivo(hist_path) and son_identicos(database_path, hist_path):
+            _informar_sin_cambios(nombre_archivo, formato, obtener_manifiesto(hist_path)['filas'])
+            return
+        
+        if formato in FORMATOS_TABLA and obtener_formato_archivo(hist_path) in FORMATOS_TABLA:
             _comparar_csv(nombre_archivo, database_path, hist_path)
         elif formato == 'json':
             _comparar_json(nombre_archivo, database_path, hist_path)
     except Exception as e:
         print(f"Error al comparar los archivos: {e}")
 
-def _comparar_csv(nombre_archivo, database_path, hist_path):
-    """Compara archivos CSV"""
-    df_database = pd.read_csv(database_path, header=None, dtype=str)
-    df_hist = pd.read_csv(hist_path, header=None, dtype=str)
-
-    id_col_db = df_database.columns[0]
-    id_col_hist = df_hist.columns[0]
-
-    df_database_idx = df_database.set_index(id_col_db)
-    df_hist_idx = df_hist.set_index(id_col_hist)
-
-    ids_database = set(df_database_idx.index.astype(str))
-    ids_hist = set(df_hist_idx.index.astype(str))
-
-    nuevas = sorted(ids_database - ids_hist, key=lambda x: str(x))
-    eliminadas = sorted(ids_hist - ids_database, key=lambda x: str(x))
-    comunes = sorted(ids_hist & ids_database, key=lambda x: str(x))
+def _informar_sin_cambios(nombre_archivo, formato, filas):
+    """Reporte de comparación cuando los manifiestos indican contenido idéntico"""
+    unidad = "Filas" if formato == 'csv' else "Elementos"
+    texto = "No se modificaron filas" if formato == 'csv' else "No se modificaron elementos"
+    print(f"\nComparando: {nombre_archivo}")
+    print("-" * 70)
+    print(f"{unidad} históric{'a' if formato == 'csv' else 'o'}s: {filas} | {unidad} en database: {filas}")
+    print(f"Cambios detectados: {texto}")
+    print("-" * 70)
 
-    modificadas = []
-    for idx in comunes:
-        fila_hist = df_hist_idx.loc[idx]
-        fila_db = df_database_idx.loc[idx]
+def _leer_lotes_csv(ruta, bloques=None, tamano_bloque=None):
+    """
+    Lee el CSV por lotes de TAMANO_LOTE filas (textos sin espacios sobrantes).
+    Si se indican bloques, solo lee esos bloques de tamano_bloque filas.
+    """
+    if obtener_formato_archivo(ruta) == 'parquet':
+        lotes = _leer_lotes_parquet(ruta)
+    elif bloques is None:
+        lotes = pd.read_csv(ruta, header=None, dtype=str, keep_default_na=False, chunksize=TAMANO_LOTE)
+    else:
+        lotes = _leer_bloques_csv(ruta, bloques, tamano_bloque)
+    for lote in lotes:
+        for col in lote.columns:
+            lote[col] = lote[col].str.strip()
+        yield lote
+
+def _leer_lotes_parquet(ruta):
+    """Lotes de un Parquet con el mismo formato que los del CSV (vacíos como '')"""
+    import pyarrow.parquet as pq
+    for lote in pq.ParquetFile(ruta).iter_batches(batch_size=TAMANO_LOTE):
+        df = lote.to_pandas()
+        df.columns = range(len(df.columns))
+        yield df.fillna('')
+
+def _leer_bloques_csv(ruta, bloques, tamano_bloque):
+    for bloque in bloques:
+        try:
+            yield pd.read_csv(ruta, header=None, dtype=str, keep_default_na=False,
+                              skiprows=bloque * tamano_bloque, nrows=tamano_bloque)
+        except pd.errors.EmptyDataError:
+            continue  # El bloque solo existe en el otro archivo
+
+def _claves_y_hashes(lote, ocurrencias):
+    """
+    Devuelve (clave, id, hash) por fila del lote. La clave distingue IDs repetidos
+    (ej: varios mails del mismo cliente) por número de aparición.
+    """
+    ids = lote.iloc[:, 0].tolist()
+    hashes = pd.util.hash_pandas_object(lote, index=False).tolist()
+    for id_fila, hash_fila in zip(ids, hashes):
+        n = ocurrencias.get(id_fila, 0)
+        ocurrencias[id_fila] = n + 1
+        yield (id_fila, n), id_fila, hash_fila
+
+def diferencias_csv(database_path, hist_path):
+    """
+    Compara dos CSV por ID en memoria acotada: nunca carga las tablas completas,
+    solo un hash por fila del histórico y las filas que difieren.
+    Genera tuplas (tipo, id, fila_hist, fila_db) con tipo 'modificada', 'agregada'
+    o 'eliminada', y al final ('resumen', None, filas_hist, filas_db).
+    """
+    # Con manifiestos vigentes solo se leen los bloques cuyo hash difiere
+    # (lectura por bloques solo para CSV: ambos lados deben ser CSV)
+    bloques = None
+    if obtener_formato_archivo(database_path) == obtener_formato_archivo(hist_path) == 'csv':
+        bloques = bloques_distintos(database_path, hist_path)
+    tamano_bloque = obtener_manifiesto(hist_path)['tamano_bloque'] if bloques is not None else None
+    
+    for cambio in _diferencias_lotes(lambda: _leer_lotes_csv(hist_path, bloques, tamano_bloque),
+                                     lambda: _leer_lotes_csv(database_path, bloques, tamano_bloque)):
+        if cambio[0] == 'resumen' and bloques is not None:
+            cambio = ('resumen', None, obtener_manifiesto(hist_path)['filas'], obtener_manifiesto(database_path)['filas'])
+        yield cambio
 
-        def to_list(r):
-            if hasattr(r, "to_list"):
-                return [str(x).strip() for x in r.to_list()]
-            return [str(r).strip()]
+def _diferencias_lotes(lotes_hist, lotes_db):
+    """
+    Núcleo de diferencias_csv. lotes_hist y lotes_db son funciones que devuelven
+    los lotes (DataFrames de textos) de cada lado; el histórico se recorre dos veces.
+    """
+    # 1) Hash de cada fila histórica
+    hashes_hist = {}
+    filas_hist = 0
+    ocurrencias = {}
+    for lote in lotes_hist():
+        filas_hist += len(lote)
+        for clave, _, hash_fila in _claves_y_hashes(lote, ocurrencias):
+            hashes_hist[clave] = hash_fila
+    
+    # 2) Recorrer database: agregadas salen enseguida, modificadas quedan pendientes
+    modificadas = {}
+    filas_db = 0
+    ocurrencias = {}
+    for lote in lotes_db():
+        filas_db += len(lote)
+        for i, (clave, id_fila, hash_fila) in enumerate(_claves_y_hashes(lote, ocurrencias)):
+            hash_hist = hashes_hist.pop(clave, None)
+            if hash_hist is None:
+                yield ('agregada', id_fila, None, lote.iloc[i].tolist())
+            elif hash_hist != hash_fila:
+                modificadas[clave] = lote.iloc[i].tolist()
+                hashes_hist[clave] = None  # Pendiente: falta la fila histórica
+    
+    # 3) Segunda pasada por el histórico: filas modificadas y eliminadas
+    if hashes_hist:
+        ocurrencias = {}
+        for lote in lotes_hist():
+            for i, (clave, id_fila, _) in enumerate(_claves_y_hashes(lote, ocurrencias)):
+                if clave in modificadas:
+                    yield ('modificada', id_fila, lote.iloc[i].tolist(), modificadas.pop(clave))
+                elif clave in hashes_hist:
+                    yield ('eliminada', id_fila, lote.iloc[i].tolist(), None)
+    
+    yield ('resumen', None, filas_hist, filas_db)
 
-        if to_list(fila_hist) != to_list(fila_db):
-            modificadas.append(idx)
+@medir('comparador.csv')
+def _comparar_csv(nombre_archivo, database_path, hist_path):
+    """Compara archivos CSV"""
+    anotar(bytes_leidos=os.path.getsize(database_path) + os.path.getsize(hist_path))
+    _informar_diferencias_csv(nombre_archivo, diferencias_csv(database_path, hist_path))
+
+def _informar_diferencias_csv(nombre_archivo, diferencias, etiquetas=("Histórico", "Database")):
+    """Imprime el reporte de las diferencias generadas por diferencias_csv"""
+    cambios = {'modificada': [], 'agregada': [], 'eliminada': []}
+    filas_hist = filas_db = 0
+    for tipo, id_fila, fila_hist, fila_db in diferencias:
+        if tipo == 'resumen':
+            filas_hist, filas_db = fila_hist, fila_db
+            anotar(filas=filas_hist + filas_db)
+        else:
+            cambios[tipo].append((id_fila, fila_hist, fila_db))
+    
+    for lista in cambios.values():
+        lista.sort(key=lambda cambio: str(cambio[0]))
+    modificadas = cambios['modificada']
+    nuevas = cambios['agregada']
+    eliminadas = cambios['eliminada']
 
     filas_mod_text = str(len(modificadas)) if modificadas else "No se modificaron filas"
 
     print(f"\nComparando: {nombre_archivo}")
     print("-" * 70)
-    print(f"Filas históricas: {len(df_hist)} | Filas en database: {len(df_database)}")
+    if etiquetas == ("Histórico", "Database"):
+        print(f"Filas históricas: {filas_hist} | Filas en database: {filas_db}")
+    else:
+        print(f"Filas en {etiquetas[0]}: {filas_hist} | Filas en {etiquetas[1]}: {filas_db}")
     print(f"Cambios detectados: {filas_mod_text}")
 
     # FILAS MODIFICADAS
     if modificadas:
         print(f"\nFilas modificadas ({len(modificadas)}):")
-        for idx in modificadas:
-            hist = ", ".join(df_hist_idx.loc[idx].to_list())
-            db = ", ".join(df_database_idx.loc[idx].to_list())
+        for idx, fila_hist, fila_db in modificadas:
+            hist = ", ".join(fila_hist[1:])
+            db = ", ".join(fila_db[1:])
             print(f"  ID {idx}:")
-            print(f"    Histórico → {hist}")
-            print(f"    Database → {db}")
+            print(f"    {etiquetas[0]} → {hist}")
+            print(f"    {etiquetas[1]} → {db}")
 
     # FILAS AGREGADAS
     if nuevas:
         print(f"\nFilas agregadas ({len(nuevas)}):")
-        for idx in nuevas:
-            contenido = ", ".join(df_database_idx.loc[idx].to_list())
+        for idx, _, fila_db in nuevas:
+            contenido = ", ".join(fila_db[1:])
             print(f"  ID {idx}: {contenido}")
 
     # FILAS ELIMINADAS
     if eliminadas:
         print(f"\nFilas eliminadas ({len(eliminadas)}):")
-        for idx in eliminadas:
-            contenido = ", ".join(df_hist_idx.loc[idx].to_list())
+        for idx, fila_hist, _ in eliminadas:
+            contenido = ", ".join(fila_hist[1:])
             print(f"  ID {idx}: {contenido}")
 
     print("-" * 70)
 
+@medir('comparador.json')
 def _comparar_json(nombre_archivo, database_path, hist_path):
     """Compara archivos JSON"""
+    anotar(bytes_leidos=os.path.getsize(database_path) + os.path.getsize(hist_path))
     with open(database_path, 'r', encoding='utf-8') as f:
         datos_db = json.load(f)
     with open(hist_path, 'r', encoding='utf-8') as f:
         datos_hist = json.load(f)
+    _informar_diferencias_json(nombre_archivo, datos_db, datos_hist)
 
+def _informar_diferencias_json(nombre_archivo, datos_db, datos_hist, etiquetas=("Histórico", "Database")):
+    """Compara dos listas JSON por ID e imprime el reporte"""
     if not isinstance(datos_db, list) or not isinstance(datos_hist, list):
         print("Solo se pueden comparar JSON con formato de lista")
         return
+    anotar(filas=len(datos_db) + len(datos_hist))
 
     # Buscar IDs en ambos archivos
     def obtener_ids(datos):
@@ -195,7 +325,10 @@ def _comparar_json(nombre_archivo, database_path, hist_path):
 
     print(f"\nComparando: {nombre_archivo}")
     print("-" * 70)
-    print(f"Elementos históricos: {len(datos_hist)} | Elementos en database: {len(datos_db)}")
+    if etiquetas == ("Histórico", "Database"):
+        print(f"Elementos históricos: {len(datos_hist)} | Elementos en database: {len(datos_db)}")
+    else:
+        print(f"Elementos en {etiquetas[0]}: {len(datos_hist)} | Elementos en {etiquetas[1]}: {len(datos_db)}")
     print(f"Cambios detectados: {elementos_mod_text}")
 
     # ELEMENTOS MODIFICADOS
@@ -203,8 +336,8 @@ def _comparar_json(nombre_archivo, database_path, hist_path):
         print(f"\nElementos modificados ({len(modificadas)}):")
         for idx in modificadas:
             print(f"  ID {idx}:")
-            print(f"    Histórico → {datos_hist[ids_hist[idx]]}")
-            print(f"    Database → {datos_db[ids_db[idx]]}")
+            print(f"    {etiquetas[0]} → {datos_hist[ids_hist[idx]]}")
+            print(f"    {etiquetas[1]} → {datos_db[ids_db[idx]]}")
 
     # ELEMENTOS AGREGADOS
     if nuevas:
@@ -220,10 +353,64 @@ def _comparar_json(nombre_archivo, database_path, hist_path):
 
     print("-" * 70)
 
+@medir('comparador.versiones')
+def comparar_versiones(nombre_archivo, version_a, version_b):
+    """Compara dos versiones registradas de una tabla (la versión 0 es el histórico)"""
+    from versiones import reconstruir_version
+    datos_a = reconstruir_version(nombre_archivo, version_a)
+    datos_b = reconstruir_version(nombre_archivo, version_b)
+    if datos_a is None or datos_b is None:
+        print("No se pudieron reconstruir las versiones indicadas.")
+        return
+    
+    etiquetas = (f"v{version_a}", f"v{version_b}")
+    titulo = f"{nombre_archivo} (v{version_a} → v{version_b})"
+    if obtener_formato_archivo(nombre_archivo) == 'csv':
+        lote_a = _canonizar_df(datos_a)
+        lote_b = _canonizar_df(datos_b)
+        diferencias = _diferencias_lotes(lambda: [lote_a], lambda: [lote_b])
+        _informar_diferencias_csv(titulo, diferencias, etiquetas)
+    else:
+        _informar_diferencias_json(titulo, datos_b, datos_a, etiquetas)
+
+def _elegir_versiones(nombre_archivo, historial):
+    """Muestra el historial de versiones y pide las dos a comparar"""
+    print(f"\nVersiones de {nombre_archivo}:")
+    for v in historial:
+        detalle = "histórico" if v['version'] == 0 else (
+            f"+{v['agregadas']} ~{v['modificadas']} -{v['eliminadas']}")
+        print(f"  v{v['version']}  {v['fecha']}  {v['filas']} filas  ({detalle})")
+    
+    ultima = historial[-1]['version']
+    try:
+        version_a = int(input("Versión anterior (número): ").strip().lstrip('vV'))
+        texto_b = input(f"Versión posterior (Enter = v{ultima}): ").strip().lstrip('vV')
+        version_b = int(texto_b) if texto_b else ultima
+    except ValueError:
+        print("Versión inválida.")
+        return None
+    return version_a, version_b
+
 def menu_comparacion():
     """
     Menú principal de comparación
     """
+    # Se compara contra el archivo en disco: primero se escriben los cambios del WAL
+    from wal import checkpoint_todos
+    checkpoint_todos()
+    
     archivo = mostrar_opciones_comparacion()
-    if archivo:
-        comparar_archivos(archivo)
\ No newline at end of file
+    if not archivo:
+        return
+    
+    from versiones import listar_versiones
+    historial = listar_versiones(archivo)
+    if len(historial) > 1:
+        print("\n1. Comparar Database vs Histórico")
+        print("2. Comparar dos versiones guardadas")
+        if input("Seleccione una opción: ").strip() == '2':
+            seleccion = _elegir_versiones(archivo, historial)
+            if seleccion:
+                comparar_versiones(archivo, *seleccion)
+            return
+    comparar_archivos(archivo)
\ No newline at end of file
@@ -0,0 +1,308 @@
+"""
+Módulo de consultas con joins entre tablas relacionadas.
+
+Una consulta parte de una tabla (por ejemplo factura_det.csv) y pide columnas
+de otras tablas; el camino de joins se arma solo con el grafo de claves
+foráneas de RELACIONES_TABLAS (el más corto, o el que se indique con 'via').
+
+El plan es un árbol con la tabla de partida como raíz: cada tabla se lee una
+vez, del archivo en que está hoy (RELACIONES_TABLAS la nombra .csv aunque se
+haya convertido a JSON o Parquet), con solo las columnas que hacen falta y con
+sus filtros aplicados al leer (en Parquet ni siquiera se decodifican las filas
+descartadas). Los joins se
+hacen de las hojas hacia la raíz, así las tablas chicas (localidades,
+provincias...) se combinan entre sí antes de cruzarse con la tabla grande, y
+cada join es por hash (DataFrame.merge) e interno: una fila cuyo padre fue
+descartado por un filtro queda fuera del resultado.
+
+El resultado de cada subárbol se guarda en caché junto con la firma de sus
+tablas, así las consultas siguientes que comparten subárbol no repiten los joins.
+
+Las columnas del resultado se nombran por su camino desde la tabla de partida:
+"3" es la columna 3 de la tabla de partida, "1>3>1" la columna 1 de la tabla
+a la que se llega por su columna 1 y luego por la columna 3 de esa otra.
+"""
+from collections import OrderedDict, deque
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+from herramientas import leer_archivo, ruta_lectura, firma_archivo, _proyectar_y_filtrar
+from busqueda_inteligente import RELACIONES_TABLAS
+from integridad import _tabla_vigente, _como_dataframe
+
+# Subárboles de join resueltos: clave del subárbol -> (firmas de sus tablas, DataFrame)
+CACHE_MAX_JOINS = 32
+_cache_joins = OrderedDict()
+
+# Agregaciones que operan sobre números (el resto cuenta valores)
+_AGREGACIONES_NUMERICAS = ('sum', 'mean', 'min', 'max', 'median')
+
+def _grafo():
+    """Tabla hija -> [(columna, tabla padre)] según RELACIONES_TABLAS"""
+    grafo = {}
+    for hija, columnas in RELACIONES_TABLAS.items():
+        for clave, padre in columnas.items():
+            grafo.setdefault(hija, []).append((int(str(clave).split('_')[-1]), padre))
+    return grafo
+
+def camino(desde, hasta, via=None):
+    """
+    Aristas (hija, columna, padre) para llegar de una tabla a otra siguiendo
+    claves foráneas. Con via (lista de tablas) se pasa por ellas en ese orden.
+    Lanza ValueError si no hay camino.
+    """
+    grafo = _grafo()
+    aristas = []
+    actual = desde
+    for destino in list(via or []) + [hasta]:
+        # Búsqueda en anchura: el camino más corto (a igual largo, el primero declarado)
+        previo = {actual: None}
+        pendientes = deque([actual])
+        while pendientes and destino not in previo:
+            tabla = pendientes.popleft()
+            for columna, padre in grafo.get(tabla, []):
+                if padre not in previo:
+                    previo[padre] = (tabla, columna)
+                    pendientes.append(padre)
+        if destino not in previo:
+            raise ValueError(f"no hay relación de {actual} a {destino} en RELACIONES_TABLAS")
+        tramo = []
+        tabla = destino
+        while previo[tabla] is not None:
+            hija, columna = previo[tabla]
+            tramo.append((hija, columna, tabla))
+            tabla = hija
+        aristas.extend(reversed(tramo))
+        actual = destino
+    return tuple(aristas)
+
+def etiqueta(aristas, columna):
+    """Nombre de la columna en el resultado: columnas de FK recorridas y columna final"""
+    return ">".join([str(c) for _, c, _ in aristas] + [str(columna)])
+
+# --- Plan ---
+
+def _nodo(plan, aristas, desde):
+    """Nodo del árbol de joins para ese camino (lo crea con sus ancestros)"""
+    for i in range(len(aristas) + 1):
+        prefijo = aristas[:i]
+        if prefijo not in plan:
+            plan[prefijo] = {'tabla': prefijo[-1][2] if prefijo else desde,
+                             'columnas': set(), 'filtros': [], 'hijos': set()}
+            if prefijo:
+                plan[prefijo[:-1]]['hijos'].add(prefijo)
+    return plan[aristas]
+
+def _referencia(desde, referencia):
+    """(tabla, columna) o (tabla, columna, via) -> (aristas, columna)"""
+    tabla, columna = referencia[0], int(referencia[1])
+    via = referencia[2] if len(referencia) > 2 else None
+    return (camino(desde, tabla, via) if tabla != desde or via else ()), columna
+
+def planificar(desde, campos, filtros=None):
+    """
+    Arma el árbol de joins. campos es {alias: (tabla, columna[, via])}; filtros
+    es [(tabla, columna, operador, valor[, via])] con los operadores de
+    leer_archivo. Devuelve (plan, {alias: etiqueta}).
+    """
+    plan = {}
+    _nodo(plan, (), desde)
+    etiquetas = {}
+    for alias, referencia in campos.items():
+        aristas, columna = _referencia(desde, referencia)
+        _nodo(plan, aristas, desde)['columnas'].add(columna)
+        etiquetas[alias] = etiqueta(aristas, columna)
+    for filtro in filtros or []:
+        tabla, columna, operador, valor = filtro[:4]
+        aristas, columna = _referencia(desde, (tabla, columna) + tuple(filtro[4:]))
+        _nodo(plan, aristas, desde)['filtros'].append((columna, operador, valor))
+    return plan, etiquetas
+
+def describir_plan(plan):
+    """Texto con el orden de lectura y joins del plan (de las hojas a la raíz)"""
+    lineas = []
+    for aristas in sorted(plan, key=len, reverse=True):
+        nodo = plan[aristas]
+        nombre = etiqueta(aristas, '*')
+        detalle = f"leer {nodo['tabla']} columnas {sorted(_columnas_nodo(plan, aristas))}"
+        if nodo['filtros']:
+            detalle += f" filtrando {nodo['filtros']}"
+        lineas.append(f"{nombre:<12} {detalle}")
+        for hijo in sorted(nodo['hijos']):
+            lineas.append(f"{'':<12}   join por hash: columna {hijo[-1][1]} = {hijo[-1][2]}.0")
+    return "\n".join(lineas)
+
+def _columnas_nodo(plan, aristas):
+    """Columnas que se leen de la tabla del nodo: las pedidas, sus FK usadas y su ID"""
+    nodo = plan[aristas]
+    columnas = set(nodo['columnas']) | {hijo[-1][1] for hijo in nodo['hijos']}
+    if aristas:
+        columnas.add(0)
+    return columnas
+
+# --- Ejecución ---
+
+def _clave_subarbol(plan, aristas):
+    """Identifica el subárbol por lo que lee y filtra, no por dónde está en la consulta"""
+    nodo = plan[aristas]
+    return (nodo['tabla'], tuple(sorted(_columnas_nodo(plan, aristas))),
+            repr(sorted(nodo['filtros'], key=repr)),
+            tuple(sorted((hijo[-1][1], _clave_subarbol(plan, hijo)) for hijo in nodo['hijos'])))
+
+def _firmas_subarbol(plan, aristas):
+    tablas = [_tabla_vigente(plan[aristas]['tabla'])]
+    for hijo in plan[aristas]['hijos']:
+        tablas.extend(t for t, _ in _firmas_subarbol(plan, hijo))
+    return tuple((tabla, firma_archivo(ruta_lectura(tabla)) if tabla else None) for tabla in tablas)
+
+def _leer_nodo(nodo, columnas):
+    """Tabla del nodo, del archivo en que está hoy, con solo esas columnas y sus filtros"""
+    archivo = _tabla_vigente(nodo['tabla'])
+    if archivo is None:
+        raise ValueError(f"no existe la tabla {nodo['tabla']}")
+    datos = leer_archivo(archivo, columnas=columnas, filtros=nodo['filtros'] or None)
+    if isinstance(datos, list):
+        # JSON: columnas por posición; proyección y filtros en memoria
+        df = _como_dataframe(datos) if datos else pd.DataFrame(columns=columnas)
+        datos = _proyectar_y_filtrar(df, columnas, nodo['filtros'])
+    if not isinstance(datos, pd.DataFrame):
+        raise ValueError(f"no se pudo leer {archivo} como tabla")
+    return datos
+
+def _resolver(plan, aristas):
+    """
+    Resultado del subárbol con columnas nombradas relativas al nodo: "2" para
+    su columna 2, "4>1" para la columna 1 de la tabla unida por su columna 4.
+    """
+    clave = _clave_subarbol(plan, aristas)
+    firmas = _firmas_subarbol(plan, aristas)
+    entrada = _cache_joins.get(clave)
+    if entrada is not None and entrada[0] == firmas:
+        _cache_joins.move_to_end(clave)
+        return entrada[1]
+
+    nodo = plan[aristas]
+    columnas = sorted(_columnas_nodo(plan, aristas))
+    df = _leer_nodo(nodo, columnas)[columnas]
+    df.columns = [str(c) for c in columnas]
+
+    for hijo in sorted(plan[aristas]['hijos']):
+        columna_fk = str(hijo[-1][1])
+        padre = _resolver(plan, hijo).add_prefix(columna_fk + ">")
+        df = df.merge(padre, how='inner', left_on=columna_fk, right_on=columna_fk + ">0")
+
+    _cache_joins[clave] = (firmas, df)
+    while len(_cache_joins) > CACHE_MAX_JOINS:
+        _cache_joins.popitem(last=False)
+    return df
+
+def consultar(desde, campos, filtros=None, calcular=None, agrupar=None, agregar=None, ordenar=None):
+    """
+    Ejecuta una consulta sobre desde y las tablas relacionadas.
+
+    - campos: {alias: (tabla, columna[, via])} columnas del resultado
+    - filtros: [(tabla, columna, operador, valor[, via])], se aplican al leer cada tabla
+    - calcular: {alias: función(DataFrame) -> Serie} columnas derivadas (usar numero())
+    - agrupar: lista de alias; agregar: {alias: (función, alias origen)} con
+      'sum', 'mean', 'min', 'max', 'median', 'count' o 'nunique'
+    - ordenar: alias (o lista) por el que ordenar; con '-' adelante, descendente
+
+    Devuelve un DataFrame.
+    """
+    plan, etiquetas = planificar(desde, campos, filtros)
+    unido = _resolver(plan, ())
+    resultado = unido[list(etiquetas.values())].copy()
+    resultado.columns = list(etiquetas.keys())
+
+    for alias, funcion in (calcular or {}).items():
+        resultado[alias] = funcion(resultado)
+
+    if agregar:
+        columnas = {}
+        for alias, (funcion, origen) in agregar.items():
+            if funcion in _AGREGACIONES_NUMERICAS:
+                resultado[origen] = numero(resultado[origen])
+            columnas[alias] = pd.NamedAgg(column=origen, aggfunc=funcion)
+        if agrupar:
+            resultado = resultado.groupby(list(agrupar), sort=False, observed=True).agg(**columnas).reset_index()
+        else:
+            resultado = pd.DataFrame([{alias: resultado[origen].agg(funcion)
+                                       for alias, (funcion, origen) in agregar.items()}])
+
+    if ordenar:
+        criterios = [ordenar] if isinstance(ordenar, str) else list(ordenar)
+        resultado = resultado.sort_values([c.lstrip('-') for c in criterios],
+                                          ascending=[not c.startswith('-') for c in criterios],
+                                          ignore_index=True)
+    return resultado
+
+def numero(serie):
+    """Serie de textos como números (lo que no es número queda como nulo)"""
+    return pd.to_numeric(serie, errors='coerce')
+
+def limpiar_cache_joins():
+    _cache_joins.clear()
+
+# --- Consultas predefinidas ---
+
+def _importe(df):
+    return numero(df['cantidad']) * numero(df['precio'])
+
+def _consulta_facturacion(agrupar_por, campo, desde_fecha=None, hasta_fecha=None):
+    """Total facturado (cantidad x precio) agrupado por un campo relacionado"""
+    filtros = []
+    if desde_fecha:
+        filtros.append(('factura_enc.csv', 2, '>=', desde_fecha))
+    if hasta_fecha:
+        filtros.append(('factura_enc.csv', 2, '<=', hasta_fecha))
+    return consultar(
+        'factura_det.csv',
+        campos={agrupar_por: campo,
+                'factura': ('factura_enc.csv', 0),
+                'cantidad': ('factura_det.csv', 3),
+                'precio': ('productos.csv', 2)},
+        filtros=filtros,
+        calcular={'importe': _importe},
+        agrupar=[agrupar_por],
+        agregar={'facturas': ('nunique', 'factura'), 'unidades': ('sum', 'cantidad'), 'total': ('sum', 'importe')},
+        ordenar='-total',
+    )
+
+CONSULTAS_PREDEFINIDAS = {
+    'Total facturado por provincia del cliente': (
+        'provincia', ('provincias.csv', 1, ['factura_enc.csv', 'clientes.csv', 'localidades.csv'])),
+    'Total facturado por localidad del cliente': (
+        'localidad', ('localidades.csv', 1, ['factura_enc.csv', 'clientes.csv'])),
+    'Total facturado por sucursal': ('sucursal', ('sucursales.csv', 1)),
+    'Total facturado por rubro': ('rubro', ('rubro.csv', 1)),
+    'Total facturado por cliente': ('cliente', ('clientes.csv', 1)),
+}
+
+def menu_consultas():
+    """Menú de consultas de facturación predefinidas"""
+    titulos = list(CONSULTAS_PREDEFINIDAS)
+    print("\n--- CONSULTAS DE FACTURACIÓN ---")
+    for i, titulo in enumerate(titulos, start=1):
+        print(f"{i}. {titulo}")
+    try:
+        sel = int(input("Seleccione la consulta: ").strip()) - 1
+        if sel < 0 or sel >= len(titulos):
+            print("Selección fuera de rango.")
+            return
+    except ValueError:
+        print("Selección inválida.")
+        return
+    desde_fecha = input("Desde fecha (AAAA-MM-DD, enter = sin límite): ").strip() or None
+    hasta_fecha = input("Hasta fecha (AAAA-MM-DD, enter = sin límite): ").strip() or None
+
+    agrupar_por, campo = CONSULTAS_PREDEFINIDAS[titulos[sel]]
+    try:
+        resultado = _consulta_facturacion(agrupar_por, campo, desde_fecha, hasta_fecha)
+    except ValueError as e:
+        print(f"✗ Error en la consulta: {e}")
+        return
+    from listado_csv import mostrar_resultados
+    print(f"\n{titulos[sel]}")
+    with pd.option_context('display.float_format', '{:,.2f}'.format):
+        mostrar_resultados(resultado, range(len(resultado)), "La consulta no devolvió filas.",
+                           mostrar_indice=False)
+    print()
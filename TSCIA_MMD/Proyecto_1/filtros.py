@@ -0,0 +1,354 @@
+"""
+Módulo de expresiones de filtro para buscar y eliminar filas.
+
+Una expresión combina condiciones sobre columnas con and / or / not y
+paréntesis (también y / o / no), por ejemplo:
+
+    col4 = 12 and col2 ~ "gom" and col0 between 10 and 500
+    (col3 in (1, 2, 5) or col1 !~ perez) and not col4 is null
+
+Condiciones:
+    colN = v, !=, <>, <, <=, >, >=   con un número compara como número; con texto, como texto
+    colN ~ v, colN !~ v              contiene / no contiene v (sin distinguir mayúsculas ni acentos)
+    colN between a and b             a <= colN <= b (extremos incluidos; también "not between")
+    colN in (a, b, ...)              alguno de los valores (también "not in")
+    colN is null, colN is not null   celda vacía / no vacía
+
+Las columnas se nombran por número (col4, columna_4 o 4) o, en tablas JSON,
+por su clave. Los textos con espacios, o que son palabras clave en inglés
+(and, or, not, ...), van entre comillas. Las palabras clave en castellano
+(y, o, no, en, ...) donde va un valor se toman como texto: col1 = o.
+
+La expresión se compila una sola vez (compilar guarda las últimas) a una
+función que calcula la máscara de toda la tabla en una pasada vectorizada:
+cada condición es una operación de pandas sobre la columna completa y se
+combinan con operaciones de numpy. Las igualdades con texto sobre la columna
+de ID (col0 = "7", col0 in ("7", "9")) usan el índice de clave primaria si ya
+está construido; con números se compara como número ("007" = 7), así que se
+recorre la columna y el resultado no depende de que exista el índice. Funciona igual para
+DataFrames y para listas JSON.
+"""
+import re
+from functools import lru_cache
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+np = modulo_perezoso("numpy")
+
+# Palabras clave (en inglés o en castellano) -> forma canónica
+_PALABRAS_CLAVE = {
+    'and': 'and', 'y': 'and', 'or': 'or', 'o': 'or', 'not': 'not', 'no': 'not',
+    'between': 'between', 'entre': 'between', 'in': 'in', 'en': 'in',
+    'is': 'is', 'es': 'is', 'null': 'null', 'nulo': 'null', 'vacio': 'null',
+}
+
+# Las palabras clave en castellano son palabras comunes: donde va un valor son texto
+_CLAVES_COMO_VALOR = {'y', 'o', 'no', 'entre', 'en', 'es', 'nulo', 'vacio'}
+
+_COMPARADORES = {'=': 'eq', '==': 'eq', '!=': 'ne', '<>': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge'}
+
+_TOKEN = re.compile(r'''\s*(?:
+    (?P<numero>-?\d+(?:\.\d+)?)(?=[\s(),=<>!~]|$)
+  | (?P<texto>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<operador>==|!=|<>|<=|>=|!~|=|<|>|~)
+  | (?P<simbolo>[(),])
+  | (?P<palabra>[^\s(),=<>!~"']+)
+)''', re.VERBOSE)
+
+_COLUMNA_NUMERADA = re.compile(r'(?:col|columna_?)?(\d+)', re.IGNORECASE)
+
+def _tokens(expresion):
+    """Lista de (tipo, valor, posición, texto original) de la expresión"""
+    tokens = []
+    pos = 0
+    expresion = expresion.rstrip()
+    while pos < len(expresion):
+        encontrado = _TOKEN.match(expresion, pos)
+        if encontrado is None or encontrado.end() == pos:
+            raise ValueError(f"Carácter inesperado en la posición {pos + 1}: {expresion[pos:pos + 10]!r}")
+        tipo = encontrado.lastgroup
+        valor = original = encontrado.group(tipo)
+        posicion = encontrado.start(tipo) + 1
+        if tipo == 'texto':
+            valor = re.sub(r'\\(.)', r'\1', valor[1:-1])
+        elif tipo == 'numero':
+            valor = float(valor) if '.' in valor else int(valor)
+        elif tipo == 'palabra' and valor.lower() in _PALABRAS_CLAVE:
+            tipo, valor = 'clave', _PALABRAS_CLAVE[valor.lower()]
+        tokens.append((tipo, valor, posicion, original))
+        pos = encontrado.end()
+    return tokens
+
+# --- Análisis sintáctico ---
+# Cada nodo se compila a una función contexto -> máscara (array booleano de numpy)
+
+class _Parser:
+    def __init__(self, expresion):
+        self.tokens = _tokens(expresion)
+        self.pos = 0
+
+    def _actual(self):
+        return self.tokens[self.pos][:3] if self.pos < len(self.tokens) else (None, None, None)
+
+    def _donde(self):
+        t, v, posicion = self._actual()
+        return "al final" if t is None else f"en la posición {posicion} ({v!r})"
+
+    def _es(self, tipo, valor=None):
+        t, v, _ = self._actual()
+        return t == tipo and (valor is None or v == valor)
+
+    def _tomar(self, tipo=None, valor=None, esperado=None):
+        t, v, _ = self._actual()
+        if t is None or (tipo is not None and t != tipo) or (valor is not None and v != valor):
+            raise ValueError(f"Se esperaba {esperado or valor or tipo} {self._donde()}")
+        self.pos += 1
+        return v
+
+    def analizar(self):
+        if not self.tokens:
+            raise ValueError("La expresión está vacía")
+        nodo = self._o()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Sobra algo {self._donde()}")
+        return nodo
+
+    def _o(self):
+        partes = [self._y()]
+        while self._es('clave', 'or'):
+            self.pos += 1
+            partes.append(self._y())
+        if len(partes) == 1:
+            return partes[0]
+        return lambda ctx: np.logical_or.reduce([parte(ctx) for parte in partes])
+
+    def _y(self):
+        partes = [self._no()]
+        while self._es('clave', 'and'):
+            self.pos += 1
+            partes.append(self._no())
+        if len(partes) == 1:
+            return partes[0]
+        return lambda ctx: np.logical_and.reduce([parte(ctx) for parte in partes])
+
+    def _no(self):
+        if self._es('clave', 'not'):
+            self.pos += 1
+            interno = self._no()
+            return lambda ctx: ~interno(ctx)
+        if self._es('simbolo', '('):
+            self.pos += 1
+            nodo = self._o()
+            self._tomar('simbolo', ')')
+            return nodo
+        return self._condicion()
+
+    def _valor(self):
+        t, v, _ = self._actual()
+        if t in ('numero', 'texto', 'palabra'):
+            self.pos += 1
+            return v
+        if t == 'clave' and self.tokens[self.pos][3].lower() in _CLAVES_COMO_VALOR:
+            self.pos += 1
+            return self.tokens[self.pos - 1][3]
+        raise ValueError(f"Se esperaba un valor {self._donde()}")
+
+    def _condicion(self):
+        t, columna, _ = self._actual()
+        if t not in ('palabra', 'numero'):
+            raise ValueError(f"Se esperaba una columna {self._donde()}")
+        self.pos += 1
+        columna = str(columna)
+
+        if self._es('operador'):
+            operador = self._tomar('operador')
+            valor = self._valor()
+            if operador in ('~', '!~'):
+                return _contiene(columna, valor, negado=operador == '!~')
+            return _comparacion(columna, _COMPARADORES[operador], valor)
+
+        negado = False
+        if self._es('clave', 'not'):
+            self.pos += 1
+            negado = True
+        if self._es('clave', 'between'):
+            self.pos += 1
+            desde = self._valor()
+            self._tomar('clave', 'and', esperado="'and' del between")
+            hasta = self._valor()
+            nodo = _entre(columna, desde, hasta)
+            return (lambda ctx: ~nodo(ctx)) if negado else nodo
+        if self._es('clave', 'in'):
+            self.pos += 1
+            self._tomar('simbolo', '(')
+            valores = [self._valor()]
+            while self._es('simbolo', ','):
+                self.pos += 1
+                valores.append(self._valor())
+            self._tomar('simbolo', ')')
+            nodo = _en(columna, valores)
+            return (lambda ctx: ~nodo(ctx)) if negado else nodo
+        if self._es('clave', 'is') and not negado:
+            self.pos += 1
+            if self._es('clave', 'not'):
+                self.pos += 1
+                negado = True
+            self._tomar('clave', 'null')
+            return _nulo(columna, negado)
+        self._tomar(esperado=f"un operador después de la columna '{columna}'")
+
+# --- Condiciones ---
+
+def _es_numero(valor):
+    return isinstance(valor, (int, float))
+
+def _como_texto(serie):
+    """Valores como texto sin espacios (nulos y vacíos -> NaN)"""
+    texto = serie.astype(str).str.strip()
+    return texto.where(serie.notna() & (texto != ''))
+
+def _como_numero(texto):
+    """Valores como número (los que no son números -> NaN)"""
+    try:
+        # Conversión directa: mucho más rápida cuando todos los valores son números
+        return texto.astype('float64')
+    except (ValueError, TypeError):
+        return pd.to_numeric(texto, errors='coerce')
+
+def _columna(ctx, nombre, forma):
+    """
+    Columna de la tabla en la forma pedida ('texto', 'numero' o 'normalizada').
+    Cada forma se calcula una sola vez por evaluación aunque varias condiciones
+    usen la misma columna.
+    """
+    clave = (nombre, forma)
+    if clave not in ctx['columnas']:
+        serie = ctx['df'][_resolver_columna(ctx['df'], nombre)]
+        if forma == 'texto':
+            resultado = _como_texto(serie)
+        elif forma == 'numero':
+            resultado = _como_numero(_columna(ctx, nombre, 'texto'))
+        else:
+            from busqueda_inteligente import normalizar_serie
+            resultado = normalizar_serie(serie)
+        ctx['columnas'][clave] = resultado
+    return ctx['columnas'][clave]
+
+def _resolver_columna(df, nombre):
+    """colN / columna_N / N -> columna N; en JSON también el nombre de la clave"""
+    if nombre in df.columns:
+        return nombre
+    numerada = _COLUMNA_NUMERADA.fullmatch(nombre)
+    if numerada:
+        numero = int(numerada.group(1))
+        if numero in df.columns:
+            return numero
+        if numero < len(df.columns):
+            return df.columns[numero]
+    raise ValueError(f"La tabla no tiene la columna '{nombre}'")
+
+def _comparar(serie, metodo, valor):
+    return getattr(serie, metodo)(valor).fillna(False).to_numpy(dtype=bool)
+
+def _por_indice(ctx, columna, valores):
+    """
+    Máscara de las filas con esos IDs desde el índice de clave primaria, o None si
+    no aplica. Solo para valores de texto: el índice compara el texto exacto.
+    """
+    indice = ctx['indice_id']
+    if indice is None or any(_es_numero(valor) for valor in valores):
+        return None
+    if _resolver_columna(ctx['df'], columna) != ctx['columna_id']:
+        return None
+    mascara = np.zeros(len(ctx['df']), dtype=bool)
+    for valor in valores:
+        mascara[indice.get(str(valor).strip(), [])] = True
+    return mascara
+
+def _comparacion(columna, metodo, valor):
+    def evaluar(ctx):
+        if metodo == 'eq':
+            por_indice = _por_indice(ctx, columna, [valor])
+            if por_indice is not None:
+                return por_indice
+        if _es_numero(valor):
+            return _comparar(_columna(ctx, columna, 'numero'), metodo, valor)
+        return _comparar(_columna(ctx, columna, 'texto'), metodo, str(valor))
+    return evaluar
+
+def _contiene(columna, valor, negado):
+    from busqueda_inteligente import normalizar_texto
+    buscado = normalizar_texto(str(valor))
+    def evaluar(ctx):
+        mascara = _columna(ctx, columna, 'normalizada').str.contains(buscado, regex=False).to_numpy(dtype=bool)
+        return ~mascara if negado else mascara
+    return evaluar
+
+def _entre(columna, desde, hasta):
+    numerico = _es_numero(desde) and _es_numero(hasta)
+    def evaluar(ctx):
+        if numerico:
+            serie = _columna(ctx, columna, 'numero')
+            return _comparar(serie, 'ge', desde) & _comparar(serie, 'le', hasta)
+        serie = _columna(ctx, columna, 'texto')
+        return _comparar(serie, 'ge', str(desde)) & _comparar(serie, 'le', str(hasta))
+    return evaluar
+
+def _en(columna, valores):
+    textos = [str(v).strip() for v in valores]
+    numeros = [v for v in valores if _es_numero(v)]
+    def evaluar(ctx):
+        por_indice = _por_indice(ctx, columna, valores)
+        if por_indice is not None:
+            return por_indice
+        mascara = _columna(ctx, columna, 'texto').isin(textos).to_numpy(dtype=bool)
+        if numeros:
+            mascara = mascara | _columna(ctx, columna, 'numero').isin(numeros).to_numpy(dtype=bool)
+        return mascara
+    return evaluar
+
+def _nulo(columna, negado):
+    def evaluar(ctx):
+        mascara = _columna(ctx, columna, 'texto').isna().to_numpy(dtype=bool)
+        return ~mascara if negado else mascara
+    return evaluar
+
+# --- Uso ---
+
+@lru_cache(maxsize=128)
+def compilar(expresion):
+    """
+    Compila la expresión a una función (datos, nombre_archivo=None) -> máscara
+    booleana de numpy con una posición por fila/elemento. Lanza ValueError si
+    la expresión no es válida.
+    """
+    nodo = _Parser(expresion).analizar()
+
+    def filtro(datos, nombre_archivo=None):
+        if isinstance(datos, pd.DataFrame):
+            df = datos
+            columna_id = 0 if 0 in df.columns else None
+        else:
+            df = pd.DataFrame([e if isinstance(e, dict) else {'valor': e} for e in datos])
+            columna_id = next((k for k in df.columns if 'id' in str(k).lower() or k == 'columna_0'), None)
+        if len(df) == 0:
+            return np.zeros(0, dtype=bool)
+        indice_id = None
+        if nombre_archivo is not None and columna_id is not None:
+            from herramientas import indice_pk_vigente
+            indice_id = indice_pk_vigente(nombre_archivo, len(df))
+        ctx = {'df': df, 'columnas': {}, 'indice_id': indice_id, 'columna_id': columna_id}
+        return np.asarray(nodo(ctx), dtype=bool)
+    return filtro
+
+def mascara(datos, expresion, nombre_archivo=None):
+    """Máscara de las filas de datos (DataFrame o lista JSON) que cumplen la expresión"""
+    return compilar(expresion.strip())(datos, nombre_archivo)
+
+def posiciones(datos, expresion, nombre_archivo=None):
+    """Posiciones de las filas que cumplen la expresión"""
+    return np.flatnonzero(mascara(datos, expresion, nombre_archivo))
+
+AYUDA = """Expresión de filtro, por ejemplo:
+  col4 = 12 and col1 ~ gom and col0 between 10 and 500
+  (col3 in (1, 2, 5) or col1 !~ "perez") and not col4 is null
+Operadores: = != < <= > >=  ~ (contiene)  !~  [not] between .. and ..  [not] in (..)  is [not] null"""
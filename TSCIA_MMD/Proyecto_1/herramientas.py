@@ -1,10 +1,38 @@
 import os
-import pandas as pd
+import csv
+import io
+import shutil
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+np = modulo_perezoso("numpy")
 import json
+from collections import OrderedDict
+from metricas import medir, tramo, anotar, contar_cache, cantidad_filas
 
 # Configuración de carpetas
 CARPETA_DATABASE = "database"
 CARPETA_HIST = "tablas_hist"
+CARPETA_META = "metadatos"
+
+# Formatos cuyas tablas se manejan como DataFrame (filas y columnas)
+FORMATOS_TABLA = ('csv', 'parquet')
+
+# Filas por grupo en Parquet: cada grupo guarda mínimo/máximo por columna, así
+# los filtros de leer_archivo saltean grupos completos sin leerlos
+PARQUET_FILAS_POR_GRUPO = 50_000
+
+# Secuencias de IDs por tabla (persistidas junto a database)
+ARCHIVO_SECUENCIAS = os.path.join(CARPETA_META, "secuencias.json")
+_secuencias = None
+
+# Índices de clave primaria en memoria: ruta -> (firma, {id: [posiciones]}, filas)
+_indices_pk = {}
+
+# Caché de tablas leídas: ruta -> (firma, datos, bytes)
+# La firma (mtime + tamaño) invalida la entrada si el archivo cambia en disco
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+_cache_tablas = OrderedDict()
+_cache_bytes = 0
 
 def ruta_database(nombre_archivo):
     return os.path.join(CARPETA_DATABASE, nombre_archivo)
@@ -13,6 +41,16 @@ def ruta_hist(nombre_archivo):
     base, ext = os.path.splitext(nombre_archivo)
     return os.path.join(CARPETA_HIST, f"{base}_hist{ext}")
 
+def ruta_lectura(nombre_archivo):
+    """Ruta desde la que se lee la tabla: database, o tablas_hist si no existe. None si no hay ninguna"""
+    ruta = ruta_database(nombre_archivo)
+    if os.path.exists(ruta):
+        return ruta
+    ruta = ruta_hist(nombre_archivo)
+    if os.path.exists(ruta):
+        return ruta
+    return None
+
 def existe_en_database(nombre_archivo):
     return os.path.exists(ruta_database(nombre_archivo))
 
@@ -22,46 +60,337 @@ def obtener_formato_archivo(nombre_archivo):
         return 'json'
     elif nombre_archivo.lower().endswith('.csv'):
         return 'csv'
+    elif nombre_archivo.lower().endswith('.parquet'):
+        return 'parquet'
     return None
 
-def leer_archivo(nombre_archivo, formato=None):
+def firma_archivo(ruta):
+    """Devuelve (mtime, tamaño) del archivo, o None si no existe"""
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _copiar_datos(datos):
+    """Copia los datos para que el llamador pueda modificarlos sin tocar la caché"""
+    if isinstance(datos, pd.DataFrame):
+        return datos.copy()
+    if isinstance(datos, list):
+        return [dict(item) if isinstance(item, dict) else item for item in datos]
+    return json.loads(json.dumps(datos))
+
+def _limpiar_comillas(df):
+    """Quita comillas sobrantes al inicio/final de cada celda (vectorizado por columna)"""
+    for col in df.columns:
+        if df[col].notna().any():
+            df[col] = df[col].str.strip('"\'')
+    return df
+
+def _normalizar_como_lectura(datos):
+    """
+    Deja un DataFrame recién guardado igual a como lo devolvería leer_archivo:
+    columnas 0..n, índice 0..n, textos sin comillas y celdas vacías como NaN.
+    """
+    df = datos.reset_index(drop=True)
+    df.columns = range(len(df.columns))
+    for col in df.columns:
+        serie = df[col]
+        texto = serie.astype(str).str.strip('"\'')
+        df[col] = texto.where(serie.notna() & (texto != ''))
+    return df
+
+def _tamano_datos(datos, ruta):
+    """Estima los bytes que ocupa en memoria una tabla cacheada"""
+    if isinstance(datos, pd.DataFrame):
+        return int(datos.memory_usage(deep=True).sum())
+    # Para JSON se estima con el tamaño del archivo (los objetos ocupan más)
+    return os.path.getsize(ruta) * 4
+
+def _quitar_de_cache(ruta):
+    global _cache_bytes
+    entrada = _cache_tablas.pop(ruta, None)
+    if entrada is not None:
+        _cache_bytes -= entrada[2]
+
+def _guardar_en_cache(ruta, datos):
+    """Guarda una copia de los datos en la caché y expulsa las menos usadas (LRU)"""
+    global _cache_bytes
+    _quitar_de_cache(ruta)
+    firma = firma_archivo(ruta)
+    if firma is None:
+        return
+    tamano = _tamano_datos(datos, ruta)
+    if tamano > CACHE_MAX_BYTES:
+        return
+    _cache_tablas[ruta] = (firma, _copiar_datos(datos), tamano)
+    _cache_bytes += tamano
+    while _cache_bytes > CACHE_MAX_BYTES and _cache_tablas:
+        ruta_vieja, (_, _, tamano_viejo) = _cache_tablas.popitem(last=False)
+        _cache_bytes -= tamano_viejo
+
+def _obtener_de_cache(ruta):
+    """Devuelve una copia de los datos cacheados si el archivo no cambió, o None"""
+    entrada = _cache_tablas.get(ruta)
+    if entrada is None:
+        return None
+    if entrada[0] != firma_archivo(ruta):
+        _quitar_de_cache(ruta)
+        return None
+    _cache_tablas.move_to_end(ruta)
+    return _copiar_datos(entrada[1])
+
+def limpiar_cache():
+    """Vacía la caché de tablas"""
+    global _cache_bytes
+    _cache_tablas.clear()
+    _cache_bytes = 0
+
+class _ListaLeida(list):
+    """Lista JSON devuelta por leer_archivo, con la versión de la tabla que se leyó"""
+    version_tabla = None
+
+def _marcar_version(datos, nombre_archivo, firma):
+    """Anota en los datos de qué tabla y de qué versión (firma) se leyeron"""
+    version = (nombre_archivo, firma)
+    if isinstance(datos, pd.DataFrame):
+        datos.attrs['version_tabla'] = version
+    elif isinstance(datos, list):
+        datos = _ListaLeida(datos)
+        datos.version_tabla = version
+    return datos
+
+def version_leida(datos):
+    """(tabla, firma) con la que leer_archivo devolvió los datos, o None"""
+    if isinstance(datos, pd.DataFrame):
+        return datos.attrs.get('version_tabla')
+    return getattr(datos, 'version_tabla', None)
+
+def _cambiada_desde_lectura(datos, nombre_archivo):
+    """
+    True si los datos se leyeron de esta tabla y otro proceso la cambió desde
+    entonces: escribirlos pisaría sus cambios. Se consulta con el bloqueo de
+    escritura tomado, justo antes de escribir.
+    """
+    version = version_leida(datos)
+    if version is None or version[0] != nombre_archivo:
+        return False
+    ruta = ruta_lectura(nombre_archivo)
+    return version[1] != (firma_archivo(ruta) if ruta else None)
+
+def _informar_conflicto(nombre_archivo):
+    _quitar_de_cache(ruta_database(nombre_archivo))
+    print(f"✗ Otro operador modificó {nombre_archivo} desde que se leyó. "
+          f"No se guardaron los cambios: vuelva a realizar la operación.")
+
+@medir('leer_archivo', filas=lambda datos, *args, **kwargs: cantidad_filas(datos))
+def leer_archivo(nombre_archivo, formato=None, columnas=None, filtros=None):
     """
     Lee archivo desde database. Si no existe, busca en tablas_hist.
-    Devuelve DataFrame para CSV, dict para JSON, o None si error.
+    Devuelve DataFrame para CSV y Parquet, dict para JSON, o None si error.
+    Las lecturas repetidas de un archivo sin cambios se sirven desde la caché.
+    
+    Para tablas, columnas (lista de números de columna) y filtros (lista de
+    (columna, operador, valor) con '==', '!=', '<', '<=', '>', '>=', 'in' o
+    'not in'; un valor int o float se compara como número y el resto como
+    texto) limitan lo que se devuelve (con índice 0..n
+    nuevo, sin las posiciones originales). En Parquet se
+    resuelven al leer: solo se decodifican esas columnas y los grupos de filas
+    que pueden cumplir los filtros de texto.
+    
+    La lectura se hace con el bloqueo compartido de la tabla, así nunca ve una
+    escritura de otro proceso a medias. Los datos quedan marcados con la versión
+    leída: si se guardan después de que otro operador cambió la tabla,
+    guardar_archivo no los escribe.
     """
+    from bloqueos import bloqueo_lectura, TablaBloqueada
+    try:
+        with bloqueo_lectura(nombre_archivo):
+            return _leer_archivo(nombre_archivo, formato, columnas, filtros)
+    except TablaBloqueada as e:
+        print(f"✗ Error leyendo archivo {nombre_archivo}: {e}")
+        return None
+
+def _leer_archivo(nombre_archivo, formato, columnas, filtros):
     if formato is None:
         formato = obtener_formato_archivo(nombre_archivo)
     
-    # Primero buscar en database
-    ruta = ruta_database(nombre_archivo)
-    if not os.path.exists(ruta):
-        # Si no existe en database, buscar en hist
-        ruta = ruta_hist(nombre_archivo)
-        if not os.path.exists(ruta):
+    # Primero buscar en database; si no existe, en hist
+    ruta = ruta_lectura(nombre_archivo)
+    if ruta is None:
+        return None
+    firma = firma_archivo(ruta)
+    
+    from wal import hay_pendientes, aplicar_pendientes
+    parcial = columnas is not None or bool(filtros)
+    datos = _obtener_de_cache(ruta)
+    contar_cache('tablas', datos is not None)
+    if datos is None and parcial and formato == 'parquet' and not hay_pendientes(nombre_archivo):
+        datos = _leer_parquet(ruta, nombre_archivo, columnas, filtros)
+        if datos is None:
             return None
-    
+        anotar(bytes_leidos=firma[1])
+        parcial = False  # Ya viene proyectado y filtrado
+    elif datos is None:
+        datos = _leer_ruta(ruta, nombre_archivo, formato)
+        if datos is None:
+            return None
+        anotar(bytes_leidos=firma[1])
+        if hay_pendientes(nombre_archivo):
+            # Cambios confirmados en el WAL que todavía no se escribieron en la tabla
+            datos = aplicar_pendientes(nombre_archivo, datos)
+        _guardar_en_cache(ruta, datos)
+    
+    datos = _marcar_version(datos, nombre_archivo, firma)
+    if parcial and isinstance(datos, pd.DataFrame):
+        datos = _proyectar_y_filtrar(datos, columnas, filtros)
+    return datos
+
+def _leer_ruta(ruta, nombre_archivo, formato):
+    """Parsea el archivo en disco (sin pasar por la caché)"""
     try:
         if formato == 'csv':
-            # LEER CSV CON COMILLAS - agregar quoting
-            df = pd.read_csv(ruta, header=None, dtype=str, quoting=1)  # quoting=1 para QUOTE_ALL
-            # Limpiar comillas de todas las celdas
-            df = df.map(lambda x: str(x).strip('"\'') if pd.notna(x) else x)
-            return df
+            # LEER CSV CON COMILLAS - el parser ya quita las comillas dobles de cada campo
+            with tramo('leer_archivo.parseo_csv'):
+                df = pd.read_csv(ruta, header=None, dtype=str, quoting=1)  # quoting=1 para QUOTE_ALL
+            # Limpiar comillas sobrantes (por ejemplo 'simples') columna por columna
+            with tramo('leer_archivo.comillas'):
+                datos = _limpiar_comillas(df)
         elif formato == 'json':
-            with open(ruta, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with tramo('leer_archivo.parseo_json'), open(ruta, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        elif formato == 'parquet':
+            return _leer_parquet(ruta, nombre_archivo)
         else:
             return None
     except Exception as e:
         print(f"Error leyendo archivo {nombre_archivo}: {e}")
         return None
+    return datos
+
+def _leer_csv_por_lotes(ruta, tamano_lote):
+    """Lotes del CSV con el mismo formato que leer_archivo (sin pasar por la caché)"""
+    for lote in pd.read_csv(ruta, header=None, dtype=str, quoting=1, chunksize=tamano_lote):
+        yield _limpiar_comillas(lote)
+
+# Operadores de filtro -> método de pandas.Series equivalente
+_OPERADORES_FILTRO = {
+    '==': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge',
+}
+
+def _es_filtro_numerico(filtro):
+    """Un filtro con valor int o float compara números ('10' > '5'), no textos"""
+    operador, valor = filtro[1], filtro[2]
+    return operador in _OPERADORES_FILTRO and isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+def _como_numero(serie):
+    """Valores como número (los que no son números -> NaN)"""
+    try:
+        # Conversión directa: mucho más rápida cuando todos los valores son números
+        return serie.astype('float64')
+    except (ValueError, TypeError):
+        return pd.to_numeric(serie, errors='coerce')
 
+def mascara_filtros(df, filtros):
+    """Serie booleana con las filas que cumplen todos los filtros (columna, operador, valor)"""
+    mascara = pd.Series(True, index=df.index)
+    for col, operador, valor in filtros:
+        if _es_filtro_numerico((col, operador, valor)):
+            mascara &= getattr(_como_numero(df[col]), _OPERADORES_FILTRO[operador])(valor).fillna(False)
+        elif operador in _OPERADORES_FILTRO:
+            mascara &= getattr(df[col], _OPERADORES_FILTRO[operador])(str(valor)).fillna(False)
+        elif operador == 'in':
+            mascara &= df[col].isin([str(v) for v in valor])
+        elif operador == 'not in':
+            mascara &= ~df[col].isin([str(v) for v in valor])
+        else:
+            raise ValueError(f"Operador de filtro no soportado: {operador}")
+    return mascara
+
+def _proyectar_y_filtrar(df, columnas, filtros):
+    """Aplica en memoria los mismos filtros/proyección que Parquet resuelve al leer"""
+    if filtros:
+        df = df[mascara_filtros(df, filtros)].reset_index(drop=True)
+    if columnas is not None:
+        df = df[list(columnas)]
+    return df
+
+def _requiere_pyarrow():
+    """pyarrow solo hace falta para Parquet: se importa recién al usarlo"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("✗ El formato Parquet necesita el paquete 'pyarrow' (pip install pyarrow)")
+        return False
+    return True
+
+def _leer_parquet(ruta, nombre_archivo, columnas=None, filtros=None):
+    """
+    Lee un Parquet como DataFrame de textos con columnas numeradas, igual que un
+    CSV. Con columnas/filtros solo se leen esas columnas y los grupos de filas
+    cuyas estadísticas pueden cumplir los filtros. Las columnas se guardan como
+    texto, así que los filtros numéricos se aplican después de leer.
+    """
+    if not _requiere_pyarrow():
+        return None
+    import pyarrow.parquet as pq
+    numericos = [filtro for filtro in filtros or [] if _es_filtro_numerico(filtro)]
+    de_texto = [filtro for filtro in filtros or [] if not _es_filtro_numerico(filtro)]
+    leidas = columnas
+    if columnas is not None and numericos:
+        leidas = list(columnas) + [col for col, _, _ in numericos if col not in columnas]
+    try:
+        nombres = None if leidas is None else [str(c) for c in leidas]
+        condiciones = None
+        if de_texto:
+            condiciones = [(str(col), operador, [str(v) for v in valor] if operador in ('in', 'not in') else str(valor))
+                           for col, operador, valor in de_texto]
+        tabla = pq.read_table(ruta, columns=nombres, filters=condiciones)
+    except Exception as e:
+        print(f"Error leyendo archivo {nombre_archivo}: {e}")
+        return None
+    df = tabla.to_pandas()
+    df.columns = range(len(df.columns)) if leidas is None else list(leidas)
+    if numericos:
+        df = _proyectar_y_filtrar(df, columnas, numericos)
+    return df
+
+def _escribir_parquet(datos, ruta):
+    """Guarda la tabla como Parquet con todas las columnas como texto"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    df = datos if isinstance(datos, pd.DataFrame) else pd.DataFrame(
+        [list(item.values()) if isinstance(item, dict) else item for item in datos])
+    df = _normalizar_como_lectura(df)
+    df.attrs = {}  # La versión leída no se guarda en el archivo
+    esquema = pa.schema([(str(col), pa.string()) for col in df.columns])
+    tabla = pa.Table.from_pandas(df.rename(columns=str), schema=esquema, preserve_index=False)
+    pq.write_table(tabla, ruta, row_group_size=PARQUET_FILAS_POR_GRUPO)
+    return df
+
+@medir('guardar_archivo', filas=lambda ruta, datos, *args, **kwargs: cantidad_filas(datos) if ruta else 0)
 def guardar_archivo(datos, nombre_archivo, formato=None):
     """
     Guarda datos en database. Solo crea histórico la primera vez que se modifica.
+    Escribe con el bloqueo exclusivo de la tabla. Si los datos vienen de
+    leer_archivo y otro proceso cambió la tabla desde entonces, no se guardan.
     """
+    from bloqueos import bloqueo_escritura, TablaBloqueada
+    try:
+        with bloqueo_escritura(nombre_archivo):
+            if _cambiada_desde_lectura(datos, nombre_archivo):
+                _informar_conflicto(nombre_archivo)
+                return None
+            return _guardar_archivo(datos, nombre_archivo, formato)
+    except TablaBloqueada as e:
+        print(f"✗ Error guardando archivo {nombre_archivo}: {e}")
+        return None
+
+def _guardar_archivo(datos, nombre_archivo, formato):
     if formato is None:
         formato = obtener_formato_archivo(nombre_archivo)
+    if formato == 'parquet' and not _requiere_pyarrow():
+        return None
     
     # Crear carpetas si no existen
     if not os.path.exists(CARPETA_DATABASE):
@@ -80,7 +409,11 @@ def guardar_archivo(datos, nombre_archivo, formato=None):
     if os.path.exists(ruta_actual):
         if not os.path.exists(ruta_hist_archivo):
             # Primera modificación: crear histórico
+            _quitar_de_cache(ruta_actual)
+            firma_previa = firma_archivo(ruta_actual)
             os.rename(ruta_actual, ruta_hist_archivo)
+            from manifiestos import copiar_manifiesto
+            copiar_manifiesto(ruta_actual, ruta_hist_archivo, firma_previa)
             print(f"✓ Versión histórica creada: {ruta_hist_archivo}")
         else:
             # Modificación posterior: solo actualizar database
@@ -88,82 +421,435 @@ def guardar_archivo(datos, nombre_archivo, formato=None):
     else:
         print(f"✓ Creando nuevo archivo en database")
     
-    # Guardar nuevo archivo en database
+    # Guardar nuevo archivo en database: se escribe un temporal y se reemplaza
+    # el archivo de una vez, así una caída nunca deja la tabla a medio escribir
+    temporal = ruta_actual + ".tmp"
     try:
-        if formato == 'csv':
-            datos.to_csv(ruta_actual, index=False, header=False)
-        elif formato == 'json':
-            with open(ruta_actual, 'w', encoding='utf-8') as f:
-                json.dump(datos, f, indent=2, ensure_ascii=False)
+        with tramo('guardar_archivo.escritura'):
+            if formato == 'csv':
+                datos.to_csv(temporal, index=False, header=False)
+            elif formato == 'json':
+                with open(temporal, 'w', encoding='utf-8') as f:
+                    json.dump(datos, f, indent=2, ensure_ascii=False)
+            elif formato == 'parquet':
+                datos = _escribir_parquet(datos, temporal)
+            _sincronizar_a_disco(temporal)
+        anotar(bytes_escritos=os.path.getsize(temporal))
+        _quitar_de_cache(ruta_actual)
+        os.replace(temporal, ruta_actual)
+        from wal import descartar
+        descartar(nombre_archivo)
         
+        # Write-through: la próxima lectura no vuelve a parsear el archivo
+        if formato in FORMATOS_TABLA:
+            _guardar_en_cache(ruta_actual, _normalizar_como_lectura(datos))
+        else:
+            _guardar_en_cache(ruta_actual, datos)
+        _sincronizar_secuencia(nombre_archivo, _max_id_datos(datos))
+        _reindexar_pk(ruta_actual, datos)
+        if isinstance(datos, (pd.DataFrame, list)):
+            from manifiestos import registrar_manifiesto
+            with tramo('guardar_archivo.manifiesto'):
+                registrar_manifiesto(ruta_actual, datos)
+            if os.path.exists(ruta_hist_archivo):
+                from versiones import registrar_version
+                with tramo('guardar_archivo.version'):
+                    registrar_version(nombre_archivo, datos)
         print(f"✓ Archivo guardado en: {ruta_actual}")
         return ruta_actual
     except Exception as e:
+        _quitar_de_cache(ruta_actual)
+        if os.path.exists(temporal):
+            os.remove(temporal)
         print(f"✗ Error guardando archivo {nombre_archivo}: {e}")
         return None
 
-def obtener_nuevo_id(df):
-    """Devuelve el próximo ID autoincremental basado en la primera columna (0)"""
-    if df.empty:
-        return 1
+def _sincronizar_a_disco(ruta):
+    """fsync del archivo: sus datos quedan en disco antes de publicarlo"""
+    with open(ruta, 'rb') as f:
+        os.fsync(f.fileno())
+
+def guardar_cambios_filas(datos, nombre_archivo, cambios):
+    """
+    Guarda modificaciones/bajas de filas sin reescribir la tabla: los cambios
+    (ver wal.cambio_modificacion / wal.cambio_baja) se confirman en el WAL y
+    datos (la tabla ya modificada) queda en la caché. La tabla se reescribe en
+    el próximo checkpoint. Devuelve la ruta de la tabla o None si error.
+    Igual que guardar_archivo, no registra nada si otro proceso cambió la tabla
+    desde que se leyeron los datos.
+    """
+    ruta_actual = ruta_database(nombre_archivo)
+    if not os.path.exists(ruta_actual):
+        return guardar_archivo(datos, nombre_archivo)
+    
+    import wal
+    from bloqueos import bloqueo_escritura
     try:
-        ids = pd.to_numeric(df.iloc[:,0], errors='coerce')
-        max_id = ids.max()
-        return int(max_id) + 1 if not pd.isna(max_id) else 1
-    except:
-        return 1
-
-def convertir_csv_a_json(nombre_csv):
-    """Convierte archivo CSV a JSON (reemplaza el original)"""
-    df = leer_archivo(nombre_csv, 'csv')
-    if df is None:
-        print(f"No se pudo leer el CSV: {nombre_csv}")
-        return False
+        with bloqueo_escritura(nombre_archivo):
+            if _cambiada_desde_lectura(datos, nombre_archivo):
+                _informar_conflicto(nombre_archivo)
+                return None
+            transacciones = wal.registrar(nombre_archivo, cambios)
+            if isinstance(datos, pd.DataFrame):
+                datos = _normalizar_como_lectura(datos)
+            _guardar_en_cache(ruta_actual, datos)
+            _reindexar_pk(ruta_actual, datos)
+            _sincronizar_secuencia(nombre_archivo, _max_id_datos(datos))
+    except OSError as e:
+        print(f"✗ Error registrando cambios de {nombre_archivo}: {e}")
+        return None
     
-    # Convertir DataFrame a lista de diccionarios
-    datos_json = []
-    for _, fila in df.iterrows():
-        fila_dict = {f"columna_{i}": str(val) for i, val in enumerate(fila)}
-        datos_json.append(fila_dict)
+    if transacciones >= wal.MAX_TRANSACCIONES_WAL:
+        wal.checkpoint(nombre_archivo)
+    print(f"✓ Cambios registrados en: {ruta_actual}")
+    return ruta_actual
+
+def _crear_historico_copiando(nombre_archivo):
+    """
+    Versión de la lógica de versionado para escrituras in-place: en la primera
+    modificación se copia (no se mueve) el archivo a tablas_hist.
+    """
+    ruta_hist_archivo = ruta_hist(nombre_archivo)
+    if os.path.exists(ruta_hist_archivo):
+        print(f"✓ Actualizando versión en database")
+        return
+    if not os.path.exists(CARPETA_HIST):
+        os.makedirs(CARPETA_HIST, exist_ok=True)
+    shutil.copy2(ruta_database(nombre_archivo), ruta_hist_archivo)
+    from manifiestos import copiar_manifiesto
+    copiar_manifiesto(ruta_database(nombre_archivo), ruta_hist_archivo, firma_archivo(ruta_database(nombre_archivo)))
+    print(f"✓ Versión histórica creada: {ruta_hist_archivo}")
+
+def _anexar_csv(ruta, fila):
+    """Escribe una fila al final del CSV respetando el fin de línea del archivo"""
+    with open(ruta, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        tamano = f.tell()
+        fin_linea = '\n'
+        prefijo = ''
+        if tamano:
+            f.seek(max(0, tamano - 2))
+            cola = f.read()
+            if cola.endswith(b'\r\n'):
+                fin_linea = '\r\n'
+            elif not cola.endswith(b'\n'):
+                prefijo = fin_linea
+        buffer = io.StringIO()
+        valores = ['' if pd.isna(v) else v for v in fila]
+        csv.writer(buffer, lineterminator=fin_linea).writerow(valores)
+        f.write((prefijo + buffer.getvalue()).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+def _anexar_json(ruta, elemento):
+    """
+    Inserta un elemento antes del ']' final de un JSON de lista, con el mismo
+    formato que json.dump(indent=2). Devuelve False si el archivo no es una lista.
+    """
+    with open(ruta, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        tamano = f.tell()
+        f.seek(max(0, tamano - 4096))
+        cola = f.read()
+        fin = cola.rstrip()
+        if not fin.endswith(b']'):
+            return False
+        anterior = fin[:-1].rstrip()
+        if not anterior:
+            return False
+        # Se reescribe desde el último carácter útil antes del ']'
+        pos_corte = tamano - len(cola) + len(anterior)
+        texto = json.dumps(elemento, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+        separador = '\n  ' if anterior.endswith(b'[') else ',\n  '
+        f.seek(pos_corte)
+        f.truncate()
+        f.write((separador + texto + '\n]').encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+def _anexar_en_cache(ruta, firma_previa, fila):
+    """Actualiza la entrada cacheada con la fila anexada, si estaba al día"""
+    global _cache_bytes
+    entrada = _cache_tablas.get(ruta)
+    if entrada is None or entrada[0] != firma_previa:
+        _quitar_de_cache(ruta)
+        return
+    datos = entrada[1]
+    if isinstance(datos, pd.DataFrame):
+        nueva = _normalizar_como_lectura(pd.DataFrame([list(fila)]))
+        nueva.index = [len(datos)]
+        datos = pd.concat([datos, nueva])
+    else:
+        datos.append(dict(fila))
+    _guardar_en_cache(ruta, datos)
+
+def anexar_fila(fila, nombre_archivo, formato=None):
+    """
+    Agrega una fila (CSV) o elemento (JSON) al final del archivo en database sin
+    reescribir la tabla. Mantiene el versionado: la primera modificación crea el
+    histórico. Devuelve la ruta guardada o None si error.
+    Agregar al final no pisa cambios ajenos, así que no se verifica la versión
+    leída; solo se toma el bloqueo exclusivo de la tabla.
+    """
+    from bloqueos import bloqueo_escritura, TablaBloqueada
+    try:
+        with bloqueo_escritura(nombre_archivo):
+            return _anexar_fila(fila, nombre_archivo, formato)
+    except TablaBloqueada as e:
+        print(f"✗ Error anexando a {nombre_archivo}: {e}")
+        return None
+
+def _anexar_fila(fila, nombre_archivo, formato):
+    if formato is None:
+        formato = obtener_formato_archivo(nombre_archivo)
+    
+    ruta_actual = ruta_database(nombre_archivo)
+    if not os.path.exists(ruta_actual):
+        print("No existe archivo en database. No se puede anexar.")
+        return None
+    
+    # Anexar cambia el archivo: antes se llevan a disco los cambios del WAL
+    from wal import checkpoint
+    if not checkpoint(nombre_archivo):
+        return None
     
-    # Eliminar el archivo CSV original
-    ruta_csv = ruta_database(nombre_csv)
-    if os.path.exists(ruta_csv):
-        os.remove(ruta_csv)
+    _crear_historico_copiando(nombre_archivo)
+    firma_previa = firma_archivo(ruta_actual)
+    
+    try:
+        if formato == 'csv':
+            _anexar_csv(ruta_actual, fila)
+        elif formato == 'json':
+            if not _anexar_json(ruta_actual, fila):
+                print("✗ El JSON no es una lista; no se puede anexar.")
+                return None
+        else:
+            print("Formato no soportado")
+            return None
+    except Exception as e:
+        _quitar_de_cache(ruta_actual)
+        print(f"✗ Error anexando a {nombre_archivo}: {e}")
+        return None
     
-    # Guardar como JSON con el mismo nombre base
-    nombre_json = nombre_csv.replace('.csv', '.json')
-    return guardar_archivo(datos_json, nombre_json, 'json')
+    _anexar_en_cache(ruta_actual, firma_previa, fila)
+    _indexar_fila_anexada(ruta_actual, firma_previa, fila)
+    from manifiestos import registrar_fila_anexada
+    registrar_fila_anexada(ruta_actual, firma_previa, fila)
+    if formato == 'csv':
+        import lector_mmap
+        lector_mmap.registrar_anexo(ruta_actual, firma_previa)
+    from versiones import registrar_anexo
+    registrar_anexo(nombre_archivo, fila)
+    from indice_texto import registrar_alta
+    registrar_alta(nombre_archivo, firma_previa, fila if isinstance(fila, list) else list(fila.values()))
+    if formato == 'csv':
+        _sincronizar_secuencia(nombre_archivo, _max_id_datos(pd.DataFrame([list(fila)])))
+    else:
+        _sincronizar_secuencia(nombre_archivo, _max_id_datos([fila]))
+    print(f"✓ Fila anexada en: {ruta_actual}")
+    return ruta_actual
 
-def convertir_json_a_csv(nombre_json):
-    """Convierte archivo JSON a CSV (reemplaza el original)"""
-    datos = leer_archivo(nombre_json, 'json')
+def _construir_indice_pk(datos):
+    """
+    Índice hash de clave primaria: ID (texto sin espacios) -> posiciones de las
+    filas/elementos. Los IDs nulos o vacíos no se indexan.
+    """
+    if isinstance(datos, pd.DataFrame):
+        if datos.empty:
+            return {}
+        ids = datos.iloc[:, 0]
+        texto = ids.astype(str).str.strip()
+        validas = np.flatnonzero((ids.notna() & (texto != '')).to_numpy())
+        texto = texto.iloc[validas]
+        return {clave: validas[posiciones].tolist()
+                for clave, posiciones in texto.groupby(texto.to_numpy(), sort=False).indices.items()}
+    
+    indice = {}
+    for pos, item in enumerate(datos or []):
+        if isinstance(item, dict):
+            for key, val in item.items():
+                if 'id' in key.lower() or key == 'columna_0':
+                    if val is not None and str(val).strip() != '':
+                        indice.setdefault(str(val).strip(), []).append(pos)
+                    break
+    return indice
+
+def indice_pk(nombre_archivo, datos=None):
+    """
+    Devuelve el índice de clave primaria de la tabla. Se construye la primera vez
+    que se consulta (o si el archivo cambió) y se reutiliza en las siguientes.
+    """
+    ruta = ruta_lectura(nombre_archivo)
+    if ruta is None:
+        return {}
+    firma = firma_archivo(ruta)
+    entrada = _indices_pk.get(ruta)
+    acierto = entrada is not None and entrada[0] == firma
+    contar_cache('indices_pk', acierto)
+    if acierto:
+        return entrada[1]
+    
     if datos is None:
-        print(f"No se pudo leer el JSON: {nombre_json}")
-        return False
+        datos = leer_archivo(nombre_archivo)
+    indice = _construir_indice_pk(datos)
+    _indices_pk[ruta] = (firma, indice, len(datos) if datos is not None else 0)
+    return indice
+
+def indice_pk_vigente(nombre_archivo, filas=None):
+    """
+    Índice de clave primaria solo si ya está construido y el archivo no cambió
+    (y, si se indica, tiene esa cantidad de filas). No lo construye: None si no hay.
+    """
+    ruta = ruta_lectura(nombre_archivo)
+    entrada = _indices_pk.get(ruta) if ruta else None
+    if entrada is None or entrada[0] != firma_archivo(ruta):
+        return None
+    if filas is not None and entrada[2] != filas:
+        return None
+    return entrada[1]
+
+def buscar_posiciones_por_id(nombre_archivo, valor, datos=None):
+    """Posiciones de las filas/elementos con ese ID (lista vacía si no hay)"""
+    return indice_pk(nombre_archivo, datos).get(str(valor).strip(), [])
+
+def _reindexar_pk(ruta, datos):
+    """Tras reescribir una tabla: reconstruye su índice si ya estaba en uso"""
+    if ruta in _indices_pk:
+        _indices_pk[ruta] = (firma_archivo(ruta), _construir_indice_pk(datos), len(datos))
+
+def _indexar_fila_anexada(ruta, firma_previa, fila):
+    """Tras anexar una fila: la agrega al índice si estaba al día"""
+    entrada = _indices_pk.get(ruta)
+    if entrada is None:
+        return
+    if entrada[0] != firma_previa:
+        del _indices_pk[ruta]
+        return
+    _, indice, filas = entrada
+    nuevo = _construir_indice_pk(pd.DataFrame([list(fila)]) if isinstance(fila, list) else [fila])
+    for clave in nuevo:
+        indice.setdefault(clave, []).append(filas)
+    _indices_pk[ruta] = (firma_archivo(ruta), indice, filas + 1)
+
+def _pedir_posicion(nombre_archivo, datos, descripcion):
+    """
+    Pide la posición de la fila/elemento sobre el que operar. Acepta el índice
+    o 'id:<valor>' para ubicarlo por clave primaria. Devuelve None si no es válido.
+    """
+    entrada = input(f"Ingrese el índice {descripcion} (o 'id:<valor>' para buscar por ID): ").strip()
     
-    # Convertir a DataFrame
-    if isinstance(datos, list) and datos:
-        # Asumir que todos los dict tienen las mismas claves
-        claves = list(datos[0].keys())
-        filas = []
-        for item in datos:
-            fila = [item.get(clave, '') for clave in claves]
-            filas.append(fila)
-        
-        df = pd.DataFrame(filas)
-        
-        # Eliminar el archivo JSON original
-        ruta_json = ruta_database(nombre_json)
-        if os.path.exists(ruta_json):
-            os.remove(ruta_json)
+    if entrada.lower().startswith('id:'):
+        posiciones = buscar_posiciones_por_id(nombre_archivo, entrada[3:], datos)
+        if not posiciones:
+            print("No se encontró ese ID.")
+            return None
+        if len(posiciones) > 1:
+            print(f"El ID aparece en las posiciones {posiciones}; se usa la primera.")
+        return int(posiciones[0])
+    
+    try:
+        idx = int(entrada)
+    except ValueError:
+        print("Índice inválido.")
+        return None
+    
+    if idx < 0 or idx >= len(datos):
+        print("Índice fuera de rango.")
+        return None
+    return idx
+
+def _max_id_datos(datos):
+    """
+    Mayor ID numérico de la tabla: primera columna en CSV, primer campo con
+    'id' (o columna_0) en JSON. Devuelve 0 si no hay IDs numéricos.
+    """
+    if isinstance(datos, pd.DataFrame):
+        if datos.empty:
+            return 0
+        max_id = pd.to_numeric(datos.iloc[:, 0], errors='coerce').max()
+        return 0 if pd.isna(max_id) else int(max_id)
+    
+    max_id = 0
+    for item in datos or []:
+        if isinstance(item, dict):
+            for key, val in item.items():
+                if 'id' in key.lower() or key == 'columna_0':
+                    try:
+                        max_id = max(max_id, int(val))
+                    except (TypeError, ValueError):
+                        pass
+                    break
+    return max_id
+
+def _cargar_secuencias(releer=False):
+    """
+    Carga las secuencias persistidas (una vez por sesión, o de nuevo con releer=True
+    para ver lo que reservaron otros procesos)
+    """
+    global _secuencias
+    if _secuencias is None or releer:
+        _secuencias = {}
+        if os.path.exists(ARCHIVO_SECUENCIAS):
+            try:
+                with open(ARCHIVO_SECUENCIAS, 'r', encoding='utf-8') as f:
+                    _secuencias = json.load(f)
+            except (OSError, ValueError):
+                _secuencias = {}
+    return _secuencias
+
+def _persistir_secuencias():
+    """Guarda las secuencias con reemplazo atómico del archivo"""
+    os.makedirs(CARPETA_META, exist_ok=True)
+    temporal = ARCHIVO_SECUENCIAS + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(_secuencias, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ARCHIVO_SECUENCIAS)
+
+def _sincronizar_secuencia(nombre_archivo, max_id):
+    """Tras escribir la tabla: registra la nueva firma y el mayor ID conocido"""
+    from bloqueos import bloqueo_escritura
+    with bloqueo_escritura(os.path.basename(ARCHIVO_SECUENCIAS)):
+        secuencias = _cargar_secuencias(releer=True)
+        entrada = secuencias.get(nombre_archivo)
+        if entrada is None:
+            return
+        firma = firma_archivo(ruta_database(nombre_archivo))
+        entrada['ultimo_id'] = max(entrada['ultimo_id'], max_id)
+        entrada['firma'] = list(firma) if firma else None
+        _persistir_secuencias()
+
+def reservar_nuevo_id(nombre_archivo, datos=None, cantidad=1):
+    """
+    Devuelve el próximo ID de la tabla y lo marca como usado. Con cantidad > 1
+    reserva ese bloque de IDs consecutivos y devuelve el primero.
+    La primera vez (o si el archivo cambió fuera del programa) se recupera con
+    un único recorrido de la tabla; después es un contador persistido, que se
+    relee y actualiza con bloqueo para que dos operadores no reserven el mismo ID.
+    """
+    from bloqueos import bloqueo_escritura
+    firma = firma_archivo(ruta_lectura(nombre_archivo) or ruta_database(nombre_archivo))
+    firma = list(firma) if firma else None
+    entrada = _cargar_secuencias().get(nombre_archivo)
+    if datos is None and (entrada is None or entrada.get('firma') != firma):
+        # La tabla se lee antes de tomar el bloqueo de las secuencias
+        datos = leer_archivo(nombre_archivo)
+    
+    with bloqueo_escritura(os.path.basename(ARCHIVO_SECUENCIAS)):
+        secuencias = _cargar_secuencias(releer=True)
+        entrada = secuencias.get(nombre_archivo)
+        if entrada is None or entrada.get('firma') != firma:
+            if datos is None:
+                datos = leer_archivo(nombre_archivo)
+            entrada = {'ultimo_id': _max_id_datos(datos), 'firma': firma}
+            secuencias[nombre_archivo] = entrada
         
-        # Guardar como CSV con el mismo nombre base
-        nombre_csv = nombre_json.replace('.json', '.csv')
-        return guardar_archivo(df, nombre_csv, 'csv')
-    else:
-        print("Formato JSON no soportado para conversión")
-        return False
+        primero = entrada['ultimo_id'] + 1
+        entrada['ultimo_id'] += cantidad
+        _persistir_secuencias()
+    return primero
 
 # --- OPERACIONES CRUD ---
 def agregar_fila(nombre_archivo):
@@ -173,7 +859,7 @@ def agregar_fila(nombre_archivo):
     """
     formato = obtener_formato_archivo(nombre_archivo)
     
-    if formato == 'csv':
+    if formato in FORMATOS_TABLA:
         _agregar_fila_csv(nombre_archivo)
     elif formato == 'json':
         _agregar_fila_json(nombre_archivo)
@@ -191,21 +877,16 @@ def guardar_archivo_con_formato(datos, nombre_base):
     
     return guardar_archivo(datos, nombre_archivo, formato)
 
-from busqueda_inteligente import input_con_busqueda_inteligente, RELACIONES_TABLAS
-def obtener_relaciones_tabla(nombre_archivo):
-    """Obtiene las relaciones para una tabla específica"""
-    return RELACIONES_TABLAS.get(nombre_archivo, {})
-
 def _agregar_fila_csv(nombre_archivo):
-    df = leer_archivo(nombre_archivo, 'csv')
+    df = leer_archivo(nombre_archivo)
     if df is None:
         print(f"No se pudo leer el archivo: {nombre_archivo}")
         return
     
-    nuevo_id = obtener_nuevo_id(df)
+    nuevo_id = reservar_nuevo_id(nombre_archivo, df)
     print(f"Agregando nueva fila a '{nombre_archivo}' (ID -> {nuevo_id})")
     
-    from busqueda_inteligente import obtener_relaciones_tabla
+    from busqueda_inteligente import obtener_relaciones_tabla, input_con_busqueda_inteligente
     relaciones = obtener_relaciones_tabla(nombre_archivo)
     
     nueva_fila = [str(nuevo_id)]
@@ -227,11 +908,7 @@ def _agregar_fila_csv(nombre_archivo):
     
     # QUITAR EL PRINT DE LA FILA COMPLETA
     # Guardar
-    nueva_fila_df = pd.DataFrame([nueva_fila], columns=df.columns)
-    df_modificado = pd.concat([df, nueva_fila_df], ignore_index=True)
-    
-    nombre_base = nombre_archivo.replace('.csv', '').replace('.json', '')
-    guardar_archivo_con_formato(df_modificado, nombre_base)
+    _guardar_fila_agregada(nueva_fila, df, nombre_archivo)
 
 def _agregar_fila_json(nombre_archivo):
     """Agrega elemento a archivo JSON"""
@@ -240,20 +917,8 @@ def _agregar_fila_json(nombre_archivo):
         print(f"No se pudo leer el archivo JSON: {nombre_archivo}")
         return
     
-    # Calcular nuevo ID
-    ids = []
-    for item in datos:
-        if isinstance(item, dict):
-            # Buscar campo ID (primera clave que contenga 'id' o columna_0)
-            for key, val in item.items():
-                if 'id' in key.lower() or key == 'columna_0':
-                    try:
-                        ids.append(int(val))
-                    except:
-                        pass
-                    break
-    
-    nuevo_id = max(ids) + 1 if ids else 1
+    # Calcular nuevo ID (primera clave que contenga 'id' o columna_0)
+    nuevo_id = reservar_nuevo_id(nombre_archivo, datos)
     print(f"Agregando nuevo elemento a '{nombre_archivo}' (ID -> {nuevo_id})")
     
     # Construir nuevo elemento
@@ -267,11 +932,43 @@ def _agregar_fila_json(nombre_archivo):
                 val = input(f"Ingrese valor para '{key}': ").strip()
                 nuevo_elemento[key] = val
     
-    datos.append(nuevo_elemento)
-    
     # Guardar preguntando formato
-    nombre_base = nombre_archivo.replace('.csv', '').replace('.json', '')
-    guardar_archivo_con_formato(datos, nombre_base)
+    _guardar_fila_agregada(nuevo_elemento, datos, nombre_archivo)
+
+def _guardar_fila_agregada(nueva_fila, datos, nombre_archivo):
+    """
+    Guarda la fila/elemento agregado preguntando el formato. Si se conserva el
+    formato del archivo se anexa al final (sin reescribirlo); si cambia, se
+    guarda la tabla completa en el nuevo formato.
+    """
+    from listado_csv import preguntar_formato_guardado
+    
+    nombre_base = os.path.splitext(nombre_archivo)[0]
+    nombre_destino = preguntar_formato_guardado(nombre_base)
+    formato_destino = obtener_formato_archivo(nombre_destino)
+    posicion = len(datos)  # La fila queda al final de la tabla
+    
+    # Parquet no admite agregar al final: se reescribe la tabla completa
+    if nombre_destino == nombre_archivo and existe_en_database(nombre_archivo) and formato_destino != 'parquet':
+        ruta = anexar_fila(nueva_fila, nombre_archivo, formato_destino)
+    else:
+        ruta = _guardar_tabla_agregada(nueva_fila, datos, nombre_destino, formato_destino)
+    if ruta:
+        from integridad import avisar_cambios
+        avisar_cambios(nombre_destino, filas=[nueva_fila], posiciones=[posicion])
+    return ruta
+
+def _guardar_tabla_agregada(nueva_fila, datos, nombre_destino, formato_destino):
+    """Reescribe la tabla completa con la fila/elemento agregado"""
+    if isinstance(datos, pd.DataFrame):
+        nueva_fila_df = pd.DataFrame([nueva_fila], columns=datos.columns)
+        version = datos.attrs.get('version_tabla')
+        datos = pd.concat([datos, nueva_fila_df], ignore_index=True)
+        if version is not None:
+            datos.attrs['version_tabla'] = version  # concat no conserva la versión leída
+    else:
+        datos.append(nueva_fila)
+    return guardar_archivo(datos, nombre_destino, formato_destino)
 
 def eliminar_fila(nombre_archivo):
     """
@@ -283,14 +980,14 @@ def eliminar_fila(nombre_archivo):
     
     formato = obtener_formato_archivo(nombre_archivo)
     
-    if formato == 'csv':
+    if formato in FORMATOS_TABLA:
         _eliminar_fila_csv(nombre_archivo)
     elif formato == 'json':
         _eliminar_fila_json(nombre_archivo)
 
 def _eliminar_fila_csv(nombre_archivo):
     """Elimina fila de CSV"""
-    df = leer_archivo(nombre_archivo, 'csv')
+    df = leer_archivo(nombre_archivo)
     if df is None:
         print("Error leyendo archivo.")
         return
@@ -298,42 +995,19 @@ def _eliminar_fila_csv(nombre_archivo):
     print("Vista previa (primeras 20 filas):")
     print(df.head(20))
     
-    try:
-        idx = int(input("Ingrese el índice de la fila a eliminar: ").strip())
-    except ValueError:
-        print("Índice inválido.")
-        return
-    
-    if idx < 0 or idx >= len(df):
-        print("Índice fuera de rango.")
+    idx = _pedir_posicion(nombre_archivo, df, "de la fila a eliminar")
+    if idx is None:
         return
     
+    valores = df.iloc[idx].tolist()
+    firma_previa = firma_archivo(ruta_database(nombre_archivo))
     df = df.drop(idx).reset_index(drop=True)
-    guardar_archivo(df, nombre_archivo, 'csv')  # ← Usa la función corregida
-    print(f"Fila {idx} eliminada.")
-
-def _eliminar_fila_csv(nombre_archivo):
-    """Elimina fila de CSV"""
-    df = leer_archivo(nombre_archivo, 'csv')
-    if df is None:
-        print("Error leyendo archivo.")
-        return
-    
-    print("Vista previa (primeras 20 filas):")
-    print(df.head(20))
-    
-    try:
-        idx = int(input("Ingrese el índice de la fila a eliminar: ").strip())
-    except ValueError:
-        print("Índice inválido.")
-        return
-    
-    if idx < 0 or idx >= len(df):
-        print("Índice fuera de rango.")
-        return
-    
-    df = df.drop(idx).reset_index(drop=True)
-    guardar_archivo(df, nombre_archivo, 'csv')
+    from wal import cambio_baja
+    if guardar_cambios_filas(df, nombre_archivo, [cambio_baja(idx)]):
+        from indice_texto import registrar_baja
+        registrar_baja(nombre_archivo, firma_previa, idx, valores)
+        from integridad import avisar_cambios
+        avisar_cambios(nombre_archivo, ids_eliminados=[valores[0]])
     print(f"Fila {idx} eliminada.")
 
 def _eliminar_fila_json(nombre_archivo):
@@ -347,18 +1021,18 @@ def _eliminar_fila_json(nombre_archivo):
     for i, item in enumerate(datos[:20]):
         print(f"{i}: {item}")
     
-    try:
-        idx = int(input("Ingrese el índice del elemento a eliminar: ").strip())
-    except ValueError:
-        print("Índice inválido.")
-        return
-    
-    if idx < 0 or idx >= len(datos):
-        print("Índice fuera de rango.")
+    idx = _pedir_posicion(nombre_archivo, datos, "del elemento a eliminar")
+    if idx is None:
         return
     
+    firma_previa = firma_archivo(ruta_database(nombre_archivo))
     elemento_eliminado = datos.pop(idx)
-    guardar_archivo(datos, nombre_archivo, 'json')
+    from wal import cambio_baja
+    if guardar_cambios_filas(datos, nombre_archivo, [cambio_baja(idx)]):
+        from indice_texto import registrar_baja
+        registrar_baja(nombre_archivo, firma_previa, idx, list(elemento_eliminado.values()))
+        from integridad import avisar_cambios
+        avisar_cambios(nombre_archivo, ids_eliminados=list(elemento_eliminado.values())[:1])
     print(f"Elemento {idx} eliminado: {elemento_eliminado}")
 
 def modificar_fila(nombre_archivo):
@@ -367,7 +1041,7 @@ def modificar_fila(nombre_archivo):
     """
     formato = obtener_formato_archivo(nombre_archivo)
     
-    if formato == 'csv':
+    if formato in FORMATOS_TABLA:
         _modificar_fila_csv(nombre_archivo)
     elif formato == 'json':
         _modificar_fila_json(nombre_archivo)
@@ -375,8 +1049,8 @@ def modificar_fila(nombre_archivo):
         print("Formato no soportado")
 
 def _modificar_fila_csv(nombre_archivo):
-    """Modifica fila en CSV con búsqueda inteligente"""
-    df = leer_archivo(nombre_archivo, 'csv')
+    """Modifica fila en CSV"""
+    df = leer_archivo(nombre_archivo)
     if df is None:
         print("No se puede leer el archivo.")
         return
@@ -384,78 +1058,39 @@ def _modificar_fila_csv(nombre_archivo):
     print("Vista previa (primeras 20 filas):")
     print(df.head(20))
     
-    try:
-        idx = int(input("Ingrese el índice de la fila a modificar: ").strip())
-    except ValueError:
-        print("Índice inválido.")
+    idx = _pedir_posicion(nombre_archivo, df, "de la fila a modificar")
+    if idx is None:
         return
     
-    if idx < 0 or idx >= len(df):
-        print("Índice fuera de rango.")
-        return
-    
-    # Obtener relaciones de esta tabla
+    from busqueda_inteligente import obtener_relaciones_tabla, input_con_busqueda_inteligente
     relaciones = obtener_relaciones_tabla(nombre_archivo)
     
+    valores_viejos = df.iloc[idx].tolist()
+    firma_previa = firma_archivo(ruta_database(nombre_archivo))
     for col in df.columns:
         if str(col).strip() == '0':  # Columna ID (primera)
             continue
-        
         actual = df.at[idx, col]
-        
-        # Verificar si esta columna tiene una relación
-        tabla_relacionada = None
-        for clave, tabla in relaciones.items():
-            if clave in str(col).lower() or f"id_{clave}" in str(col).lower():
-                tabla_relacionada = tabla
-                break
-        
+        tabla_relacionada = relaciones.get(col)
         if tabla_relacionada:
-            print(f"\nColumna: {col} (actual: {actual})")
             nuevo = input_con_busqueda_inteligente(
-                f"Nuevo valor para {clave} (enter = conservar): ",
+                f"Columna {col} (actual: {actual}) -> Nuevo (enter = conservar)",
                 tabla_relacionada,
                 columna_id=0,
-                columna_nombre=1
+                columna_nombre=1,
+                permitir_vacio=True
             )
         else:
-            nuevo = input(f"{col} (actual: {actual}) -> Nuevo (enter = conservar): ").strip()
-        
-        if nuevo != "":
-            df.at[idx, col] = nuevo
-    
-    guardar_archivo(df, nombre_archivo, 'csv')  # ← Usa la función corregida
-    print(f"Fila {idx} modificada.")
-
-def _modificar_fila_csv(nombre_archivo):
-    """Modifica fila en CSV"""
-    df = leer_archivo(nombre_archivo, 'csv')
-    if df is None:
-        print("No se puede leer el archivo.")
-        return
-    
-    print("Vista previa (primeras 20 filas):")
-    print(df.head(20))
-    
-    try:
-        idx = int(input("Ingrese el índice de la fila a modificar: ").strip())
-    except ValueError:
-        print("Índice inválido.")
-        return
-    
-    if idx < 0 or idx >= len(df):
-        print("Índice fuera de rango.")
-        return
-    
-    for col in df.columns:
-        if str(col).strip() == '0':  # Columna ID (primera)
-            continue
-        actual = df.at[idx, col]
-        nuevo = input(f"Columna {col} (actual: {actual}) -> Nuevo (enter = conservar): ").strip()
+            nuevo = input(f"Columna {col} (actual: {actual}) -> Nuevo (enter = conservar): ").strip()
         if nuevo != "":
             df.at[idx, col] = nuevo
     
-    guardar_archivo(df, nombre_archivo, 'csv')
+    from wal import cambio_modificacion
+    if guardar_cambios_filas(df, nombre_archivo, [cambio_modificacion(idx, df.iloc[idx].tolist())]):
+        from indice_texto import registrar_modificacion
+        registrar_modificacion(nombre_archivo, firma_previa, idx, valores_viejos, df.iloc[idx].tolist())
+        from integridad import avisar_cambios
+        avisar_cambios(nombre_archivo, filas=[df.iloc[idx].tolist()], posiciones=[idx])
     print(f"Fila {idx} modificada.")
 
 def _modificar_fila_json(nombre_archivo):
@@ -469,17 +1104,13 @@ def _modificar_fila_json(nombre_archivo):
     for i, item in enumerate(datos[:20]):
         print(f"{i}: {item}")
     
-    try:
-        idx = int(input("Ingrese el índice del elemento a modificar: ").strip())
-    except ValueError:
-        print("Índice inválido.")
-        return
-    
-    if idx < 0 or idx >= len(datos):
-        print("Índice fuera de rango.")
+    idx = _pedir_posicion(nombre_archivo, datos, "del elemento a modificar")
+    if idx is None:
         return
     
     elemento = datos[idx]
+    valores_viejos = list(elemento.values())
+    firma_previa = firma_archivo(ruta_database(nombre_archivo))
     for key in elemento.keys():
         if 'id' in key.lower():  # No modificar IDs
             continue
@@ -488,7 +1119,12 @@ def _modificar_fila_json(nombre_archivo):
         if nuevo != "":
             elemento[key] = nuevo
     
-    guardar_archivo(datos, nombre_archivo, 'json')
+    from wal import cambio_modificacion
+    if guardar_cambios_filas(datos, nombre_archivo, [cambio_modificacion(idx, elemento)]):
+        from indice_texto import registrar_modificacion
+        registrar_modificacion(nombre_archivo, firma_previa, idx, valores_viejos, list(elemento.values()))
+        from integridad import avisar_cambios
+        avisar_cambios(nombre_archivo, filas=[elemento], posiciones=[idx])
     print(f"Elemento {idx} modificado.")
 
 def buscar_fila(nombre_archivo):
@@ -497,31 +1133,38 @@ def buscar_fila(nombre_archivo):
     """
     formato = obtener_formato_archivo(nombre_archivo)
     
-    if formato == 'csv':
+    if formato in FORMATOS_TABLA:
         _buscar_fila_csv(nombre_archivo)
     elif formato == 'json':
         _buscar_fila_json(nombre_archivo)
 
+def _opcion_busqueda(mensaje):
+    """Lee la opción de búsqueda. Una 'c' al final pide solo contar (ej: '3c')"""
+    opc = input(mensaje).strip().lower()
+    if len(opc) > 1 and opc.endswith('c'):
+        return opc[:-1], True
+    return opc, False
+
 def _buscar_fila_csv(nombre_archivo):
     """Busca en archivo CSV"""
-    df = leer_archivo(nombre_archivo, 'csv')
+    df = leer_archivo(nombre_archivo)
     if df is None:
         print("No se pudo leer el archivo para buscar.")
         return
     
+    from listado_csv import mostrar_resultados
     print("Opciones de búsqueda:")
     print("1 - Buscar por ID (primera columna)")
     print("2 - Buscar por columna índice")
     print("3 - Búsqueda de texto en cualquier campo")
-    opc = input("Seleccione opción (1/2/3): ").strip()
+    print("4 - Filtro por expresión (ej: col4 = 12 and col1 ~ gom and col0 between 10 and 500)")
+    print("Agregue 'c' para solo contar las coincidencias (ej: 3c)")
+    opc, solo_contar = _opcion_busqueda("Seleccione opción (1/2/3/4): ")
     
     if opc == '1':
         valor = input("Ingrese el ID a buscar (coincidencia exacta): ").strip()
-        resultado = df[df.iloc[:, 0].astype(str) == valor]
-        if resultado.empty:
-            print("No se encontraron filas con ese ID.")
-        else:
-            print(resultado)
+        mostrar_resultados(df, buscar_posiciones_por_id(nombre_archivo, valor, df),
+                           "No se encontraron filas con ese ID.", solo_contar)
     
     elif opc == '2':
         col_idx_raw = input("Ingrese el índice de columna (ej: 0, 1, 2): ").strip()
@@ -533,19 +1176,17 @@ def _buscar_fila_csv(nombre_archivo):
             print("Columna no válida.")
             return
         texto = input("Ingrese texto/valor a buscar (coincidencia parcial): ").strip()
-        resultado = df[df[col_idx].astype(str).str.contains(texto, case=False, na=False)]
-        if resultado.empty:
-            print("No se encontraron coincidencias.")
-        else:
-            print(resultado)
+        mascara = df[col_idx].astype(str).str.contains(texto, case=False, na=False)
+        mostrar_resultados(df, mascara.to_numpy().nonzero()[0], solo_contar=solo_contar)
     
     elif opc == '3':
         texto = input("Ingrese texto a buscar en todo el registro: ").strip()
-        resultado = df[df.apply(lambda row: row.astype(str).str.contains(texto, case=False, na=False).any(), axis=1)]
-        if resultado.empty:
-            print("No se encontraron coincidencias.")
-        else:
-            print(resultado)
+        from indice_texto import buscar_texto, filtrar_por_texto
+        posiciones = filtrar_por_texto(df, buscar_texto(nombre_archivo, texto, df), texto)
+        mostrar_resultados(df, posiciones, solo_contar=solo_contar)
+    
+    elif opc == '4':
+        _buscar_por_expresion(nombre_archivo, df, solo_contar)
     
     else:
         print("Opción inválida.")
@@ -557,39 +1198,47 @@ def _buscar_fila_json(nombre_archivo):
         print("No se pudo leer el archivo para buscar.")
         return
     
+    from listado_csv import mostrar_resultados
     print("Opciones de búsqueda:")
     print("1 - Buscar por ID")
     print("2 - Búsqueda de texto en cualquier campo")
-    opc = input("Seleccione opción (1/2): ").strip()
+    print("3 - Filtro por expresión (ej: precio > 1000 and nombre ~ gamer)")
+    print("Agregue 'c' para solo contar las coincidencias (ej: 2c)")
+    opc, solo_contar = _opcion_busqueda("Seleccione opción (1/2/3): ")
     
     if opc == '1':
         valor = input("Ingrese el ID a buscar: ").strip()
-        resultados = [item for item in datos if any(str(v) == valor for k, v in item.items() if 'id' in k.lower())]
-        if not resultados:
-            print("No se encontraron elementos con ese ID.")
-        else:
-            for resultado in resultados:
-                print(resultado)
+        mostrar_resultados(datos, buscar_posiciones_por_id(nombre_archivo, valor, datos),
+                           "No se encontraron elementos con ese ID.", solo_contar)
     
     elif opc == '2':
         texto = input("Ingrese texto a buscar: ").strip().lower()
-        resultados = []
-        for item in datos:
-            if any(texto in str(v).lower() for v in item.values()):
-                resultados.append(item)
-        
-        if not resultados:
-            print("No se encontraron coincidencias.")
-        else:
-            for resultado in resultados:
-                print(resultado)
+        from indice_texto import buscar_texto, filtrar_por_texto
+        posiciones = filtrar_por_texto(datos, buscar_texto(nombre_archivo, texto, datos), texto)
+        mostrar_resultados(datos, posiciones, solo_contar=solo_contar)
+    
+    elif opc == '3':
+        _buscar_por_expresion(nombre_archivo, datos, solo_contar)
     
     else:
         print("Opción inválida.")
 
+def _buscar_por_expresion(nombre_archivo, datos, solo_contar):
+    """Pide una expresión de filtro (filtros.py) y muestra las filas que la cumplen"""
+    from filtros import posiciones, AYUDA
+    from listado_csv import mostrar_resultados
+    print(AYUDA)
+    expresion = input("Expresión: ").strip()
+    try:
+        encontradas = posiciones(datos, expresion, nombre_archivo)
+    except ValueError as e:
+        print(f"✗ Expresión inválida: {e}")
+        return
+    mostrar_resultados(datos, encontradas, solo_contar=solo_contar)
+
 def debug_agregar_fila(nombre_archivo):
     """Función temporal para debuggear"""
-    df = leer_archivo(nombre_archivo, 'csv')
+    df = leer_archivo(nombre_archivo)
     if df is None:
         print(f"No se pudo leer el archivo: {nombre_archivo}")
         return
@@ -613,14 +1262,3 @@ def debug_agregar_fila(nombre_archivo):
                 print(f"COINCIDE con relación: {clave} -> {tabla}")
             else:
                 print(f"NO coincide con: {clave}")
-
-def guardar_archivo_con_formato(datos, nombre_base):
-    """
-    Guarda datos preguntando el formato deseado
-    """
-    from listado_csv import preguntar_formato_guardado
-    
-    nombre_archivo = preguntar_formato_guardado(nombre_base)
-    formato = obtener_formato_archivo(nombre_archivo)
-    
-    return guardar_archivo(datos, nombre_archivo, formato)  # ← Usa la función corregida
\ No newline at end of file
@@ -0,0 +1,324 @@
+"""
+Módulo de índice invertido para la búsqueda de texto en cualquier campo.
+
+Cada tabla tiene un índice token -> posiciones de fila, con la misma
+normalización que busqueda_inteligente.normalizar_texto. El índice se guarda
+en metadatos/indices como una foto (.json) más un registro de cambios (.log)
+al que las altas, bajas y modificaciones agregan una línea, así una escritura
+no obliga a reescribir el índice completo.
+"""
+import os
+import re
+import json
+import bisect
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+from herramientas import CARPETA_META, leer_archivo, ruta_lectura, firma_archivo
+
+CARPETA_INDICES = os.path.join(CARPETA_META, "indices")
+
+# Se reconstruye la foto cuando el registro de cambios supera este tamaño
+MAX_LINEAS_REGISTRO = 5000
+
+PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+# Índices cargados en memoria: nombre_archivo -> índice
+_indices = {}
+
+def _normalizar(valor):
+    from busqueda_inteligente import normalizar_texto
+    return normalizar_texto(valor)
+
+def tokenizar(valor):
+    """Tokens normalizados (sin acentos, minúsculas) de un valor"""
+    return PATRON_TOKEN.findall(_normalizar(valor))
+
+def _normalizar_columna(serie):
+    from busqueda_inteligente import normalizar_serie
+    return normalizar_serie(serie)
+
+def _valores_filas(datos):
+    """Devuelve un DataFrame con los valores de cada fila/elemento"""
+    if isinstance(datos, pd.DataFrame):
+        return datos
+    return pd.DataFrame([list(item.values()) if isinstance(item, dict) else [item] for item in datos])
+
+def _rutas(nombre_archivo):
+    base = os.path.join(CARPETA_INDICES, nombre_archivo)
+    return base + ".json", base + ".log"
+
+def _indice_vacio(firma, total):
+    return {'firma': firma, 'total': total, 'borradas': [], 'tokens': {}, 'vocabulario': None, 'trigramas': None}
+
+def construir_indice(nombre_archivo, datos=None):
+    """Construye el índice completo de la tabla y lo guarda como foto"""
+    ruta = ruta_lectura(nombre_archivo)
+    if datos is None:
+        datos = leer_archivo(nombre_archivo)
+    if datos is None or ruta is None:
+        return None
+
+    firma = firma_archivo(ruta)
+    df = _valores_filas(datos)
+    indice = _indice_vacio(list(firma), len(df))
+
+    tokens = {}
+    for col in df.columns:
+        explotado = _normalizar_columna(df[col]).str.findall(PATRON_TOKEN.pattern).explode().dropna()
+        if explotado.empty:
+            continue
+        posiciones = explotado.index.to_numpy()
+        for token, ubicaciones in explotado.groupby(explotado.values, sort=False).indices.items():
+            tokens.setdefault(token, set()).update(posiciones[ubicaciones].tolist())
+    indice['tokens'] = tokens
+
+    _guardar_foto(nombre_archivo, indice)
+    _indices[nombre_archivo] = indice
+    return indice
+
+def _guardar_foto(nombre_archivo, indice):
+    """Guarda la foto del índice (reemplazo atómico) y vacía el registro de cambios"""
+    os.makedirs(CARPETA_INDICES, exist_ok=True)
+    ruta_foto, ruta_log = _rutas(nombre_archivo)
+    contenido = {
+        'firma': indice['firma'],
+        'total': indice['total'],
+        'borradas': indice['borradas'],
+        'tokens': {token: sorted(posiciones) for token, posiciones in indice['tokens'].items()},
+    }
+    temporal = ruta_foto + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(contenido, f)
+    os.replace(temporal, ruta_foto)
+    if os.path.exists(ruta_log):
+        os.remove(ruta_log)
+
+def _cargar_foto(nombre_archivo):
+    """Carga la foto y aplica el registro de cambios. Devuelve None si no sirve"""
+    ruta_foto, ruta_log = _rutas(nombre_archivo)
+    if not os.path.exists(ruta_foto):
+        return None
+    try:
+        with open(ruta_foto, 'r', encoding='utf-8') as f:
+            contenido = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    indice = _indice_vacio(contenido['firma'], contenido['total'])
+    indice['borradas'] = contenido['borradas']
+    indice['tokens'] = {token: set(posiciones) for token, posiciones in contenido['tokens'].items()}
+
+    lineas = 0
+    if os.path.exists(ruta_log):
+        with open(ruta_log, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    cambio = json.loads(linea)
+                except ValueError:
+                    break  # Línea incompleta: se ignora lo que sigue
+                if cambio['previa'] != indice['firma']:
+                    break
+                _aplicar_cambio(indice, cambio)
+                lineas += 1
+
+    if lineas > MAX_LINEAS_REGISTRO:
+        return None
+    return indice
+
+def obtener_indice(nombre_archivo, datos=None):
+    """
+    Devuelve el índice de la tabla al día con el archivo. Lo toma de memoria, de la
+    foto en disco o, si ninguno coincide con el archivo actual, lo reconstruye.
+    """
+    ruta = ruta_lectura(nombre_archivo)
+    if ruta is None:
+        return None
+    firma = list(firma_archivo(ruta))
+
+    indice = _indices.get(nombre_archivo)
+    if indice is None or indice['firma'] != firma:
+        indice = _cargar_foto(nombre_archivo)
+        if indice is None or indice['firma'] != firma:
+            return construir_indice(nombre_archivo, datos)
+        _indices[nombre_archivo] = indice
+    return indice
+
+# --- Mantenimiento incremental ---
+
+def _posicion_original(indice, posicion):
+    """Convierte la posición actual de una fila en su posición original en el índice"""
+    original = posicion
+    for borrada in indice['borradas']:
+        if borrada <= original:
+            original += 1
+        else:
+            break
+    return original
+
+def _agregar_tokens(indice, tokens, original):
+    for token in tokens:
+        if token not in indice['tokens']:
+            indice['vocabulario'] = None
+            indice['trigramas'] = None
+        indice['tokens'].setdefault(token, set()).add(original)
+
+def _quitar_tokens(indice, tokens, original):
+    for token in tokens:
+        posiciones = indice['tokens'].get(token)
+        if posiciones is not None:
+            posiciones.discard(original)
+
+def _aplicar_cambio(indice, cambio):
+    """Aplica una línea del registro de cambios sobre el índice en memoria"""
+    if cambio['op'] == 'alta':
+        _agregar_tokens(indice, cambio['nuevos'], indice['total'])
+        indice['total'] += 1
+    elif cambio['op'] == 'modificacion':
+        original = _posicion_original(indice, cambio['pos'])
+        _quitar_tokens(indice, cambio['viejos'], original)
+        _agregar_tokens(indice, cambio['nuevos'], original)
+    elif cambio['op'] == 'baja':
+        original = _posicion_original(indice, cambio['pos'])
+        _quitar_tokens(indice, cambio['viejos'], original)
+        bisect.insort(indice['borradas'], original)
+    indice['firma'] = cambio['firma']
+
+def _registrar(nombre_archivo, firma_previa, cambio):
+    """Agrega el cambio al registro en disco y al índice en memoria (si existen)"""
+    ruta_foto, ruta_log = _rutas(nombre_archivo)
+    if not os.path.exists(ruta_foto) or firma_previa is None:
+        return
+    ruta = ruta_lectura(nombre_archivo)
+    cambio['previa'] = list(firma_previa)
+    cambio['firma'] = list(firma_archivo(ruta))
+    with open(ruta_log, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(cambio, ensure_ascii=False) + '\n')
+
+    indice = _indices.get(nombre_archivo)
+    if indice is not None and indice['firma'] == cambio['previa']:
+        _aplicar_cambio(indice, cambio)
+
+def _tokens_fila(valores):
+    tokens = []
+    for valor in valores:
+        tokens.extend(tokenizar(valor))
+    return sorted(set(tokens))
+
+def registrar_alta(nombre_archivo, firma_previa, valores):
+    """Registra una fila agregada al final de la tabla"""
+    _registrar(nombre_archivo, firma_previa, {'op': 'alta', 'nuevos': _tokens_fila(valores)})
+
+def registrar_modificacion(nombre_archivo, firma_previa, posicion, valores_viejos, valores_nuevos):
+    """Registra la modificación de la fila en esa posición"""
+    _registrar(nombre_archivo, firma_previa, {
+        'op': 'modificacion', 'pos': posicion,
+        'viejos': _tokens_fila(valores_viejos), 'nuevos': _tokens_fila(valores_nuevos),
+    })
+
+def registrar_baja(nombre_archivo, firma_previa, posicion, valores):
+    """Registra la eliminación de la fila en esa posición"""
+    _registrar(nombre_archivo, firma_previa, {'op': 'baja', 'pos': posicion, 'viejos': _tokens_fila(valores)})
+
+# --- Consultas ---
+
+def _vocabulario(indice):
+    if indice['vocabulario'] is None:
+        indice['vocabulario'] = sorted(indice['tokens'])
+    return indice['vocabulario']
+
+def _trigramas(indice):
+    """Índice trigrama -> tokens del vocabulario, para búsquedas por subcadena"""
+    if indice['trigramas'] is None:
+        trigramas = {}
+        for token in _vocabulario(indice):
+            for i in range(len(token) - 2):
+                trigramas.setdefault(token[i:i + 3], set()).add(token)
+        indice['trigramas'] = trigramas
+    return indice['trigramas']
+
+def _tokens_con_prefijo(indice, prefijo):
+    vocabulario = _vocabulario(indice)
+    inicio = bisect.bisect_left(vocabulario, prefijo)
+    encontrados = []
+    for token in vocabulario[inicio:]:
+        if not token.startswith(prefijo):
+            break
+        encontrados.append(token)
+    return encontrados
+
+def _tokens_con_subcadena(indice, termino):
+    if len(termino) < 3:
+        return [token for token in _vocabulario(indice) if termino in token]
+    trigramas = _trigramas(indice)
+    candidatos = None
+    for i in range(len(termino) - 2):
+        tokens = trigramas.get(termino[i:i + 3], set())
+        candidatos = tokens if candidatos is None else candidatos & tokens
+        if not candidatos:
+            return []
+    return [token for token in candidatos if termino in token]
+
+def buscar_texto(nombre_archivo, texto, datos=None):
+    """
+    Devuelve las posiciones (ordenadas) de las filas que contienen el texto en
+    algún campo, sin distinguir mayúsculas ni acentos. Un término terminado en
+    '*' se busca como prefijo de palabra; el resto, como subcadena. Si ningún
+    término tiene letras o números (solo signos), no hay nada que buscar en el
+    índice y se recorre la tabla (buscar_subcadena).
+    """
+    terminos = texto.split()
+    if not terminos:
+        return []
+    if not any(tokenizar(termino.rstrip('*')) for termino in terminos):
+        return buscar_subcadena(nombre_archivo, texto, datos)
+
+    indice = obtener_indice(nombre_archivo, datos)
+    if indice is None:
+        return []
+
+    posiciones = None
+    for termino in terminos:
+        es_prefijo = termino.endswith('*')
+        for parte in tokenizar(termino.rstrip('*')):
+            if es_prefijo:
+                tokens = _tokens_con_prefijo(indice, parte)
+            else:
+                tokens = _tokens_con_subcadena(indice, parte)
+            encontradas = set()
+            for token in tokens:
+                encontradas |= indice['tokens'][token]
+            posiciones = encontradas if posiciones is None else posiciones & encontradas
+            if not posiciones:
+                return []
+
+    if posiciones is None:
+        return []
+    borradas = indice['borradas']
+    borradas_set = set(borradas)
+    return sorted(p - bisect.bisect_left(borradas, p) for p in posiciones if p not in borradas_set)
+
+def buscar_subcadena(nombre_archivo, texto, datos=None):
+    """Posiciones de las filas con el texto tal cual en algún campo (sin distinguir mayúsculas)"""
+    if datos is None:
+        datos = leer_archivo(nombre_archivo)
+    if datos is None:
+        return []
+    df = _valores_filas(datos)
+    coincide = pd.Series(False, index=df.index)
+    for col in df.columns:
+        coincide |= df[col].astype(str).str.contains(texto, case=False, regex=False) & df[col].notna()
+    return coincide.to_numpy().nonzero()[0].tolist()
+
+def filtrar_por_texto(datos, posiciones, texto):
+    """
+    Verifica los candidatos del índice: se queda con las filas donde algún campo
+    contiene el texto completo (normalizado). Con '*' en el texto no se verifica.
+    """
+    if '*' in texto:
+        return posiciones
+    buscado = _normalizar(texto)
+    df = _valores_filas(datos).iloc[posiciones]
+    coincide = pd.Series(False, index=df.index)
+    for col in df.columns:
+        coincide |= _normalizar_columna(df[col]).str.contains(buscado, regex=False)
+    return [pos for pos, ok in zip(posiciones, coincide.tolist()) if ok]
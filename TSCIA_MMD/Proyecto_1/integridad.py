@@ -0,0 +1,198 @@
+"""
+Módulo de integridad referencial entre las tablas de database.
+
+Las claves foráneas son las declaradas en RELACIONES_TABLAS (busqueda_inteligente):
+una columna de la tabla hija guarda IDs de la primera columna de la tabla
+padre. Una fila es huérfana si su valor no está entre esos IDs (las celdas
+vacías no se cuentan: la relación es opcional).
+
+La verificación completa lee cada tabla una sola vez y resuelve cada relación
+con un join por hash (Series.isin contra el conjunto de IDs del padre), sin
+recorrer fila por fila. Después de cada escritura se puede verificar solo lo
+que cambió: las filas nuevas o modificadas contra sus padres, y los IDs dados
+de baja contra las tablas hijas.
+"""
+import os
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+from herramientas import leer_archivo, ruta_database, ruta_lectura, firma_archivo
+from busqueda_inteligente import RELACIONES_TABLAS
+
+# IDs de cada tabla padre: ruta -> (firma, Index de IDs)
+_claves_padres = {}
+
+def relaciones():
+    """Relaciones declaradas como (tabla hija, número de columna, tabla padre)"""
+    lista = []
+    for hija, columnas in RELACIONES_TABLAS.items():
+        for clave, padre in columnas.items():
+            columna = int(clave.split('_')[1]) if str(clave).startswith('columna_') else int(clave)
+            lista.append((hija, columna, padre))
+    return lista
+
+def _nombre_relacion(nombre_archivo):
+    """Nombre con el que la tabla figura en RELACIONES_TABLAS (siempre .csv)"""
+    return os.path.splitext(os.path.basename(nombre_archivo))[0] + '.csv'
+
+def _tabla_vigente(nombre_relacion):
+    """Archivo en el que está hoy la tabla (puede haberse convertido a JSON o Parquet)"""
+    base = os.path.splitext(nombre_relacion)[0]
+    for ext in ('.csv', '.parquet', '.json'):
+        if os.path.exists(ruta_database(base + ext)):
+            return base + ext
+    return nombre_relacion if ruta_lectura(nombre_relacion) else None
+
+def _como_dataframe(datos):
+    """Tabla (DataFrame o lista JSON) como DataFrame con columnas por posición"""
+    if isinstance(datos, pd.DataFrame):
+        return datos
+    return pd.DataFrame([list(elemento.values()) if isinstance(elemento, dict) else elemento
+                         for elemento in datos])
+
+def _como_texto(serie):
+    """Valores como texto sin espacios, comparables entre tablas (nulos y vacíos -> NaN)"""
+    texto = serie.astype(str).str.strip()
+    return texto.where(serie.notna() & (texto != ''))
+
+def claves_de(nombre_padre):
+    """IDs de la tabla padre. Se recalculan solo si el archivo cambió"""
+    nombre = _tabla_vigente(nombre_padre)
+    if nombre is None:
+        return pd.Index([])
+    ruta = ruta_lectura(nombre)
+    firma = firma_archivo(ruta)
+    entrada = _claves_padres.get(ruta)
+    if entrada is not None and entrada[0] == firma:
+        return entrada[1]
+    datos = leer_archivo(nombre)
+    claves = pd.Index([])
+    if isinstance(datos, (pd.DataFrame, list)) and len(datos):
+        claves = pd.Index(_como_texto(_como_dataframe(datos)[0]).dropna().unique())
+    _claves_padres[ruta] = (firma, claves)
+    return claves
+
+def _huerfanas(df, hija, columna, padre, claves):
+    """Filas de df cuya columna no encuentra su ID en el padre"""
+    if columna not in df.columns:
+        return None
+    valores = _como_texto(df[columna])
+    mascara = valores.notna() & ~valores.isin(claves)
+    if not mascara.any():
+        return None
+    return {
+        'tabla': hija, 'columna': columna, 'padre': padre,
+        'posiciones': df.index[mascara].tolist(),
+        'valores': valores[mascara].tolist(),
+    }
+
+def verificar_integridad():
+    """
+    Verifica todas las relaciones. Cada tabla se lee una vez y cada relación se
+    resuelve con un join por hash. Devuelve la lista de problemas encontrados:
+    {'tabla', 'columna', 'padre', 'posiciones', 'valores'}.
+    """
+    problemas = []
+    for hija, columna, padre in relaciones():
+        nombre = _tabla_vigente(hija)
+        if nombre is None:
+            continue
+        datos = leer_archivo(nombre)
+        if not isinstance(datos, (pd.DataFrame, list)):
+            continue
+        problema = _huerfanas(_como_dataframe(datos), nombre, columna, padre, claves_de(padre))
+        if problema:
+            problemas.append(problema)
+    return problemas
+
+def verificar_filas(nombre_archivo, filas, posiciones=None):
+    """
+    Verificación incremental tras agregar o modificar: solo las filas dadas
+    (listas, dicts o DataFrame) contra las tablas padre de nombre_archivo.
+    posiciones son las de esas filas en la tabla, y son las que se informan
+    (sin ellas, las de las filas dentro de filas).
+    """
+    hija = _nombre_relacion(nombre_archivo)
+    propias = [(columna, padre) for tabla, columna, padre in relaciones() if tabla == hija]
+    if not propias or len(filas) == 0:
+        return []
+    df = _como_dataframe(filas if isinstance(filas, pd.DataFrame) else list(filas)).reset_index(drop=True)
+    if posiciones is not None:
+        df.index = list(posiciones)
+    problemas = []
+    for columna, padre in propias:
+        problema = _huerfanas(df, nombre_archivo, columna, padre, claves_de(padre))
+        if problema:
+            problemas.append(problema)
+    return problemas
+
+def verificar_bajas(nombre_archivo, ids):
+    """
+    Verificación incremental tras eliminar: busca en las tablas hijas las filas
+    que usan alguno de esos IDs, si ya no quedan en nombre_archivo.
+    """
+    padre = _nombre_relacion(nombre_archivo)
+    hijas = [(tabla, columna) for tabla, columna, p in relaciones() if p == padre]
+    ids = _como_texto(pd.Series(list(ids), dtype=object)).dropna()
+    if not hijas or ids.empty:
+        return []
+    quitados = pd.Index(ids[~ids.isin(claves_de(padre))].unique())
+    if quitados.empty:
+        return []
+    problemas = []
+    for tabla, columna in hijas:
+        nombre = _tabla_vigente(tabla)
+        if nombre is None:
+            continue
+        datos = leer_archivo(nombre)
+        if not isinstance(datos, (pd.DataFrame, list)):
+            continue
+        df = _como_dataframe(datos)
+        if columna not in df.columns:
+            continue
+        valores = _como_texto(df[columna])
+        mascara = valores.isin(quitados)
+        if mascara.any():
+            problemas.append({
+                'tabla': nombre, 'columna': columna, 'padre': nombre_archivo,
+                'posiciones': df.index[mascara].tolist(),
+                'valores': valores[mascara].tolist(),
+            })
+    return problemas
+
+def informar(problemas, maximo=10):
+    """Muestra las filas huérfanas encontradas (hasta maximo por relación)"""
+    if not problemas:
+        print("✓ Integridad referencial correcta")
+        return
+    for problema in problemas:
+        cantidad = len(problema['posiciones'])
+        print(f"✗ {problema['tabla']} columna {problema['columna']} -> {problema['padre']}: "
+              f"{cantidad} filas sin ID en la tabla padre")
+        for pos, valor in list(zip(problema['posiciones'], problema['valores']))[:maximo]:
+            print(f"    fila {pos}: {valor}")
+        if cantidad > maximo:
+            print(f"    ... y {cantidad - maximo} más")
+
+def avisar_cambios(nombre_archivo, filas=None, ids_eliminados=None, posiciones=None):
+    """
+    Verificación posterior a una escritura: avisa si las filas agregadas o
+    modificadas (en las posiciones dadas de la tabla), o los IDs eliminados,
+    dejan filas huérfanas. No bloquea el cambio (ya está guardado); solo lo informa.
+    """
+    problemas = []
+    if filas is not None:
+        problemas += verificar_filas(nombre_archivo, filas, posiciones)
+    if ids_eliminados:
+        problemas += verificar_bajas(nombre_archivo, ids_eliminados)
+    if problemas:
+        print("ℹ Aviso de integridad referencial:")
+        informar(problemas)
+    return problemas
+
+def menu_integridad():
+    """Verificación completa desde el menú principal"""
+    print("\n--- VERIFICACIÓN DE INTEGRIDAD REFERENCIAL ---")
+    for hija, columna, padre in relaciones():
+        print(f"  {hija} (columna {columna}) -> {padre}")
+    print()
+    informar(verificar_integridad())
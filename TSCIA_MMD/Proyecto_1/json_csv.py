@@ -1,60 +1,280 @@
 """
 Módulo para conversión entre formatos JSON y CSV
+
+Las conversiones se hacen por lotes: el archivo de origen se lee de a
+TAMANO_LOTE filas/elementos y el destino se escribe a medida que se codifica,
+así la memoria usada no depende del tamaño de la tabla. El destino se escribe
+en un archivo temporal y recién al terminar reemplaza al original. Mientras
+dura la conversión se retiene el bloqueo exclusivo de las dos tablas.
 """
 import os
-import pandas as pd
-from herramientas import leer_archivo, guardar_archivo, ruta_database, obtener_formato_archivo
+import re
+import json
+import collections
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+from herramientas import (guardar_archivo, ruta_database, ruta_lectura,
+                          obtener_formato_archivo, _leer_csv_por_lotes, _quitar_de_cache,
+                          _max_id_datos, _sincronizar_secuencia)
+from wal import checkpoint
+from bloqueos import bloqueo_escritura, TablaBloqueada
 
-def convertir_csv_a_json(nombre_csv):
-    """Convierte archivo CSV a JSON (reemplaza el original)"""
-    df = leer_archivo(nombre_csv, 'csv')
-    if df is None:
-        print(f"No se pudo leer el CSV: {nombre_csv}")
-        return False
+# Filas (CSV) o elementos (JSON) por lote al convertir
+TAMANO_LOTE = 50_000
+
+# Bytes que se leen por vez del JSON de origen
+TAMANO_BUFFER_JSON = 1024 * 1024
+
+def _texto_json(serie):
+    """Cada valor como string JSON (igual a json.dumps(str(valor), ensure_ascii=False))"""
+    texto = serie.fillna('nan') if serie.isna().any() else serie
+    if texto.str.contains(r'[\x00-\x1f]', regex=True).any():
+        return texto.map(lambda val: json.dumps(val, ensure_ascii=False))
+    return '"' + texto.str.replace('\\', '\\\\', regex=False).str.replace('"', '\\"', regex=False) + '"'
+
+def _codificar_lote_json(lote, sangria=True):
+    """
+    Codifica un lote de filas como elementos {"columna_i": "valor"}, columna por
+    columna. Con sangria=True usa el formato de json.dump(indent=2) dentro de una
+    lista; con sangria=False, una línea por elemento (JSON Lines).
+    """
+    if lote.empty:
+        return []
+    sangria_campo, separador = ('    ', ',\n') if sangria else ('', ', ')
+    campos = [f'{sangria_campo}{json.dumps(f"columna_{i}")}: ' + _texto_json(lote[col])
+              for i, col in enumerate(lote.columns)]
+    partes = campos[0].str.cat(campos[1:], sep=separador) if len(campos) > 1 else campos[0]
+    if sangria:
+        return ('  {\n' + partes + '\n  }').tolist()
+    return ('{' + partes + '}').tolist()
+
+def _codificar_lotes(lotes, codificar, procesos):
+    """
+    Codifica los lotes en orden. Con procesos > 1 los codifica en paralelo,
+    con a lo sumo 2 lotes pendientes por proceso para acotar la memoria.
+    """
+    if procesos <= 1:
+        for lote in lotes:
+            yield lote, codificar(lote)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        pendientes = collections.deque()
+        for lote in lotes:
+            pendientes.append((lote, ejecutor.submit(codificar, lote)))
+            if len(pendientes) >= 2 * procesos:
+                lote_listo, futuro = pendientes.popleft()
+                yield lote_listo, futuro.result()
+        while pendientes:
+            lote_listo, futuro = pendientes.popleft()
+            yield lote_listo, futuro.result()
+
+def _escribir_json_por_lotes(ruta_csv, ruta_destino, jsonl=False, procesos=1):
+    """Escribe el CSV como lista JSON (o JSON Lines) lote por lote. Devuelve el mayor ID"""
+    codificar = _codificar_lote_json if not jsonl else _codificar_lote_jsonl
+    max_id = 0
+    primero = True
+    with open(ruta_destino, 'w', encoding='utf-8') as f:
+        if not jsonl:
+            f.write('[')
+        for lote, elementos in _codificar_lotes(_leer_csv_por_lotes(ruta_csv, TAMANO_LOTE), codificar, procesos):
+            max_id = max(max_id, _max_id_datos(lote))
+            if not elementos:
+                continue
+            if jsonl:
+                f.write('\n'.join(elementos) + '\n')
+            else:
+                f.write(('\n' if primero else ',\n') + ',\n'.join(elementos))
+            primero = False
+        if not jsonl:
+            f.write(']' if primero else '\n]')
+    return max_id
+
+def _codificar_lote_jsonl(lote):
+    return _codificar_lote_json(lote, sangria=False)
+
+def _leer_elementos_json(ruta):
+    """
+    Recorre los elementos de un JSON de lista sin cargar el archivo completo.
+    Lanza ValueError si el archivo no es una lista.
+    """
+    decodificador = json.JSONDecoder()
+    separadores = re.compile(r'[\s,]*')
+    with open(ruta, 'r', encoding='utf-8') as f:
+        buffer = f.read(TAMANO_BUFFER_JSON).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError("el JSON no es una lista")
+        pos = 1
+        fin_archivo = False
+        while True:
+            pos = separadores.match(buffer, pos).end()
+            if buffer.startswith(']', pos):
+                return
+            try:
+                elemento, fin = decodificador.raw_decode(buffer, pos)
+                # Un número al final del buffer puede seguir en la próxima lectura
+                completo = fin_archivo or fin < len(buffer)
+            except ValueError:
+                if fin_archivo:
+                    raise
+                completo = False
+            if not completo:
+                # Elemento incompleto: descartar lo ya leído y leer más del archivo
+                mas = f.read(TAMANO_BUFFER_JSON)
+                fin_archivo = not mas
+                buffer = buffer[pos:] + mas
+                pos = 0
+                continue
+            yield elemento
+            pos = fin
+
+def _escribir_csv_por_lotes(ruta_json, ruta_destino):
+    """
+    Escribe los elementos del JSON como filas CSV (columnas según las claves del
+    primer elemento). Devuelve (cantidad de elementos, mayor ID).
+    """
+    claves = None
+    cantidad = 0
+    max_id = 0
+    lote = []
+    
+    columna_id = None
+    
+    def volcar(lote):
+        df = pd.DataFrame(lote)
+        df.to_csv(ruta_destino, mode='a', index=False, header=False)
+        if columna_id is None:
+            return 0
+        return _max_id_datos(df.iloc[:, [columna_id]])
     
-    # Convertir DataFrame a lista de diccionarios
-    datos_json = []
-    for _, fila in df.iterrows():
-        fila_dict = {f"columna_{i}": str(val) for i, val in enumerate(fila)}
-        datos_json.append(fila_dict)
+    open(ruta_destino, 'w').close()
+    for item in _leer_elementos_json(ruta_json):
+        if claves is None:
+            claves = list(item.keys())
+            # Misma regla que herramientas: primera clave con 'id' (o columna_0)
+            columna_id = next((i for i, clave in enumerate(claves)
+                               if 'id' in clave.lower() or clave == 'columna_0'), None)
+        lote.append([item.get(clave, '') for clave in claves])
+        cantidad += 1
+        if len(lote) >= TAMANO_LOTE:
+            max_id = max(max_id, volcar(lote))
+            lote = []
+    if lote:
+        max_id = max(max_id, volcar(lote))
+    return cantidad, max_id
+
+def _reemplazar_archivo(nombre_origen, nombre_destino, ruta_temporal, max_id):
+    """Publica el archivo convertido en database y elimina el original"""
+    ruta_destino = ruta_database(nombre_destino)
+    print("✓ Creando nuevo archivo en database" if not os.path.exists(ruta_destino)
+          else "✓ Actualizando versión en database")
+    _quitar_de_cache(ruta_destino)
+    os.replace(ruta_temporal, ruta_destino)
+    _sincronizar_secuencia(nombre_destino, max_id)
+    # La conversión no se registra como versión: releer la tabla convertida la
+    # cargaría entera en memoria. El próximo guardado registra el parche
+    # respecto de la última versión, que ya incluye estos cambios.
     
-    # Eliminar el archivo CSV original de database
-    ruta_csv = ruta_database(nombre_csv)
-    if os.path.exists(ruta_csv):
-        os.remove(ruta_csv)
+    # Eliminar el archivo original de database
+    ruta_origen = ruta_database(nombre_origen)
+    _quitar_de_cache(ruta_origen)
+    if os.path.exists(ruta_origen):
+        os.remove(ruta_origen)
+    from wal import descartar
+    descartar(nombre_destino)
+    print(f"✓ Archivo guardado en: {ruta_destino}")
+    return ruta_destino
+
+def convertir_csv_a_json(nombre_csv, procesos=1):
+    """
+    Convierte archivo CSV a JSON (reemplaza el original), por lotes.
+    Con procesos > 1 la codificación se reparte entre varios procesos.
+    """
+    try:
+        with bloqueo_escritura(nombre_csv, nombre_csv.replace('.csv', '.json')):
+            return _convertir_csv_a_json(nombre_csv, procesos)
+    except TablaBloqueada as e:
+        print(f"✗ No se pudo convertir {nombre_csv}: {e}")
+        return False
+
+def _convertir_csv_a_json(nombre_csv, procesos):
+    checkpoint(nombre_csv)
+    ruta_csv = ruta_lectura(nombre_csv)
+    if ruta_csv is None:
+        print(f"No se pudo leer el CSV: {nombre_csv}")
+        return False
     
     # Guardar como JSON con el mismo nombre base
     nombre_json = nombre_csv.replace('.csv', '.json')
-    return guardar_archivo(datos_json, nombre_json, 'json')
+    temporal = ruta_database(nombre_json) + ".tmp"
+    try:
+        max_id = _escribir_json_por_lotes(ruta_csv, temporal, procesos=procesos)
+    except Exception as e:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        print(f"No se pudo leer el CSV: {nombre_csv} ({e})")
+        return False
+    return _reemplazar_archivo(nombre_csv, nombre_json, temporal, max_id)
+
+def exportar_csv_a_jsonl(nombre_csv, procesos=1):
+    """
+    Exporta el CSV como JSON Lines (.jsonl, un elemento por línea) sin modificar
+    el original. El .jsonl queda en database pero el sistema no lo usa como tabla.
+    """
+    try:
+        with bloqueo_escritura(nombre_csv, nombre_csv.replace('.csv', '.jsonl')):
+            return _exportar_csv_a_jsonl(nombre_csv, procesos)
+    except TablaBloqueada as e:
+        print(f"✗ No se pudo exportar {nombre_csv}: {e}")
+        return None
+
+def _exportar_csv_a_jsonl(nombre_csv, procesos):
+    checkpoint(nombre_csv)
+    ruta_csv = ruta_lectura(nombre_csv)
+    if ruta_csv is None:
+        print(f"No se pudo leer el CSV: {nombre_csv}")
+        return None
+    destino = ruta_database(nombre_csv.replace('.csv', '.jsonl'))
+    temporal = destino + ".tmp"
+    try:
+        _escribir_json_por_lotes(ruta_csv, temporal, jsonl=True, procesos=procesos)
+    except Exception as e:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        print(f"No se pudo exportar el CSV: {nombre_csv} ({e})")
+        return None
+    os.replace(temporal, destino)
+    return destino
 
 def convertir_json_a_csv(nombre_json):
-    """Convierte archivo JSON a CSV (reemplaza el original)"""
-    datos = leer_archivo(nombre_json, 'json')
-    if datos is None:
+    """Convierte archivo JSON a CSV (reemplaza el original), por lotes"""
+    try:
+        with bloqueo_escritura(nombre_json, nombre_json.replace('.json', '.csv')):
+            return _convertir_json_a_csv(nombre_json)
+    except TablaBloqueada as e:
+        print(f"✗ No se pudo convertir {nombre_json}: {e}")
+        return False
+
+def _convertir_json_a_csv(nombre_json):
+    checkpoint(nombre_json)
+    ruta_json = ruta_lectura(nombre_json)
+    if ruta_json is None:
         print(f"No se pudo leer el JSON: {nombre_json}")
         return False
     
-    # Convertir a DataFrame
-    if isinstance(datos, list) and datos:
-        claves = list(datos[0].keys())
-        filas = []
-        for item in datos:
-            fila = [item.get(clave, '') for clave in claves]
-            filas.append(fila)
-        
-        df = pd.DataFrame(filas)
-        
-        # Eliminar el archivo JSON original de database
-        ruta_json = ruta_database(nombre_json)
-        if os.path.exists(ruta_json):
-            os.remove(ruta_json)
-        
-        # Guardar como CSV con el mismo nombre base
-        nombre_csv = nombre_json.replace('.json', '.csv')
-        return guardar_archivo(df, nombre_csv, 'csv')
-    else:
+    # Guardar como CSV con el mismo nombre base
+    nombre_csv = nombre_json.replace('.json', '.csv')
+    temporal = ruta_database(nombre_csv) + ".tmp"
+    try:
+        cantidad, max_id = _escribir_csv_por_lotes(ruta_json, temporal)
+    except (ValueError, AttributeError):
+        cantidad = 0
+    if not cantidad:
+        if os.path.exists(temporal):
+            os.remove(temporal)
         print("Formato JSON no soportado para conversión")
         return False
+    return _reemplazar_archivo(nombre_json, nombre_csv, temporal, max_id)
 
 def menu_conversion():
     """
@@ -65,9 +285,10 @@ def menu_conversion():
     print("\n--- CONVERSIÓN DE FORMATOS ---")
     print("1. Convertir CSV a JSON")
     print("2. Convertir JSON a CSV")
-    print("3. Volver al menú principal")
+    print("3. Exportar CSV a JSON Lines (.jsonl)")
+    print("4. Volver al menú principal")
     
-    opcion = input("Seleccione una opción (1-3): ").strip()
+    opcion = input("Seleccione una opción (1-4): ").strip()
     
     if opcion == '1':
         # Buscar archivos CSV disponibles
@@ -110,6 +331,22 @@ def menu_conversion():
             print("✗ Error en la conversión")
             
     elif opcion == '3':
+        csv_database = [f for f in listar_database() if f.endswith('.csv')]
+        if not csv_database:
+            print("No se encontraron archivos CSV en database para exportar.")
+            return
+        
+        print("\nArchivos CSV disponibles en database:")
+        archivo = elegir_archivo(csv_database, "Seleccione el archivo CSV a exportar: ")
+        if not archivo:
+            return
+        
+        destino = exportar_csv_a_jsonl(archivo)
+        if destino:
+            print(f"✓ Exportación exitosa: {archivo} -> {destino}")
+        else:
+            print("✗ Error en la exportación")
+    elif opcion == '4':
         return
     else:
         print("Opción inválida.")
@@ -0,0 +1,200 @@
+"""
+Módulo de lectura paginada de CSV grandes sobre un archivo mapeado en memoria.
+
+Para mostrar unas pocas filas no hace falta parsear la tabla: se mapea el
+archivo (mmap) y se recortan solo los bytes de las filas pedidas. Las primeras
+y las últimas filas se ubican recorriendo el archivo desde el principio o
+desde el final. Para ir a una fila cualquiera se usa un índice de inicios de
+línea que se arma una sola vez por archivo, se guarda en metadatos/lineas y
+se abre también mapeado, así la memoria usada no depende del tamaño de la tabla.
+
+Se asume una fila por línea (sin saltos de línea dentro de campos entre comillas).
+"""
+import os
+import io
+import mmap
+import json
+from perezoso import modulo_perezoso
+np = modulo_perezoso("numpy")
+pd = modulo_perezoso("pandas")
+from herramientas import CARPETA_META, firma_archivo, _limpiar_comillas
+
+CARPETA_LINEAS = os.path.join(CARPETA_META, "lineas")
+
+# Bytes que se recorren por vez al armar el índice o buscar desde el final
+TAMANO_VENTANA = 64 * 1024 * 1024
+
+# Índices abiertos: ruta -> (firma, array de inicios de línea)
+_indices = {}
+
+def _rutas(ruta_archivo):
+    carpeta, nombre = os.path.split(os.path.normpath(ruta_archivo))
+    base = os.path.join(CARPETA_LINEAS, f"{os.path.basename(carpeta)}__{nombre}")
+    return base + ".json", base + ".offsets"
+
+def _mapear(f):
+    """Mapea el archivo completo en solo lectura (None si está vacío)"""
+    if os.fstat(f.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _parsear(contenido):
+    """Convierte los bytes de unas filas en un DataFrame igual al de leer_archivo"""
+    if not contenido.strip():
+        return pd.DataFrame()
+    df = pd.read_csv(io.BytesIO(contenido), header=None, dtype=str, quoting=1)
+    return _limpiar_comillas(df)
+
+def _escribir_inicios(destino, mm, desde, hasta):
+    """Agrega al archivo destino los inicios de línea de mm[desde:hasta] (por ventanas)"""
+    total = 0
+    for inicio in range(desde, hasta, TAMANO_VENTANA):
+        fin = min(inicio + TAMANO_VENTANA, hasta)
+        ventana = np.frombuffer(mm, dtype=np.uint8, count=fin - inicio, offset=inicio)
+        saltos = np.flatnonzero(ventana == 10).astype(np.uint64) + np.uint64(inicio + 1)
+        # Un salto al final del archivo no abre una fila nueva
+        if len(saltos) and saltos[-1] == len(mm):
+            saltos = saltos[:-1]
+        saltos.tofile(destino)
+        total += len(saltos)
+    return total
+
+def construir_indice(ruta_archivo):
+    """Arma y guarda el índice de inicios de línea del archivo. Devuelve la cantidad de filas"""
+    os.makedirs(CARPETA_LINEAS, exist_ok=True)
+    ruta_meta, ruta_offsets = _rutas(ruta_archivo)
+    _indices.pop(ruta_archivo, None)
+    with open(ruta_archivo, 'rb') as f:
+        firma = firma_archivo(ruta_archivo)
+        mm = _mapear(f)
+        with open(ruta_offsets, 'wb') as destino:
+            filas = 0
+            if mm is not None:
+                np.array([0], dtype=np.uint64).tofile(destino)
+                filas = 1 + _escribir_inicios(destino, mm, 0, len(mm))
+                mm.close()
+    with open(ruta_meta, 'w', encoding='utf-8') as f:
+        json.dump({'firma': list(firma), 'filas': filas}, f)
+    return filas
+
+def registrar_anexo(ruta_archivo, firma_previa):
+    """
+    Extiende el índice tras anexar filas al final del archivo, recorriendo solo
+    los bytes nuevos. Si el índice no estaba al día se descarta.
+    """
+    ruta_meta, ruta_offsets = _rutas(ruta_archivo)
+    _indices.pop(ruta_archivo, None)
+    meta = _cargar_meta(ruta_meta)
+    if meta is None:
+        return
+    if firma_previa is None or meta['firma'] != list(firma_previa):
+        os.remove(ruta_meta)
+        return
+    tamano_previo = firma_previa[1]
+    with open(ruta_archivo, 'rb') as f:
+        mm = _mapear(f)
+        with open(ruta_offsets, 'ab') as destino:
+            nuevas = 0
+            if tamano_previo == 0:
+                np.array([0], dtype=np.uint64).tofile(destino)
+                nuevas = 1
+            # Desde el último byte previo: si era el salto de línea final, marca el inicio de la fila nueva
+            nuevas += _escribir_inicios(destino, mm, max(tamano_previo - 1, 0), len(mm))
+        mm.close()
+    meta['filas'] += nuevas
+    meta['firma'] = list(firma_archivo(ruta_archivo))
+    with open(ruta_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+def _cargar_meta(ruta_meta):
+    try:
+        with open(ruta_meta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def indice_lineas(ruta_archivo):
+    """
+    Devuelve el array (mapeado desde disco) con el byte de inicio de cada fila.
+    Lo arma la primera vez o si el archivo cambió.
+    """
+    firma = firma_archivo(ruta_archivo)
+    abierto = _indices.get(ruta_archivo)
+    if abierto is not None and abierto[0] == firma:
+        return abierto[1]
+
+    ruta_meta, ruta_offsets = _rutas(ruta_archivo)
+    meta = _cargar_meta(ruta_meta)
+    if meta is None or meta['firma'] != list(firma) or not os.path.exists(ruta_offsets):
+        construir_indice(ruta_archivo)
+        meta = _cargar_meta(ruta_meta)
+    if meta['filas'] == 0:
+        inicios = np.zeros(0, dtype=np.uint64)
+    else:
+        inicios = np.memmap(ruta_offsets, dtype=np.uint64, mode='r', shape=(meta['filas'],))
+    _indices[ruta_archivo] = (firma, inicios)
+    return inicios
+
+def contar_filas(ruta_archivo):
+    """Cantidad de filas del CSV (usa el índice de líneas)"""
+    return len(indice_lineas(ruta_archivo))
+
+def leer_filas(ruta_archivo, inicio, cantidad):
+    """Filas [inicio, inicio + cantidad) del CSV, con el índice de la tabla como posición"""
+    inicios = indice_lineas(ruta_archivo)
+    inicio = max(0, min(inicio, len(inicios)))
+    fin = min(inicio + cantidad, len(inicios))
+    if inicio >= fin:
+        return pd.DataFrame()
+    with open(ruta_archivo, 'rb') as f:
+        mm = _mapear(f)
+        hasta = int(inicios[fin]) if fin < len(inicios) else len(mm)
+        df = _parsear(mm[int(inicios[inicio]):hasta])
+        mm.close()
+    df.index = range(inicio, inicio + len(df))
+    return df
+
+def primeras_filas(ruta_archivo, cantidad=20):
+    """Primeras filas del CSV sin usar el índice: solo se leen los bytes necesarios"""
+    with open(ruta_archivo, 'rb') as f:
+        mm = _mapear(f)
+        if mm is None:
+            return pd.DataFrame()
+        fin = 0
+        for _ in range(cantidad):
+            salto = mm.find(b'\n', fin)
+            if salto == -1:
+                fin = len(mm)
+                break
+            fin = salto + 1
+        df = _parsear(mm[:fin])
+        mm.close()
+    return df
+
+def ultimas_filas(ruta_archivo, cantidad=20):
+    """
+    Últimas filas del CSV buscando saltos de línea desde el final. El índice de
+    la tabla indica la posición solo si ya se conoce la cantidad de filas.
+    """
+    with open(ruta_archivo, 'rb') as f:
+        mm = _mapear(f)
+        if mm is None:
+            return pd.DataFrame()
+        fin = len(mm)
+        # Ignorar el salto de línea final del archivo
+        inicio = fin - 1 if mm[fin - 1] == 10 else fin
+        for _ in range(cantidad):
+            salto = mm.rfind(b'\n', 0, inicio)
+            if salto == -1:
+                inicio = 0
+                break
+            inicio = salto
+        desde = inicio + 1 if mm[inicio] == 10 else inicio
+        df = _parsear(mm[desde:fin])
+        mm.close()
+
+    abierto = _indices.get(ruta_archivo)
+    if abierto is not None and abierto[0] == firma_archivo(ruta_archivo):
+        total = len(abierto[1])
+        df.index = range(total - len(df), total)
+    return df
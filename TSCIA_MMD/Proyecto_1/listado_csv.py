@@ -1,22 +1,89 @@
 import os
-import pandas as pd
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
 import json
-from herramientas import existe_en_database, CARPETA_DATABASE, CARPETA_HIST, leer_archivo, obtener_formato_archivo
+from herramientas import (existe_en_database, CARPETA_DATABASE, CARPETA_HIST, leer_archivo, obtener_formato_archivo,
+                          FORMATOS_TABLA, firma_archivo)
+from metricas import medir, tamano_legible
 
-def listar_archivos(directorio, formato=None):
-    """Devuelve una lista de archivos en el directorio especificado, opcionalmente filtrados por formato"""
+# Filas por página al mostrar resultados de búsquedas y consultas
+TAMANO_PAGINA = 20
+
+# Bytes del comienzo de un archivo que se leen para estimar cuántas filas tiene
+MUESTRA_ESTIMACION = 64 * 1024
+
+# Formatos de las tablas que se listan: los tabulares más JSON
+FORMATOS_LISTADO = FORMATOS_TABLA + ('json',)
+
+# Estimaciones de filas ya calculadas: ruta -> (firma, filas)
+_estimaciones_filas = {}
+
+def _entradas_archivos(directorio):
+    """Archivos del directorio en una sola pasada (os.scandir), sin los .tmp"""
     if not os.path.exists(directorio):
         return []
+    # Los .tmp son escrituras en curso (o interrumpidas), no tablas
+    with os.scandir(directorio) as entradas:
+        return sorted((e for e in entradas if e.is_file() and not e.name.endswith('.tmp')),
+                      key=lambda e: e.name)
+
+def catalogo(directorio):
+    """
+    Catálogo de las tablas del directorio sin abrir ningún archivo: solo se
+    listan y se consulta su tamaño y fecha. Cada entrada es
+    {'nombre', 'formato', 'bytes', 'mtime'}. Las filas se estiman aparte, y
+    solo cuando hacen falta, con estimar_filas.
+    """
+    catalogo_tablas = []
+    for entrada in _entradas_archivos(directorio):
+        datos_stat = entrada.stat()
+        catalogo_tablas.append({
+            'nombre': entrada.name,
+            'formato': obtener_formato_archivo(entrada.name),
+            'bytes': datos_stat.st_size,
+            'mtime': datos_stat.st_mtime,
+        })
+    return catalogo_tablas
+
+def estimar_filas(ruta):
+    """
+    Cantidad aproximada de filas (o elementos JSON) del archivo, leyendo solo
+    su comienzo: se cuentan las filas de la muestra y se proyectan al tamaño
+    total. Es exacta si el archivo entra en la muestra. None si no se puede.
+    """
+    firma = firma_archivo(ruta)
+    if firma is None:
+        return None
+    entrada = _estimaciones_filas.get(ruta)
+    if entrada is not None and entrada[0] == firma:
+        return entrada[1]
     
-    archivos = sorted([f for f in os.listdir(directorio) if os.path.isfile(os.path.join(directorio, f))])
-    
-    if formato:
-        if formato == 'csv':
-            archivos = [f for f in archivos if f.lower().endswith('.csv')]
-        elif formato == 'json':
-            archivos = [f for f in archivos if f.lower().endswith('.json')]
+    formato = obtener_formato_archivo(ruta)
+    filas = None
+    try:
+        if formato == 'parquet':
+            import pyarrow.parquet as pq
+            filas = pq.ParquetFile(ruta).metadata.num_rows
+        elif formato in ('csv', 'json'):
+            with open(ruta, 'rb') as f:
+                muestra = f.read(MUESTRA_ESTIMACION)
+            # En CSV cada fila es una línea; en JSON cada elemento abre una llave
+            marcas = muestra.count(b'\n') if formato == 'csv' else muestra.count(b'{')
+            if formato == 'csv' and muestra and not muestra.endswith(b'\n') and len(muestra) == firma[1]:
+                marcas += 1  # Última fila sin salto de línea
+            filas = marcas if len(muestra) >= firma[1] else round(marcas * firma[1] / len(muestra))
+    except Exception:
+        filas = None
+    _estimaciones_filas[ruta] = (firma, filas)
+    return filas
+
+def listar_archivos(directorio, formato=None):
+    """Devuelve una lista de archivos en el directorio especificado, opcionalmente filtrados por formato"""
+    archivos = [e.name for e in _entradas_archivos(directorio)]
     
-    return archivos
+    # Sin formato se listan solo las tablas (no las exportaciones JSONL ni otros archivos)
+    formatos = (formato,) if formato else FORMATOS_LISTADO
+    return [f for f in archivos if obtener_formato_archivo(f) in formatos]
 
 def mostrar_archivo(ruta, formato=None):
     """Lee e imprime las primeras filas/elementos de un archivo"""
@@ -24,12 +91,13 @@ def mostrar_archivo(ruta, formato=None):
         nombre_archivo = os.path.basename(ruta)
         if formato is None:
             formato = obtener_formato_archivo(nombre_archivo)
+        if os.path.dirname(os.path.normpath(ruta)) == os.path.normpath(CARPETA_DATABASE):
+            # Se muestra el archivo en disco: primero se escriben los cambios del WAL
+            from wal import checkpoint
+            checkpoint(nombre_archivo)
         
         if formato == 'csv':
-            df = pd.read_csv(ruta, header=None)
-            print(f"\nArchivo mostrado: {nombre_archivo}")
-            print(df.head(20))
-            print(f"Filas: {len(df)} | Columnas: {len(df.columns)}\n")
+            _mostrar_csv_paginado(ruta, nombre_archivo)
         elif formato == 'json':
             with open(ruta, 'r', encoding='utf-8') as f:
                 datos = json.load(f)
@@ -41,34 +109,90 @@ def mostrar_archivo(ruta, formato=None):
             else:
                 print(datos)
             print()
+        elif formato == 'parquet':
+            _mostrar_parquet(ruta, nombre_archivo)
     except Exception as e:
         print(f"Error al leer el archivo: {e}")
 
+def _mostrar_csv_paginado(ruta, nombre_archivo, tamano_pagina=20):
+    """
+    Muestra el CSV por páginas leyendo solo las filas de cada página (mmap),
+    sin cargar la tabla completa.
+    """
+    from lector_mmap import primeras_filas, ultimas_filas, leer_filas, contar_filas
+    
+    df = primeras_filas(ruta, tamano_pagina)
+    total = contar_filas(ruta)
+    print(f"\nArchivo mostrado: {nombre_archivo}")
+    print(df)
+    print(f"Filas: {total} | Columnas: {len(df.columns)}\n")
+    if total <= tamano_pagina:
+        return
+    
+    inicio = 0
+    while True:
+        opcion = input("Enter = salir | s = siguiente | a = anterior | u = últimas | número = ir a esa fila: ").strip().lower()
+        if not opcion:
+            return
+        if opcion == 's':
+            inicio = min(inicio + tamano_pagina, max(total - tamano_pagina, 0))
+        elif opcion == 'a':
+            inicio = max(inicio - tamano_pagina, 0)
+        elif opcion == 'u':
+            inicio = max(total - tamano_pagina, 0)
+            print(ultimas_filas(ruta, tamano_pagina))
+            continue
+        elif opcion.isdigit():
+            inicio = min(int(opcion), max(total - 1, 0))
+        else:
+            print("Opción inválida.")
+            continue
+        print(leer_filas(ruta, inicio, tamano_pagina))
+
+def _mostrar_parquet(ruta, nombre_archivo, max_rows=20):
+    """Muestra las primeras filas leyendo solo el primer grupo de filas del Parquet"""
+    import pyarrow.parquet as pq
+    archivo = pq.ParquetFile(ruta)
+    filas = archivo.metadata.num_rows
+    df = archivo.read_row_group(0).to_pandas() if archivo.num_row_groups else pd.DataFrame()
+    df.columns = range(len(df.columns))
+    print(f"\nArchivo mostrado: {nombre_archivo}")
+    print(df.head(max_rows))
+    print(f"Filas: {filas} | Columnas: {archivo.metadata.num_columns}\n")
+
 def levantar_archivos():
     """
-    Función para levantar todos los CSV y JSON disponibles.
-    Retorna: (bandera, conteo_csv, conteo_json)
+    Función para levantar todos los CSV, JSON y Parquet disponibles.
+    Retorna: (bandera, conteo_csv, conteo_json, conteo_parquet)
     """
-    print("\n¿Desea levantar todos los CSV y JSON disponibles?")
+    print("\n¿Desea levantar todos los CSV, JSON y Parquet disponibles?")
     respuesta = input("Ingrese 'si' para levantar todos los archivos, o 'no' para salir: ").strip().lower()
     
     if respuesta in ('si', 's', 'yes', 'y'):
-        # Contar archivos en database e hist
-        csv_database = listar_archivos(CARPETA_DATABASE, 'csv')
-        json_database = listar_archivos(CARPETA_DATABASE, 'json')
-        csv_hist = listar_archivos(CARPETA_HIST, 'csv')
-        json_hist = listar_archivos(CARPETA_HIST, 'json')
+        # Contar archivos en database e hist con el catálogo (sin abrir las tablas:
+        # cada una se lee recién cuando el operador la usa)
+        catalogo_database = catalogo(CARPETA_DATABASE)
+        catalogo_hist = catalogo(CARPETA_HIST)
+        
+        def contar(entradas, formato):
+            return sum(1 for e in entradas if e['formato'] == formato)
         
-        total_csv = len(csv_database) + len(csv_hist)
-        total_json = len(json_database) + len(json_hist)
+        csv_database, json_database = contar(catalogo_database, 'csv'), contar(catalogo_database, 'json')
+        csv_hist, json_hist = contar(catalogo_hist, 'csv'), contar(catalogo_hist, 'json')
+        parquet_database, parquet_hist = contar(catalogo_database, 'parquet'), contar(catalogo_hist, 'parquet')
+        total_csv = csv_database + csv_hist
+        total_json = json_database + json_hist
+        total_parquet = parquet_database + parquet_hist
+        total_bytes = sum(e['bytes'] for e in catalogo_database + catalogo_hist)
         
-        print(f"\n✓ Se detectaron {total_csv} archivos CSV y {total_json} archivos JSON")
-        print(f"  - Database: {len(csv_database)} CSV, {len(json_database)} JSON")
-        print(f"  - Históricos: {len(csv_hist)} CSV, {len(json_hist)} JSON")
+        print(f"\n✓ Se detectaron {total_csv} archivos CSV, {total_json} archivos JSON y "
+              f"{total_parquet} archivos Parquet ({tamano_legible(total_bytes)})")
+        print(f"  - Database: {csv_database} CSV, {json_database} JSON, {parquet_database} Parquet")
+        print(f"  - Históricos: {csv_hist} CSV, {json_hist} JSON, {parquet_hist} Parquet")
         
-        return True, total_csv, total_json
+        return True, total_csv, total_json, total_parquet
     else:
-        return False, 0, 0
+        return False, 0, 0, 0
 
 def preguntar_formato_guardado(nombre_base):
     """
@@ -78,15 +202,18 @@ def preguntar_formato_guardado(nombre_base):
     print("¿En qué formato desea guardar?")
     print("1. CSV")
     print("2. JSON")
+    print("3. Parquet (binario por columnas)")
     
     while True:
-        opcion = input("Seleccione formato (1-2): ").strip()
+        opcion = input("Seleccione formato (1-3): ").strip()
         if opcion == '1':
             return f"{nombre_base}.csv"
         elif opcion == '2':
             return f"{nombre_base}.json"
+        elif opcion == '3':
+            return f"{nombre_base}.parquet"
         else:
-            print("Opción inválida. Seleccione 1 para CSV o 2 para JSON.")
+            print("Opción inválida. Seleccione 1 para CSV, 2 para JSON o 3 para Parquet.")
 
 def leer_archivos():
     """Permite elegir entre leer archivos de database o históricos (solo lectura)"""
@@ -113,9 +240,10 @@ def leer_archivos():
     print("\n¿Qué formato desea listar?")
     print("1. CSV")
     print("2. JSON")
-    print("3. Ambos formatos")
+    print("3. Parquet")
+    print("4. Todos los formatos")
     
-    opcion_formato = input("Seleccione una opción (1-3): ").strip()
+    opcion_formato = input("Seleccione una opción (1-4): ").strip()
     
     if opcion_formato == "1":
         formato = 'csv'
@@ -124,8 +252,11 @@ def leer_archivos():
         formato = 'json'
         tipo_formato = "JSON"
     elif opcion_formato == "3":
+        formato = 'parquet'
+        tipo_formato = "Parquet"
+    elif opcion_formato == "4":
         formato = None
-        tipo_formato = "CSV y JSON"
+        tipo_formato = "CSV, JSON y Parquet"
     else:
         print("\nOpción inválida.\n")
         return
@@ -135,12 +266,17 @@ def leer_archivos():
         print(f"\nNo se encontraron archivos {tipo_formato} {tipo} en '{directorio}'.\n")
         return
 
+    tamanos = {e['nombre']: e['bytes'] for e in catalogo(directorio)}
     print(f"\nArchivos disponibles ({tipo_formato} {tipo}):")
     for i, archivo in enumerate(archivos, 1):
+        filas = estimar_filas(os.path.join(directorio, archivo))
+        detalle = tamano_legible(tamanos.get(archivo, 0))
+        if filas is not None:
+            detalle += f", ~{filas} filas"
         if tipo == "históricos (SOLO LECTURA)":
-            print(f"{i}. {archivo} (SOLO LECTURA)")
+            print(f"{i}. {archivo} ({detalle}) (SOLO LECTURA)")
         else:
-            print(f"{i}. {archivo}")
+            print(f"{i}. {archivo} ({detalle})")
 
     try:
         seleccion = int(input("Seleccione el número del archivo a leer: "))
@@ -166,6 +302,7 @@ def listar_historicos():
     """Devuelve lista ordenada de archivos en tablas_hist"""
     return listar_archivos(CARPETA_HIST)
 
+@medir('mostrar_preview')
 def mostrar_preview(datos, nombre, max_rows=20):
     """Imprime un resumen (preview) del DataFrame o datos JSON recibidos"""
     if datos is None:
@@ -175,7 +312,7 @@ def mostrar_preview(datos, nombre, max_rows=20):
     formato = obtener_formato_archivo(nombre)
     print(f"\nArchivo mostrado: {nombre}")
     
-    if formato == 'csv' and isinstance(datos, pd.DataFrame):
+    if formato in FORMATOS_TABLA and isinstance(datos, pd.DataFrame):
         print(datos.head(max_rows))
         print(f"Filas: {len(datos)} | Columnas: {len(datos.columns)}\n")
     elif formato == 'json':
@@ -187,6 +324,60 @@ def mostrar_preview(datos, nombre, max_rows=20):
             print(datos)
         print()
 
+def pagina_resultados(datos, posiciones, desde, tamano_pagina=TAMANO_PAGINA):
+    """
+    Una página de resultados: las filas de datos en posiciones[desde:desde + tamano_pagina].
+    Para tablas es un DataFrame; para JSON, una lista de (posición, elemento).
+    Solo se copian las filas de la página, no el resultado completo.
+    """
+    tramo = list(posiciones[desde:desde + tamano_pagina])
+    if isinstance(datos, pd.DataFrame):
+        return datos.iloc[tramo]
+    return [(pos, datos[pos]) for pos in tramo]
+
+def _imprimir_pagina(pagina, mostrar_indice):
+    if isinstance(pagina, pd.DataFrame):
+        print(pagina if mostrar_indice else pagina.to_string(index=False))
+    else:
+        for pos, elemento in pagina:
+            print(f"{pos}: {elemento}")
+
+def mostrar_resultados(datos, posiciones, vacio="No se encontraron coincidencias.", solo_contar=False,
+                       tamano_pagina=TAMANO_PAGINA, mostrar_indice=True):
+    """
+    Muestra las filas de datos (DataFrame o lista JSON) que están en posiciones,
+    una página por vez: solo se arma y formatea la página visible, así la
+    memoria y el tiempo dependen del tamaño de página y no de la cantidad de
+    resultados. Con solo_contar se informa la cantidad sin mostrar filas.
+    """
+    total = len(posiciones)
+    if total == 0:
+        print(vacio)
+        return
+    if solo_contar:
+        print(f"Coincidencias: {total}")
+        return
+    
+    inicio = 0
+    while True:
+        _imprimir_pagina(pagina_resultados(datos, posiciones, inicio, tamano_pagina), mostrar_indice)
+        print(f"Resultados {inicio + 1}-{min(inicio + tamano_pagina, total)} de {total}")
+        if total <= tamano_pagina:
+            return
+        opcion = input("Enter = salir | s = siguiente | a = anterior | u = últimos | número = ir a ese resultado: ").strip().lower()
+        if not opcion:
+            return
+        if opcion == 's':
+            inicio = min(inicio + tamano_pagina, max(total - tamano_pagina, 0))
+        elif opcion == 'a':
+            inicio = max(inicio - tamano_pagina, 0)
+        elif opcion == 'u':
+            inicio = max(total - tamano_pagina, 0)
+        elif opcion.isdigit():
+            inicio = min(max(int(opcion) - 1, 0), total - 1)
+        else:
+            print("Opción inválida.")
+
 def elegir_archivo(lista, prompt):
     """Muestra una lista numerada y devuelve el nombre seleccionado (o None)"""
     if not lista:
@@ -0,0 +1,293 @@
+"""
+Operaciones por lote (sin input()) sobre las tablas de database, y su CLI.
+
+Cada operación lee la tabla una vez, aplica todas las filas del lote en
+memoria y guarda con una única llamada a guardar_archivo, así el lote genera
+una sola escritura y una sola versión en el historial (versiones.py). Todo el
+lote se hace con el bloqueo exclusivo de la tabla: ningún otro operador la
+cambia entre la lectura y la escritura. Después de escribir se verifican
+solo las filas del lote contra las relaciones de la tabla (integridad.py).
+
+Uso desde la carpeta del proyecto (donde están database/ y tablas_hist/):
+    python lote.py insertar clientes.csv --desde nuevos.csv [--ids-automaticos]
+    python lote.py actualizar clientes.csv --desde cambios.csv
+    python lote.py eliminar clientes.csv --donde 4 == 12 [--donde 1 != Ana] [--donde 0 '>' 5]
+    python lote.py eliminar clientes.csv --ids 3,7,9
+    python lote.py eliminar factura_det.csv --filtro "col1 between 10 and 20 and col3 = 0"
+"""
+import sys
+import json
+import math
+import argparse
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+from bloqueos import bloqueo_escritura
+from filtros import mascara as mascara_expresion
+from integridad import avisar_cambios
+from herramientas import (leer_archivo, guardar_archivo, reservar_nuevo_id, existe_en_database,
+                          obtener_formato_archivo, mascara_filtros, FORMATOS_TABLA, _normalizar_como_lectura)
+
+def _clave_id(elemento):
+    """Clave del ID de un elemento JSON (primera con 'id' o columna_0), o None"""
+    for key in elemento:
+        if 'id' in key.lower() or key == 'columna_0':
+            return key
+    return None
+
+def _leer_tabla(nombre_archivo):
+    if not existe_en_database(nombre_archivo):
+        print(f"No existe archivo en database: {nombre_archivo}")
+        return None
+    datos = leer_archivo(nombre_archivo)
+    if datos is None:
+        print(f"No se pudo leer el archivo: {nombre_archivo}")
+        return None
+    if obtener_formato_archivo(nombre_archivo) == 'json' and not isinstance(datos, list):
+        print("Solo se pueden procesar por lote JSON con formato de lista")
+        return None
+    return datos
+
+def _como_dataframe(filas, columnas):
+    """Filas (listas o DataFrame) como DataFrame de textos con columnas 0..n"""
+    df = filas if isinstance(filas, pd.DataFrame) else pd.DataFrame([list(fila) for fila in filas])
+    df = _normalizar_como_lectura(df)
+    if len(df.columns) != columnas:
+        raise ValueError(f"las filas tienen {len(df.columns)} columnas y la tabla {columnas}")
+    return df
+
+def insertar_lote(nombre_archivo, filas, ids_automaticos=False):
+    """
+    Agrega todas las filas (listas o DataFrame en CSV/Parquet, dicts en JSON) al
+    final de la tabla con una sola escritura. Con ids_automaticos=True se ignora
+    el ID de cada fila y se reserva un bloque de IDs nuevos de la secuencia.
+    Devuelve la cantidad de filas agregadas, o None si hubo error.
+    """
+    with bloqueo_escritura(nombre_archivo):
+        datos = _leer_tabla(nombre_archivo)
+        if datos is None:
+            return None
+        if len(filas) == 0:
+            return 0
+
+        inicio = len(datos)
+        if isinstance(datos, pd.DataFrame):
+            nuevas = _como_dataframe(filas, len(datos.columns))
+            if ids_automaticos:
+                primero = reservar_nuevo_id(nombre_archivo, datos, cantidad=len(nuevas))
+                nuevas[0] = [str(i) for i in range(primero, primero + len(nuevas))]
+            datos = pd.concat([datos, nuevas], ignore_index=True)
+        else:
+            nuevas = [dict(fila) for fila in filas]
+            if ids_automaticos:
+                primero = reservar_nuevo_id(nombre_archivo, datos, cantidad=len(nuevas))
+                for i, elemento in enumerate(nuevas):
+                    clave = _clave_id(elemento) or (_clave_id(datos[0]) if datos else None)
+                    if clave:
+                        elemento[clave] = str(primero + i)
+            datos = datos + nuevas
+
+        if guardar_archivo(datos, nombre_archivo) is None:
+            return None
+        avisar_cambios(nombre_archivo, filas=nuevas, posiciones=range(inicio, inicio + len(nuevas)))
+        return len(nuevas)
+
+def actualizar_lote(nombre_archivo, cambios):
+    """
+    Actualiza filas por ID. cambios es {id: {columna: valor}} (en JSON, columna
+    es la clave del elemento). Si un ID está repetido se actualizan todas sus
+    filas. Devuelve (filas actualizadas, IDs no encontrados), o None si error.
+    """
+    with bloqueo_escritura(nombre_archivo):
+        datos = _leer_tabla(nombre_archivo)
+        if datos is None:
+            return None
+
+        if isinstance(datos, pd.DataFrame):
+            posiciones = datos.groupby(datos[0].astype(str).str.strip(), sort=False).indices
+        else:
+            posiciones = {}
+            for pos, elemento in enumerate(datos):
+                clave = _clave_id(elemento) if isinstance(elemento, dict) else None
+                if clave is not None:
+                    posiciones.setdefault(str(elemento[clave]).strip(), []).append(pos)
+
+        actualizadas = 0
+        no_encontrados = []
+        tocadas = []
+        for id_fila, valores in cambios.items():
+            filas = posiciones.get(str(id_fila).strip())
+            if filas is None or len(filas) == 0:
+                no_encontrados.append(id_fila)
+                continue
+            for columna, valor in valores.items():
+                if isinstance(datos, pd.DataFrame):
+                    datos.iloc[filas, datos.columns.get_loc(int(columna))] = valor
+                else:
+                    for pos in filas:
+                        datos[pos][columna] = valor
+            actualizadas += len(filas)
+            tocadas.extend(filas)
+
+        if actualizadas and guardar_archivo(datos, nombre_archivo) is None:
+            return None
+        if isinstance(datos, pd.DataFrame):
+            avisar_cambios(nombre_archivo, filas=datos.iloc[tocadas], posiciones=tocadas)
+        else:
+            avisar_cambios(nombre_archivo, filas=[datos[pos] for pos in tocadas], posiciones=tocadas)
+        return actualizadas, no_encontrados
+
+def eliminar_lote(nombre_archivo, filtros=None, ids=None, predicado=None, expresion=None):
+    """
+    Elimina con una sola escritura las filas que cumplen todas las condiciones
+    dadas: filtros [(columna, operador, valor)] como en leer_archivo, lista de
+    ids, predicado (función que recibe el DataFrame y devuelve una máscara),
+    y/o expresion (texto con la sintaxis de filtros.py).
+    En JSON las columnas son las claves de los elementos.
+    Devuelve la cantidad de filas eliminadas, o None si error.
+    """
+    if not filtros and ids is None and predicado is None and not expresion:
+        print("Indique al menos una condición para eliminar.")
+        return None
+    with bloqueo_escritura(nombre_archivo):
+        datos = _leer_tabla(nombre_archivo)
+        if datos is None:
+            return None
+
+        if isinstance(datos, pd.DataFrame):
+            df = datos
+            columna_id = 0
+        else:
+            df = pd.DataFrame(datos).astype(str)
+            columna_id = _clave_id(datos[0]) if datos else None
+
+        mascara = pd.Series(True, index=df.index)
+        if filtros:
+            mascara &= mascara_filtros(df, filtros)
+        if ids is not None:
+            if columna_id is None:
+                print("La tabla no tiene columna de ID.")
+                return None
+            mascara &= df[columna_id].astype(str).str.strip().isin([str(i).strip() for i in ids])
+        if predicado is not None:
+            mascara &= pd.Series(predicado(df), index=df.index).fillna(False).astype(bool)
+        if expresion:
+            mascara &= pd.Series(mascara_expresion(datos, expresion, nombre_archivo), index=df.index)
+
+        eliminadas = int(mascara.sum())
+        if not eliminadas:
+            return 0
+        ids_eliminados = df[columna_id][mascara].tolist() if columna_id is not None else []
+        if isinstance(datos, pd.DataFrame):
+            datos = datos[~mascara].reset_index(drop=True)
+        else:
+            datos = [elemento for elemento, borrar in zip(datos, mascara.tolist()) if not borrar]
+        if guardar_archivo(datos, nombre_archivo) is None:
+            return None
+        avisar_cambios(nombre_archivo, ids_eliminados=ids_eliminados)
+        return eliminadas
+
+# --- CLI ---
+
+def _leer_origen(ruta, tabla_es_json):
+    """Filas de un archivo de entrada: CSV sin encabezado o JSON de lista"""
+    if ruta.lower().endswith('.json'):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            filas = json.load(f)
+        if not isinstance(filas, list):
+            raise ValueError("el JSON de entrada debe ser una lista")
+        return filas
+    df = pd.read_csv(ruta, header=None, dtype=str, keep_default_na=False)
+    if tabla_es_json:
+        raise ValueError("para tablas JSON la entrada debe ser un JSON de lista")
+    return df
+
+def _cambios_desde(filas):
+    """
+    Convierte las filas de entrada en {id: {columna: valor}}. La primera columna
+    (o la clave de ID en JSON) es el ID; las celdas vacías no se modifican.
+    """
+    cambios = {}
+    if isinstance(filas, pd.DataFrame):
+        for fila in filas.itertuples(index=False):
+            cambios[fila[0]] = {i: valor for i, valor in enumerate(fila) if i > 0 and valor != ''}
+    else:
+        for elemento in filas:
+            clave = _clave_id(elemento)
+            if clave is None:
+                raise ValueError(f"elemento sin ID: {elemento}")
+            cambios[elemento[clave]] = {k: v for k, v in elemento.items() if k != clave and v != ''}
+    return cambios
+
+def _como_valor(texto):
+    """Un valor numérico se compara como número (10 > 5), el resto como texto"""
+    for tipo in (int, float):
+        try:
+            valor = tipo(texto)
+        except ValueError:
+            continue
+        if math.isfinite(valor):
+            return valor
+    return texto
+
+def _parsear_filtro(partes):
+    columna, operador, valor = partes
+    if operador in ('in', 'not in'):
+        valor = valor.split(',')
+    else:
+        valor = _como_valor(valor)
+    return (int(columna) if columna.isdigit() else columna), operador, valor
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Operaciones por lote sobre las tablas de database")
+    sub = parser.add_subparsers(dest='operacion', required=True)
+
+    p_insertar = sub.add_parser('insertar', aliases=['insert'], help="Agrega filas desde un archivo")
+    p_insertar.add_argument('tabla')
+    p_insertar.add_argument('--desde', required=True, help="CSV sin encabezado o JSON de lista")
+    p_insertar.add_argument('--ids-automaticos', action='store_true',
+                            help="Asigna IDs nuevos de la secuencia de la tabla")
+
+    p_actualizar = sub.add_parser('actualizar', aliases=['update'], help="Actualiza filas por ID")
+    p_actualizar.add_argument('tabla')
+    p_actualizar.add_argument('--desde', required=True,
+                              help="Filas con el ID en la primera columna; las celdas vacías no se cambian")
+
+    p_eliminar = sub.add_parser('eliminar', aliases=['delete'], help="Elimina filas que cumplen condiciones")
+    p_eliminar.add_argument('tabla')
+    p_eliminar.add_argument('--donde', nargs=3, action='append', metavar=('COLUMNA', 'OPERADOR', 'VALOR'),
+                            help="Condición (se puede repetir): ==, !=, <, <=, >, >=, in, 'not in'. "
+                                 "Los valores numéricos se comparan como números")
+    p_eliminar.add_argument('--ids', help="IDs separados por coma")
+    p_eliminar.add_argument('--filtro', help="Expresión de filtro, ej: \"col4 = 12 and col1 ~ gom\"")
+
+    args = parser.parse_args(argumentos)
+    tabla_es_json = obtener_formato_archivo(args.tabla) == 'json'
+    if not tabla_es_json and obtener_formato_archivo(args.tabla) not in FORMATOS_TABLA:
+        print(f"Formato no soportado: {args.tabla}")
+        return 1
+
+    try:
+        if args.operacion in ('insertar', 'insert'):
+            resultado = insertar_lote(args.tabla, _leer_origen(args.desde, tabla_es_json), args.ids_automaticos)
+            if resultado is not None:
+                print(f"✓ {resultado} filas agregadas a {args.tabla}")
+        elif args.operacion in ('actualizar', 'update'):
+            resultado = actualizar_lote(args.tabla, _cambios_desde(_leer_origen(args.desde, tabla_es_json)))
+            if resultado is not None:
+                actualizadas, no_encontrados = resultado
+                print(f"✓ {actualizadas} filas actualizadas en {args.tabla}")
+                if no_encontrados:
+                    print(f"✗ IDs no encontrados: {', '.join(str(i) for i in no_encontrados)}")
+        else:
+            filtros = [_parsear_filtro(partes) for partes in args.donde or []]
+            ids = args.ids.split(',') if args.ids else None
+            resultado = eliminar_lote(args.tabla, filtros=filtros, ids=ids, expresion=args.filtro)
+            if resultado is not None:
+                print(f"✓ {resultado} filas eliminadas de {args.tabla}")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"✗ Error: {e}")
+        return 1
+    return 0 if resultado is not None else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,19 +4,25 @@ from listado_csv import (levantar_archivos, leer_archivos, listar_database, list
 from json_csv import menu_conversion
 from busqueda_inteligente import RELACIONES_TABLAS
 from comparador import menu_comparacion  # ← AGREGAR ESTE NUEVO IMPORT
+from wal import recuperar, checkpoint_todos
+from integridad import menu_integridad
+from motor_sqlite import menu_sqlite, exportar_modificadas
+from consultas import menu_consultas
+from metricas import menu_estadisticas
 
 def menu():
     # Bandera para controlar si se levantaron todos los archivos
     archivos_levantados = False
     conteo_csv = 0
     conteo_json = 0
+    conteo_parquet = 0
     
     # Al iniciar el programa, preguntar inmediatamente si desea levantar archivos
     print("=" * 70)
     print("SISTEMA DE GESTIÓN DE ARCHIVOS")
     print("=" * 70)
     
-    archivos_levantados, conteo_csv, conteo_json = levantar_archivos()
+    archivos_levantados, conteo_csv, conteo_json, conteo_parquet = levantar_archivos()
     
     # Si no se levantaron archivos, salir del programa
     if not archivos_levantados:
@@ -35,7 +41,7 @@ def menu():
         print("-" * 70)
         
         # Mostrar estado de archivos levantados
-        print(f"✓ Archivos detectados: {conteo_csv} CSV, {conteo_json} JSON")
+        print(f"✓ Archivos detectados: {conteo_csv} CSV, {conteo_json} JSON, {conteo_parquet} Parquet")
         
         # Mostrar información sobre búsqueda inteligente (AHORA SÍ DENTRO DEL LOOP)
         if RELACIONES_TABLAS:
@@ -50,12 +56,19 @@ def menu():
         print("5. Buscar datos")
         print("6. Comparar archivo Database vs Histórico")
         print("7. Conversión entre formatos (JSON/CSV)")
-        print("8. Salir")
+        print("8. Verificar integridad referencial")
+        print("9. Motor SQLite (búsquedas y cambios por ID indexados)")
+        print("10. Consultas de facturación (joins entre tablas)")
+        print("11. Estadísticas de rendimiento")
+        print("12. Salir")
         print("-" * 70)
 
         opcion = input("Seleccione una opción: ").strip()
         
-        if opcion == '8':
+        if opcion == '12':
+            # Llevar a disco los cambios hechos en SQLite y los que quedaron en el WAL
+            exportar_modificadas()
+            checkpoint_todos()
             print("¡Hasta luego!")
             break
 
@@ -64,6 +77,11 @@ def menu():
             leer_archivos()
             continue
 
+        # Opción 11: Estadísticas (no necesita archivos en database)
+        if opcion == '11':
+            menu_estadisticas()
+            continue
+
         # Para las demás opciones, solo trabajar con archivos de database
         archivos_database = listar_database()
 
@@ -148,16 +166,34 @@ def menu():
             menu_conversion()
             continue
 
+        # Opción 8: Integridad referencial
+        if opcion == '8':
+            menu_integridad()
+            continue
+
+        # Opción 9: Motor SQLite
+        if opcion == '9':
+            menu_sqlite()
+            continue
+
+        # Opción 10: Consultas con joins
+        if opcion == '10':
+            menu_consultas()
+            continue
+
         print("Opción no válida.")
 
 if __name__ == "__main__":
     # Crear carpetas si no existen
     import os
-    from herramientas import CARPETA_DATABASE, CARPETA_HIST
+    from herramientas import CARPETA_DATABASE, CARPETA_HIST, CARPETA_META
     
-    for carpeta in [CARPETA_DATABASE, CARPETA_HIST]:
+    for carpeta in [CARPETA_DATABASE, CARPETA_HIST, CARPETA_META]:
         if not os.path.exists(carpeta):
             os.makedirs(carpeta, exist_ok=True)
     
+    # Completar escrituras interrumpidas por una caída anterior
+    recuperar()
+    
     # Iniciar menú principal
     menu()
\ No newline at end of file
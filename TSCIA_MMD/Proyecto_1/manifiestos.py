@@ -0,0 +1,210 @@
+"""
+Módulo de manifiestos de contenido para detectar cambios sin comparar tablas.
+
+Cada archivo guardado tiene un manifiesto en metadatos/manifiestos con la
+cantidad de filas, un hash por bloque de TAMANO_BLOQUE filas y un hash raíz
+(hash de los hashes de bloque, estilo Merkle). Los hashes por fila se guardan
+aparte en binario (.hashes) para poder actualizar solo el último bloque cuando
+se anexa una fila. Dos archivos con la misma raíz tienen el mismo contenido.
+"""
+import os
+import json
+import hashlib
+from perezoso import modulo_perezoso
+np = modulo_perezoso("numpy")
+pd = modulo_perezoso("pandas")
+from herramientas import CARPETA_META, firma_archivo, obtener_formato_archivo
+
+CARPETA_MANIFIESTOS = os.path.join(CARPETA_META, "manifiestos")
+
+TAMANO_BLOQUE = 4096
+
+def _rutas(ruta_archivo):
+    """Rutas del manifiesto y de los hashes por fila de un archivo de datos"""
+    carpeta, nombre = os.path.split(os.path.normpath(ruta_archivo))
+    base = os.path.join(CARPETA_MANIFIESTOS, f"{os.path.basename(carpeta)}__{nombre}")
+    return base + ".json", base + ".hashes"
+
+def _canonizar_df(df):
+    """Textos tal como los ve el comparador: vacíos como '' y sin espacios sobrantes"""
+    canonico = pd.DataFrame(index=range(len(df)))
+    for i, col in enumerate(df.columns):
+        serie = df[col].reset_index(drop=True)
+        canonico[i] = serie.astype(str).where(serie.notna(), '').str.strip()
+    return canonico
+
+def hashes_filas(datos):
+    """Hash de 64 bits por fila (CSV) o por elemento (JSON)"""
+    if isinstance(datos, pd.DataFrame):
+        if datos.empty:
+            return np.zeros(0, dtype=np.uint64)
+        return pd.util.hash_pandas_object(_canonizar_df(datos), index=False).to_numpy(dtype=np.uint64)
+    valores = []
+    for item in datos:
+        texto = json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        valores.append(int.from_bytes(hashlib.blake2b(texto, digest_size=8).digest(), 'little'))
+    return np.array(valores, dtype=np.uint64)
+
+def _hash_bloque(hashes):
+    return hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest()
+
+def _hash_raiz(bloques, filas):
+    return hashlib.blake2b(f"{filas}:{''.join(bloques)}".encode('ascii'), digest_size=16).hexdigest()
+
+def _bloques(hashes):
+    return [_hash_bloque(hashes[i:i + TAMANO_BLOQUE]) for i in range(0, len(hashes), TAMANO_BLOQUE)]
+
+def raiz_datos(datos):
+    """Hash raíz de una tabla en memoria: el mismo que tendría el manifiesto de su archivo"""
+    hashes = hashes_filas(datos)
+    return _hash_raiz(_bloques(hashes), len(hashes))
+
+def _escribir(ruta_archivo, hashes, columnas):
+    """Guarda el manifiesto (y los hashes por fila) de un archivo de datos"""
+    os.makedirs(CARPETA_MANIFIESTOS, exist_ok=True)
+    ruta_manifiesto, ruta_hashes = _rutas(ruta_archivo)
+    bloques = _bloques(hashes)
+    manifiesto = {
+        'firma': list(firma_archivo(ruta_archivo)),
+        'filas': int(len(hashes)),
+        'columnas': columnas,
+        'tamano_bloque': TAMANO_BLOQUE,
+        'bloques': bloques,
+        'raiz': _hash_raiz(bloques, len(hashes)),
+    }
+    hashes.astype(np.uint64).tofile(ruta_hashes)
+    temporal = ruta_manifiesto + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f)
+    os.replace(temporal, ruta_manifiesto)
+    return manifiesto
+
+def registrar_manifiesto(ruta_archivo, datos):
+    """Calcula y guarda el manifiesto a partir de los datos recién guardados"""
+    columnas = len(datos.columns) if isinstance(datos, pd.DataFrame) else None
+    return _escribir(ruta_archivo, hashes_filas(datos), columnas)
+
+def registrar_fila_anexada(ruta_archivo, firma_previa, fila):
+    """
+    Actualiza el manifiesto tras anexar una fila: agrega su hash y recalcula solo
+    el último bloque y la raíz. Si el manifiesto no estaba al día, lo descarta.
+    """
+    manifiesto = _cargar(ruta_archivo)
+    ruta_manifiesto, ruta_hashes = _rutas(ruta_archivo)
+    if manifiesto is None or manifiesto['firma'] != list(firma_previa or []):
+        if os.path.exists(ruta_manifiesto):
+            os.remove(ruta_manifiesto)
+        return None
+
+    if isinstance(fila, dict):
+        nuevo = hashes_filas([fila])
+    else:
+        nuevo = hashes_filas(pd.DataFrame([list(fila)]))
+    with open(ruta_hashes, 'ab') as f:
+        nuevo.tofile(f)
+
+    filas = manifiesto['filas'] + 1
+    inicio_ultimo = ((filas - 1) // TAMANO_BLOQUE) * TAMANO_BLOQUE
+    ultimo = np.fromfile(ruta_hashes, dtype=np.uint64, offset=inicio_ultimo * 8)
+    bloques = manifiesto['bloques'][:inicio_ultimo // TAMANO_BLOQUE] + [_hash_bloque(ultimo)]
+
+    manifiesto.update({
+        'firma': list(firma_archivo(ruta_archivo)),
+        'filas': filas,
+        'bloques': bloques,
+        'raiz': _hash_raiz(bloques, filas),
+    })
+    temporal = ruta_manifiesto + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f)
+    os.replace(temporal, ruta_manifiesto)
+    return manifiesto
+
+def copiar_manifiesto(ruta_origen, ruta_destino, firma_origen):
+    """
+    Reutiliza el manifiesto de un archivo para su copia o su versión movida,
+    siempre que correspondiera al archivo de origen (firma_origen).
+    """
+    manifiesto = _cargar(ruta_origen)
+    if manifiesto is None or firma_origen is None or manifiesto['firma'] != list(firma_origen):
+        return
+    hashes = np.fromfile(_rutas(ruta_origen)[1], dtype=np.uint64)
+    _escribir(ruta_destino, hashes, manifiesto['columnas'])
+
+def _cargar(ruta_archivo):
+    """Manifiesto guardado del archivo, o None si no existe"""
+    ruta_manifiesto, ruta_hashes = _rutas(ruta_archivo)
+    if not os.path.exists(ruta_manifiesto) or not os.path.exists(ruta_hashes):
+        return None
+    try:
+        with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def manifiesto_vigente(ruta_archivo):
+    """Manifiesto guardado si sigue correspondiendo al archivo (misma firma), o None"""
+    manifiesto = _cargar(ruta_archivo)
+    firma = firma_archivo(ruta_archivo)
+    if manifiesto is None or firma is None or manifiesto['firma'] != list(firma):
+        return None
+    return manifiesto
+
+def obtener_manifiesto(ruta_archivo, tamano_lote=100_000):
+    """Devuelve el manifiesto vigente o lo calcula leyendo el archivo por lotes"""
+    manifiesto = manifiesto_vigente(ruta_archivo)
+    if manifiesto is not None:
+        return manifiesto
+
+    # Se lee igual que leer_archivo, para que los hashes coincidan con los que
+    # registrar_manifiesto calcula al guardar
+    formato = obtener_formato_archivo(ruta_archivo)
+    if formato == 'csv':
+        from herramientas import _leer_csv_por_lotes
+        partes = []
+        columnas = 0
+        for lote in _leer_csv_por_lotes(ruta_archivo, tamano_lote):
+            columnas = max(columnas, len(lote.columns))
+            partes.append(hashes_filas(lote))
+        hashes = np.concatenate(partes) if partes else np.zeros(0, dtype=np.uint64)
+        return _escribir(ruta_archivo, hashes, columnas)
+    if formato == 'parquet':
+        from herramientas import _leer_parquet
+        datos = _leer_parquet(ruta_archivo, os.path.basename(ruta_archivo))
+        if datos is not None:
+            return _escribir(ruta_archivo, hashes_filas(datos), len(datos.columns))
+        return None
+    if formato == 'json':
+        with open(ruta_archivo, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        if isinstance(datos, list):
+            return _escribir(ruta_archivo, hashes_filas(datos), None)
+    return None
+
+def son_identicos(ruta_a, ruta_b, calcular=True):
+    """
+    True si ambos archivos tienen el mismo contenido según sus manifiestos.
+    Con calcular=False solo usa manifiestos ya vigentes y devuelve None si falta alguno.
+    """
+    obtener = obtener_manifiesto if calcular else manifiesto_vigente
+    manifiesto_a = obtener(ruta_a)
+    manifiesto_b = obtener(ruta_b)
+    if manifiesto_a is None or manifiesto_b is None:
+        return None
+    return manifiesto_a['raiz'] == manifiesto_b['raiz']
+
+def bloques_distintos(ruta_a, ruta_b):
+    """
+    Números de bloque cuyo contenido difiere entre los dos archivos (incluye los
+    bloques que solo existen en uno). None si no hay manifiestos comparables.
+    """
+    manifiesto_a = obtener_manifiesto(ruta_a)
+    manifiesto_b = obtener_manifiesto(ruta_b)
+    if manifiesto_a is None or manifiesto_b is None:
+        return None
+    if manifiesto_a['tamano_bloque'] != manifiesto_b['tamano_bloque']:
+        return None
+    bloques_a = manifiesto_a['bloques']
+    bloques_b = manifiesto_b['bloques']
+    return [i for i in range(max(len(bloques_a), len(bloques_b)))
+            if i >= len(bloques_a) or i >= len(bloques_b) or bloques_a[i] != bloques_b[i]]
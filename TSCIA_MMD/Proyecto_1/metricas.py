@@ -0,0 +1,291 @@
+"""
+Módulo de métricas de rendimiento de las operaciones de archivos.
+
+Están apagadas por defecto: una función medida solo consulta una variable
+antes de llamar a la original, así que no cambian el rendimiento. Se activan
+desde el menú de estadísticas o iniciando el programa con METRICAS=1.
+
+Por operación se registran las llamadas, el tiempo de cada una (total, máximo
+y las últimas DURACIONES_GUARDADAS para los percentiles), los bytes leídos y
+escritos, las filas procesadas y las llamadas que terminaron con excepción.
+Las operaciones pueden ser funciones completas (medir) o tramos dentro de
+ellas (tramo), por ejemplo el parseo del CSV o la limpieza de comillas. Los
+bytes y filas los informa el código medido con anotar() y se suman a la
+operación en curso más interna. Las cachés informan aciertos y fallos con
+contar_cache().
+
+Las métricas se exportan como JSON o como archivo de texto de Prometheus
+(el formato que levanta el textfile collector de node_exporter).
+"""
+import os
+import json
+import time
+import functools
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+
+# Duraciones por operación que se conservan para calcular percentiles
+DURACIONES_GUARDADAS = 1000
+
+# Prefijo de los nombres de métricas en Prometheus
+PREFIJO_PROMETHEUS = "proyecto"
+
+_activas = os.environ.get("METRICAS") == "1"
+
+# Operación -> {'llamadas', 'segundos', 'max_segundos', 'duraciones', 'bytes_leidos', ...}
+_operaciones = {}
+# Caché -> {'aciertos', 'fallos'}
+_caches = {}
+# Registros de las operaciones medidas en curso (la más interna al final)
+_en_curso = []
+
+_SIN_MEDIR = nullcontext()
+
+def activas():
+    return _activas
+
+def activar():
+    global _activas
+    _activas = True
+
+def desactivar():
+    global _activas
+    _activas = False
+
+def reiniciar():
+    """Descarta todo lo registrado hasta ahora"""
+    _operaciones.clear()
+    _caches.clear()
+
+def _registro(nombre):
+    registro = _operaciones.get(nombre)
+    if registro is None:
+        registro = _operaciones[nombre] = {
+            'llamadas': 0, 'errores': 0, 'segundos': 0.0, 'max_segundos': 0.0,
+            'bytes_leidos': 0, 'bytes_escritos': 0, 'filas': 0,
+            'duraciones': deque(maxlen=DURACIONES_GUARDADAS),
+        }
+    return registro
+
+class _Tramo:
+    """Mide el tiempo de un bloque y lo suma a su operación"""
+    __slots__ = ('registro', 'inicio')
+
+    def __init__(self, nombre):
+        self.registro = _registro(nombre)
+
+    def __enter__(self):
+        _en_curso.append(self.registro)
+        self.inicio = time.perf_counter()
+        return self.registro
+
+    def __exit__(self, tipo, valor, traza):
+        duracion = time.perf_counter() - self.inicio
+        _en_curso.pop()
+        registro = self.registro
+        registro['llamadas'] += 1
+        registro['segundos'] += duracion
+        registro['max_segundos'] = max(registro['max_segundos'], duracion)
+        registro['duraciones'].append(duracion)
+        if tipo is not None:
+            registro['errores'] += 1
+        return False
+
+def tramo(nombre):
+    """Context manager que mide un bloque de código como la operación nombre"""
+    return _Tramo(nombre) if _activas else _SIN_MEDIR
+
+def medir(nombre, filas=None):
+    """
+    Decorador: mide cada llamada a la función como la operación nombre.
+    filas(resultado, *args, **kwargs), si se da, devuelve las filas procesadas.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def medida(*args, **kwargs):
+            if not _activas:
+                return funcion(*args, **kwargs)
+            with _Tramo(nombre) as registro:
+                resultado = funcion(*args, **kwargs)
+                if filas is not None:
+                    registro['filas'] += filas(resultado, *args, **kwargs)
+            return resultado
+        return medida
+    return decorador
+
+def cantidad_filas(datos):
+    """Filas de una tabla (DataFrame) o elementos de una lista JSON; 0 si no es ninguna"""
+    if isinstance(datos, list) or hasattr(datos, 'columns'):
+        return len(datos)
+    return 0
+
+def anotar(bytes_leidos=0, bytes_escritos=0, filas=0):
+    """Suma bytes y filas a la operación medida en curso más interna"""
+    if not _activas or not _en_curso:
+        return
+    registro = _en_curso[-1]
+    registro['bytes_leidos'] += bytes_leidos
+    registro['bytes_escritos'] += bytes_escritos
+    registro['filas'] += filas
+
+def contar_cache(nombre, acierto):
+    """Registra un acierto o un fallo de la caché nombre"""
+    if not _activas:
+        return
+    contador = _caches.setdefault(nombre, {'aciertos': 0, 'fallos': 0})
+    contador['aciertos' if acierto else 'fallos'] += 1
+
+# --- Resumen y exportación ---
+
+def _percentil(ordenadas, p):
+    """Percentil p (0-100) por rango más cercano de una lista ordenada"""
+    if not ordenadas:
+        return 0.0
+    posicion = max(0, min(len(ordenadas) - 1, round(p / 100 * len(ordenadas) + 0.5) - 1))
+    return ordenadas[posicion]
+
+def resumen():
+    """Métricas registradas como dict serializable (tiempos en segundos)"""
+    operaciones = {}
+    for nombre, registro in sorted(_operaciones.items()):
+        ordenadas = sorted(registro['duraciones'])
+        operaciones[nombre] = {
+            'llamadas': registro['llamadas'],
+            'errores': registro['errores'],
+            'segundos': registro['segundos'],
+            'max_segundos': registro['max_segundos'],
+            'p50_segundos': _percentil(ordenadas, 50),
+            'p95_segundos': _percentil(ordenadas, 95),
+            'p99_segundos': _percentil(ordenadas, 99),
+            'bytes_leidos': registro['bytes_leidos'],
+            'bytes_escritos': registro['bytes_escritos'],
+            'filas': registro['filas'],
+        }
+    caches = {nombre: dict(contador) for nombre, contador in sorted(_caches.items())}
+    return {'generado': datetime.now().isoformat(timespec='seconds'),
+            'operaciones': operaciones, 'caches': caches}
+
+def _escribir_atomico(ruta, texto):
+    """Escribe en un temporal y reemplaza, así un lector nunca ve el archivo a medias"""
+    carpeta = os.path.dirname(ruta)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(texto)
+    os.replace(temporal, ruta)
+
+def exportar_json(ruta):
+    _escribir_atomico(ruta, json.dumps(resumen(), indent=2, ensure_ascii=False))
+    return ruta
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def texto_prometheus():
+    """Métricas en el formato de exposición de texto de Prometheus"""
+    datos = resumen()
+    operaciones = datos['operaciones']
+    lineas = []
+
+    nombre = f"{PREFIJO_PROMETHEUS}_operacion_segundos"
+    lineas.append(f"# HELP {nombre} Duración de las operaciones de archivos")
+    lineas.append(f"# TYPE {nombre} summary")
+    for operacion, r in operaciones.items():
+        etiqueta = f'operacion="{_etiqueta(operacion)}"'
+        for cuantil, clave in (("0.5", 'p50_segundos'), ("0.95", 'p95_segundos'), ("0.99", 'p99_segundos')):
+            lineas.append(f'{nombre}{{{etiqueta},quantile="{cuantil}"}} {r[clave]!r}')
+        lineas.append(f"{nombre}_sum{{{etiqueta}}} {r['segundos']!r}")
+        lineas.append(f"{nombre}_count{{{etiqueta}}} {r['llamadas']}")
+
+    contadores = (
+        ('errores', "Llamadas que terminaron con una excepción"),
+        ('bytes_leidos', "Bytes leídos del disco"),
+        ('bytes_escritos', "Bytes escritos en el disco"),
+        ('filas', "Filas procesadas"),
+    )
+    for clave, ayuda in contadores:
+        nombre = f"{PREFIJO_PROMETHEUS}_operacion_{clave}_total"
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} counter")
+        for operacion, r in operaciones.items():
+            lineas.append(f'{nombre}{{operacion="{_etiqueta(operacion)}"}} {r[clave]}')
+
+    for clave, ayuda in (('aciertos', "Aciertos de caché"), ('fallos', "Fallos de caché")):
+        nombre = f"{PREFIJO_PROMETHEUS}_cache_{clave}_total"
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} counter")
+        for cache, contador in datos['caches'].items():
+            lineas.append(f'{nombre}{{cache="{_etiqueta(cache)}"}} {contador[clave]}')
+    return "\n".join(lineas) + "\n"
+
+def exportar_prometheus(ruta):
+    _escribir_atomico(ruta, texto_prometheus())
+    return ruta
+
+# --- Menú ---
+
+def tamano_legible(cantidad):
+    for unidad in ('B', 'KB', 'MB', 'GB'):
+        if cantidad < 1024 or unidad == 'GB':
+            return f"{cantidad:.0f} {unidad}" if unidad == 'B' else f"{cantidad:.1f} {unidad}"
+        cantidad /= 1024
+
+def mostrar_estadisticas():
+    datos = resumen()
+    if not datos['operaciones'] and not datos['caches']:
+        print("No hay métricas registradas todavía.")
+        return
+    print(f"{'Operación':<32}{'Llamadas':>9}{'Total ms':>11}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'Máx ms':>9}{'Leídos':>10}{'Escritos':>10}{'Filas':>11}")
+    print("-" * 110)
+    for nombre, r in datos['operaciones'].items():
+        print(f"{nombre:<32}{r['llamadas']:>9}{r['segundos'] * 1000:>11.1f}{r['p50_segundos'] * 1000:>9.1f}"
+              f"{r['p95_segundos'] * 1000:>9.1f}{r['max_segundos'] * 1000:>9.1f}"
+              f"{tamano_legible(r['bytes_leidos']):>10}{tamano_legible(r['bytes_escritos']):>10}"
+              f"{r['filas']:>11}")
+    if datos['caches']:
+        print()
+        for nombre, contador in datos['caches'].items():
+            total = contador['aciertos'] + contador['fallos']
+            porcentaje = contador['aciertos'] / total if total else 0
+            print(f"Caché {nombre}: {contador['aciertos']} aciertos, {contador['fallos']} fallos "
+                  f"({porcentaje:.0%} de aciertos)")
+
+def menu_estadisticas():
+    """Estadísticas de rendimiento desde el menú principal"""
+    from herramientas import CARPETA_META
+    ruta_json = os.path.join(CARPETA_META, "metricas.json")
+    ruta_prometheus = os.path.join(CARPETA_META, "metricas.prom")
+    while True:
+        print("\n--- ESTADÍSTICAS DE RENDIMIENTO ---")
+        print(f"Métricas {'activas' if _activas else 'apagadas'}")
+        print()
+        mostrar_estadisticas()
+        print()
+        print(f"1. {'Desactivar' if _activas else 'Activar'} métricas")
+        print(f"2. Exportar como JSON ({ruta_json})")
+        print(f"3. Exportar para Prometheus ({ruta_prometheus})")
+        print("4. Reiniciar métricas")
+        print("5. Volver al menú principal")
+        opcion = input("Seleccione una opción: ").strip()
+
+        if opcion == '1':
+            if _activas:
+                desactivar()
+                print("✓ Métricas desactivadas")
+            else:
+                activar()
+                print("✓ Métricas activadas")
+        elif opcion == '2':
+            print(f"✓ Métricas exportadas en: {exportar_json(ruta_json)}")
+        elif opcion == '3':
+            print(f"✓ Métricas exportadas en: {exportar_prometheus(ruta_prometheus)}")
+        elif opcion == '4':
+            reiniciar()
+            print("✓ Métricas reiniciadas")
+        elif opcion == '5':
+            break
+        else:
+            print("Opción no válida.")
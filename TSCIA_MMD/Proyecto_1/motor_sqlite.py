@@ -0,0 +1,439 @@
+"""
+Motor de almacenamiento opcional sobre SQLite.
+
+Las tablas de database se importan a un archivo SQLite (metadatos/database.sqlite)
+con índices sobre la columna de ID y sobre las columnas de clave foránea de
+RELACIONES_TABLAS. Buscar, agregar, modificar y eliminar por ID se resuelven
+con SQL indexado, sin leer ni reescribir la tabla completa.
+
+Los archivos de database siguen siendo la versión oficial: los cambios hechos
+en SQLite se exportan a su archivo (CSV, JSON o Parquet, con guardar_archivo,
+así se mantienen el histórico y las versiones) al pedirlo desde el menú o al
+salir del programa. Si la tabla cambió en database después de importarla, una
+tabla sin cambios pendientes se vuelve a importar; una con cambios no se
+exporta, para no pisar lo que escribió otro operador, y tampoco se descarta al
+volver a importar salvo que se fuerce. El cambio se detecta por contenido
+(hash raíz del manifiesto) y no por la firma del archivo: un checkpoint del WAL
+reescribe el archivo con el mismo contenido y eso no es un conflicto.
+"""
+import os
+import json
+import sqlite3
+from perezoso import modulo_perezoso
+pd = modulo_perezoso("pandas")
+from herramientas import (CARPETA_META, leer_archivo, guardar_archivo, ruta_lectura, firma_archivo,
+                          obtener_formato_archivo, reservar_nuevo_id, FORMATOS_TABLA)
+from busqueda_inteligente import obtener_relaciones_tabla
+
+RUTA_SQLITE = os.path.join(CARPETA_META, "database.sqlite")
+
+# Filas por executemany al importar
+FILAS_POR_LOTE = 50_000
+
+_conexion = None
+
+def conectar():
+    """Conexión única por sesión (modo WAL de SQLite: confirmar un cambio no reescribe la base)"""
+    global _conexion
+    if _conexion is None:
+        os.makedirs(CARPETA_META, exist_ok=True)
+        _conexion = sqlite3.connect(RUTA_SQLITE)
+        _conexion.execute("PRAGMA journal_mode=WAL")
+        _conexion.execute("PRAGMA synchronous=NORMAL")
+        _conexion.execute("""CREATE TABLE IF NOT EXISTS _tablas (
+            nombre TEXT PRIMARY KEY, firma TEXT, claves TEXT, columna_id INTEGER,
+            columnas INTEGER, modificada INTEGER DEFAULT 0, raiz TEXT)""")
+        existentes = [fila[1] for fila in _conexion.execute("PRAGMA table_info(_tablas)")]
+        if 'raiz' not in existentes:
+            # Bases creadas antes de detectar los cambios por contenido
+            _conexion.execute("ALTER TABLE _tablas ADD COLUMN raiz TEXT")
+    return _conexion
+
+def cerrar():
+    global _conexion
+    if _conexion is not None:
+        _conexion.close()
+        _conexion = None
+
+def _tabla(nombre_archivo):
+    """Identificador SQL de la tabla (el nombre del archivo, entre comillas)"""
+    return '"' + nombre_archivo.replace('"', '""') + '"'
+
+def _info(nombre_archivo):
+    fila = conectar().execute(
+        "SELECT firma, claves, columna_id, columnas, modificada, raiz FROM _tablas WHERE nombre = ?",
+        (nombre_archivo,)).fetchone()
+    if fila is None:
+        return None
+    firma, claves, columna_id, columnas, modificada, raiz = fila
+    return {'firma': json.loads(firma), 'claves': json.loads(claves) if claves else None,
+            'columna_id': columna_id, 'columnas': columnas, 'modificada': bool(modificada),
+            'raiz': raiz}
+
+def _raiz_database(nombre_archivo):
+    """Hash raíz del contenido vigente de la tabla en database (con el WAL aplicado)"""
+    from manifiestos import raiz_datos
+    datos = leer_archivo(nombre_archivo)
+    if not isinstance(datos, (pd.DataFrame, list)):
+        return None
+    return raiz_datos(datos)
+
+def _igual_que_database(nombre_archivo, info):
+    """
+    True si la tabla en database tiene el contenido que se importó. Si solo
+    cambió la firma del archivo (un checkpoint lo reescribe con el mismo
+    contenido), se guarda la firma nueva y se sigue considerando igual.
+    """
+    ruta = ruta_lectura(nombre_archivo)
+    if ruta is None:
+        return False
+    actual = list(firma_archivo(ruta))
+    if actual == info['firma']:
+        return True
+    if info['raiz'] is None or _raiz_database(nombre_archivo) != info['raiz']:
+        return False
+    conexion = conectar()
+    with conexion:
+        conexion.execute("UPDATE _tablas SET firma = ? WHERE nombre = ?", (json.dumps(actual), nombre_archivo))
+    info['firma'] = actual
+    return True
+
+# --- Importación ---
+
+def _como_dataframe(datos):
+    """Tabla como DataFrame; para JSON devuelve además las claves de los elementos"""
+    if isinstance(datos, pd.DataFrame):
+        return datos, None
+    claves = list(datos[0].keys()) if datos else []
+    df = pd.DataFrame([[elemento.get(clave) for clave in claves] for elemento in datos],
+                      columns=range(len(claves)))
+    return df, claves
+
+def _columna_id(claves):
+    """Posición de la columna de ID: la primera (CSV) o la primera clave con 'id' (JSON)"""
+    for i, clave in enumerate(claves or []):
+        if 'id' in clave.lower() or clave == 'columna_0':
+            return i
+    return 0
+
+def importar_tabla(nombre_archivo, forzar=False):
+    """
+    Copia la tabla a SQLite y crea sus índices. Devuelve la cantidad de filas, o None.
+    Si la copia en SQLite tiene cambios sin exportar no la reemplaza, salvo con forzar=True.
+    """
+    from manifiestos import raiz_datos
+    info = _info(nombre_archivo)
+    if info is not None and info['modificada'] and not forzar:
+        print(f"✗ {nombre_archivo} tiene cambios en SQLite sin exportar; no se vuelve a importar "
+              f"para no perderlos. Expórtelos o fuerce la importación.")
+        return None
+    datos = leer_archivo(nombre_archivo)
+    if not isinstance(datos, (pd.DataFrame, list)):
+        print(f"✗ No se puede importar {nombre_archivo}")
+        return None
+    firma = firma_archivo(ruta_lectura(nombre_archivo))
+    raiz = raiz_datos(datos)
+    df, claves = _como_dataframe(datos)
+    columnas = len(df.columns)
+    columna_id = _columna_id(claves)
+    tabla = _tabla(nombre_archivo)
+
+    conexion = conectar()
+    with conexion:
+        conexion.execute(f"DROP TABLE IF EXISTS {tabla}")
+        definicion = ", ".join(f"c{i} TEXT" for i in range(columnas))
+        conexion.execute(f"CREATE TABLE {tabla} (fila INTEGER PRIMARY KEY{', ' if columnas else ''}{definicion})")
+        if columnas:
+            insertar = f"INSERT INTO {tabla} ({', '.join(f'c{i}' for i in range(columnas))}) " \
+                       f"VALUES ({', '.join('?' * columnas)})"
+            valores = df.astype(object).where(df.notna(), None)
+            for inicio in range(0, len(valores), FILAS_POR_LOTE):
+                lote = valores.iloc[inicio:inicio + FILAS_POR_LOTE]
+                conexion.executemany(insertar, lote.itertuples(index=False, name=None))
+            _crear_indices(conexion, nombre_archivo, columna_id, columnas)
+        conexion.execute("INSERT OR REPLACE INTO _tablas (nombre, firma, claves, columna_id, columnas, "
+                         "modificada, raiz) VALUES (?, ?, ?, ?, ?, 0, ?)",
+                         (nombre_archivo, json.dumps(list(firma)), json.dumps(claves) if claves is not None else None,
+                          columna_id, columnas, raiz))
+    return len(df)
+
+def _crear_indices(conexion, nombre_archivo, columna_id, columnas):
+    """Índices sobre el ID (como texto y como número, para el próximo ID) y las claves foráneas"""
+    tabla = _tabla(nombre_archivo)
+    base = nombre_archivo.replace('"', '')
+    conexion.execute(f'CREATE INDEX "ix_{base}_id" ON {tabla} (c{columna_id})')
+    conexion.execute(f'CREATE INDEX "ix_{base}_id_num" ON {tabla} (CAST(c{columna_id} AS INTEGER))')
+    relaciones = obtener_relaciones_tabla(os.path.splitext(nombre_archivo)[0] + '.csv')
+    for columna in relaciones:
+        if isinstance(columna, int) and columna < columnas and columna != columna_id:
+            conexion.execute(f'CREATE INDEX "ix_{base}_c{columna}" ON {tabla} (c{columna})')
+
+def importar_database(forzar=False):
+    """Importa todas las tablas de database. Devuelve {tabla: filas}"""
+    from listado_csv import listar_database
+    importadas = {}
+    for nombre_archivo in listar_database():
+        if obtener_formato_archivo(nombre_archivo) not in FORMATOS_TABLA + ('json',):
+            continue
+        filas = importar_tabla(nombre_archivo, forzar)
+        if filas is not None:
+            importadas[nombre_archivo] = filas
+            print(f"✓ {nombre_archivo}: {filas} filas importadas")
+    return importadas
+
+def tablas_importadas():
+    return [fila[0] for fila in conectar().execute("SELECT nombre FROM _tablas ORDER BY nombre")]
+
+def _preparar(nombre_archivo):
+    """
+    Info de la tabla lista para operar: la importa si no estaba, o si la tabla
+    cambió en database y no hay cambios sin exportar. None si no se puede usar.
+    """
+    info = _info(nombre_archivo)
+    if info is not None and _igual_que_database(nombre_archivo, info):
+        return info
+    if info is None or not info['modificada']:
+        if ruta_lectura(nombre_archivo) is None or importar_tabla(nombre_archivo) is None:
+            return None
+        return _info(nombre_archivo)
+    print(f"ℹ {nombre_archivo} cambió en database desde que se importó; "
+          f"se trabaja sobre la copia SQLite con cambios sin exportar.")
+    return info
+
+# --- Operaciones por ID ---
+
+def _a_dataframe(filas, info):
+    columnas = ['fila'] + list(range(info['columnas']))
+    return pd.DataFrame(filas, columns=columnas).set_index('fila')
+
+def buscar_por_id(nombre_archivo, valor):
+    """Filas con ese ID (índice = número interno de fila). None si la tabla no se puede usar"""
+    info = _preparar(nombre_archivo)
+    if info is None:
+        return None
+    filas = conectar().execute(
+        f"SELECT * FROM {_tabla(nombre_archivo)} WHERE c{info['columna_id']} = ? ORDER BY fila",
+        (str(valor).strip(),)).fetchall()
+    return _a_dataframe(filas, info)
+
+def consultar(nombre_archivo, filtros=None, limite=None):
+    """Filas que cumplen los filtros [(columna, operador, valor)] con los operadores de leer_archivo"""
+    info = _preparar(nombre_archivo)
+    if info is None:
+        return None
+    condiciones, parametros = [], []
+    for columna, operador, valor in filtros or []:
+        if operador in ('in', 'not in'):
+            valores = [str(v) for v in valor]
+            condiciones.append(f"c{int(columna)} {operador.upper()} ({', '.join('?' * len(valores))})")
+            parametros.extend(valores)
+        elif operador in ('==', '!=', '<', '<=', '>', '>='):
+            condiciones.append(f"c{int(columna)} {'=' if operador == '==' else operador} ?")
+            parametros.append(str(valor))
+        else:
+            raise ValueError(f"Operador de filtro no soportado: {operador}")
+    sql = f"SELECT * FROM {_tabla(nombre_archivo)}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += " ORDER BY fila"
+    if limite is not None:
+        sql += f" LIMIT {int(limite)}"
+    return _a_dataframe(conectar().execute(sql, parametros).fetchall(), info)
+
+def _marcar_modificada(conexion, nombre_archivo):
+    conexion.execute("UPDATE _tablas SET modificada = 1 WHERE nombre = ?", (nombre_archivo,))
+
+def proximo_id(nombre_archivo):
+    """
+    Reserva el próximo ID en la secuencia de la tabla (herramientas.reservar_nuevo_id).
+    Si la secuencia se recuperó del archivo y no incluye las filas agregadas en
+    SQLite, se adelanta hasta pasar el mayor ID de la copia (usa el índice numérico).
+    """
+    info = _preparar(nombre_archivo)
+    if info is None:
+        return None
+    nuevo = reservar_nuevo_id(nombre_archivo)
+    maximo = conectar().execute(
+        f"SELECT MAX(CAST(c{info['columna_id']} AS INTEGER)) FROM {_tabla(nombre_archivo)}").fetchone()[0]
+    if maximo is not None and nuevo <= maximo:
+        # Se reservan los IDs hasta maximo + 1 y se usa el último
+        nuevo = reservar_nuevo_id(nombre_archivo, cantidad=maximo - nuevo + 1) + maximo - nuevo
+    return nuevo
+
+def insertar_fila(nombre_archivo, valores):
+    """Agrega una fila (lista de valores por columna). Devuelve el número interno de fila"""
+    info = _preparar(nombre_archivo)
+    if info is None:
+        return None
+    if len(valores) != info['columnas']:
+        raise ValueError(f"la fila tiene {len(valores)} valores y la tabla {info['columnas']} columnas")
+    conexion = conectar()
+    with conexion:
+        cursor = conexion.execute(
+            f"INSERT INTO {_tabla(nombre_archivo)} ({', '.join(f'c{i}' for i in range(info['columnas']))}) "
+            f"VALUES ({', '.join('?' * info['columnas'])})",
+            [None if v is None or v == '' else str(v) for v in valores])
+        _marcar_modificada(conexion, nombre_archivo)
+    return cursor.lastrowid
+
+def modificar_por_id(nombre_archivo, valor_id, cambios):
+    """Cambia las columnas indicadas ({columna: valor}) de las filas con ese ID. Devuelve cuántas"""
+    info = _preparar(nombre_archivo)
+    if info is None or not cambios:
+        return 0
+    asignaciones = ", ".join(f"c{int(columna)} = ?" for columna in cambios)
+    conexion = conectar()
+    with conexion:
+        cursor = conexion.execute(
+            f"UPDATE {_tabla(nombre_archivo)} SET {asignaciones} WHERE c{info['columna_id']} = ?",
+            [None if v == '' else str(v) for v in cambios.values()] + [str(valor_id).strip()])
+        if cursor.rowcount:
+            _marcar_modificada(conexion, nombre_archivo)
+    return cursor.rowcount
+
+def eliminar_por_id(nombre_archivo, valor_id):
+    """Elimina las filas con ese ID. Devuelve cuántas"""
+    info = _preparar(nombre_archivo)
+    if info is None:
+        return 0
+    conexion = conectar()
+    with conexion:
+        cursor = conexion.execute(f"DELETE FROM {_tabla(nombre_archivo)} WHERE c{info['columna_id']} = ?",
+                                  (str(valor_id).strip(),))
+        if cursor.rowcount:
+            _marcar_modificada(conexion, nombre_archivo)
+    return cursor.rowcount
+
+# --- Exportación ---
+
+def leer_tabla(nombre_archivo):
+    """La tabla guardada en SQLite con el formato de leer_archivo (DataFrame o lista JSON)"""
+    info = _info(nombre_archivo)
+    if info is None:
+        return None
+    columnas = ', '.join(f'c{i}' for i in range(info['columnas'])) or 'fila'
+    filas = conectar().execute(f"SELECT {columnas} FROM {_tabla(nombre_archivo)} ORDER BY fila").fetchall()
+    if info['claves'] is not None:
+        return [dict(zip(info['claves'], fila)) for fila in filas]
+    return pd.DataFrame(filas, columns=range(info['columnas']))
+
+def exportar_tabla(nombre_archivo):
+    """Escribe en database la tabla con los cambios hechos en SQLite"""
+    from bloqueos import bloqueo_escritura
+    info = _info(nombre_archivo)
+    if info is None or not info['modificada']:
+        return True
+    with bloqueo_escritura(nombre_archivo):
+        if ruta_lectura(nombre_archivo) is not None and not _igual_que_database(nombre_archivo, info):
+            print(f"✗ {nombre_archivo} cambió en database desde que se importó a SQLite; "
+                  f"no se exporta para no pisar esos cambios. Los cambios siguen en SQLite: "
+                  f"revise la tabla y vuelva a importarla forzando para descartarlos.")
+            return False
+        if guardar_archivo(leer_tabla(nombre_archivo), nombre_archivo) is None:
+            return False
+        conexion = conectar()
+        with conexion:
+            conexion.execute("UPDATE _tablas SET firma = ?, raiz = ?, modificada = 0 WHERE nombre = ?",
+                             (json.dumps(list(firma_archivo(ruta_lectura(nombre_archivo)))),
+                              _raiz_database(nombre_archivo), nombre_archivo))
+    return True
+
+def tablas_modificadas():
+    if not os.path.exists(RUTA_SQLITE):
+        return []
+    return [fila[0] for fila in conectar().execute("SELECT nombre FROM _tablas WHERE modificada = 1 ORDER BY nombre")]
+
+def exportar_modificadas():
+    """Exporta todas las tablas con cambios hechos en SQLite"""
+    for nombre_archivo in tablas_modificadas():
+        exportar_tabla(nombre_archivo)
+
+# --- Menú ---
+
+def _elegir_tabla():
+    from listado_csv import elegir_archivo
+    tablas = tablas_importadas()
+    if not tablas:
+        print("No hay tablas importadas. Use primero la opción 1.")
+        return None
+    return elegir_archivo(tablas, "Seleccione el número de la tabla: ")
+
+def _agregar_interactivo(nombre_archivo):
+    info = _preparar(nombre_archivo)
+    if info is None:
+        return
+    nuevo_id = proximo_id(nombre_archivo)
+    print(f"Agregando fila a '{nombre_archivo}' (ID -> {nuevo_id})")
+    nombres = info['claves'] or [f"columna {i}" for i in range(info['columnas'])]
+    valores = []
+    for i, nombre in enumerate(nombres):
+        valores.append(str(nuevo_id) if i == info['columna_id'] else input(f"Ingrese valor para {nombre}: ").strip())
+    insertar_fila(nombre_archivo, valores)
+    print("✓ Fila agregada en SQLite")
+
+def _modificar_interactivo(nombre_archivo):
+    valor_id = input("ID de la fila a modificar: ").strip()
+    filas = buscar_por_id(nombre_archivo, valor_id)
+    if filas is None or filas.empty:
+        print("No se encontró ese ID.")
+        return
+    print(filas)
+    info = _info(nombre_archivo)
+    actual = filas.iloc[0]
+    cambios = {}
+    for i in range(info['columnas']):
+        if i == info['columna_id']:
+            continue
+        nuevo = input(f"Columna {i} (actual: {actual[i]}) -> Nuevo (enter = conservar): ").strip()
+        if nuevo != "":
+            cambios[i] = nuevo
+    print(f"✓ {modificar_por_id(nombre_archivo, valor_id, cambios)} filas modificadas en SQLite")
+
+def menu_sqlite():
+    """Submenú del motor SQLite"""
+    while True:
+        print("\n--- MOTOR SQLITE ---")
+        modificadas = tablas_modificadas()
+        if modificadas:
+            print(f"ℹ Cambios sin exportar en: {', '.join(modificadas)}")
+        print("1. Importar database a SQLite")
+        print("2. Buscar por ID")
+        print("3. Agregar fila")
+        print("4. Modificar fila por ID")
+        print("5. Eliminar fila por ID")
+        print("6. Exportar cambios a database")
+        print("7. Volver")
+        opcion = input("Seleccione una opción: ").strip()
+
+        if opcion == '7':
+            break
+        if opcion == '1':
+            forzar = False
+            if modificadas:
+                respuesta = input(f"¿Descartar los cambios sin exportar de {', '.join(modificadas)}? (s/n): ")
+                forzar = respuesta.strip().lower() == 's'
+            importar_database(forzar)
+            continue
+        if opcion == '6':
+            exportar_modificadas()
+            continue
+        if opcion not in ('2', '3', '4', '5'):
+            print("Opción no válida.")
+            continue
+
+        nombre_archivo = _elegir_tabla()
+        if not nombre_archivo:
+            continue
+        try:
+            if opcion == '2':
+                filas = buscar_por_id(nombre_archivo, input("ID a buscar: ").strip())
+                print(filas if filas is not None and not filas.empty else "No se encontró ese ID.")
+            elif opcion == '3':
+                _agregar_interactivo(nombre_archivo)
+            elif opcion == '4':
+                _modificar_interactivo(nombre_archivo)
+            elif opcion == '5':
+                cantidad = eliminar_por_id(nombre_archivo, input("ID de la fila a eliminar: ").strip())
+                print(f"✓ {cantidad} filas eliminadas en SQLite")
+        except (sqlite3.Error, ValueError) as e:
+            print(f"✗ Error: {e}")
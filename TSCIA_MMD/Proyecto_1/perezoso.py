@@ -0,0 +1,29 @@
+"""
+Importación diferida de módulos pesados (pandas, numpy).
+
+Importar pandas tarda casi un segundo, y el menú principal no lo necesita
+hasta que se toca una tabla. modulo_perezoso devuelve el módulo sin
+ejecutarlo: se carga de verdad recién con el primer acceso a uno de sus
+atributos (pd.DataFrame, np.nan, ...). Así el programa arranca rápido y solo
+paga la importación si el operador lee, busca o modifica datos.
+
+Uso, en lugar de "import pandas as pd":
+    pd = modulo_perezoso("pandas")
+"""
+import sys
+import importlib.util
+
+def modulo_perezoso(nombre):
+    """Módulo que se importa recién cuando se usa por primera vez"""
+    modulo = sys.modules.get(nombre)
+    if modulo is not None:
+        return modulo
+    especificacion = importlib.util.find_spec(nombre)
+    if especificacion is None:
+        raise ImportError(f"No se encontró el módulo '{nombre}'", name=nombre)
+    cargador = importlib.util.LazyLoader(especificacion.loader)
+    especificacion.loader = cargador
+    modulo = importlib.util.module_from_spec(especificacion)
+    sys.modules[nombre] = modulo
+    cargador.exec_module(modulo)
+    return modulo
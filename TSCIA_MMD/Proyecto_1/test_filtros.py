@@ -0,0 +1,55 @@
+"""
+Pruebas de filtros.py: el resultado de un filtro sobre la columna de ID no
+depende de que el índice de clave primaria esté construido.
+
+Ejecutar desde la carpeta del proyecto:
+    python -m pytest -q test_filtros.py
+"""
+import os
+import pytest
+import filtros
+import herramientas
+
+EXPRESIONES = [
+    'col0 = 1.0',
+    'col0 = 7',
+    'col0 = 8',
+    'col0 in (7, 1)',
+    'col0 = "007"',
+    'col0 = "8"',
+    'col0 in ("7", "x")',
+    'col0 != 7',
+]
+
+@pytest.fixture
+def tabla(tmp_path, monkeypatch):
+    """Tabla en una carpeta database temporal, con IDs con ceros, espacios y vacíos"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(herramientas.CARPETA_DATABASE)
+    nombre = "ids_prueba.csv"
+    with open(os.path.join(herramientas.CARPETA_DATABASE, nombre), 'w', encoding='utf-8') as f:
+        f.write('1,uno\n007,siete con ceros\n7,siete\n 8 ,ocho\n,sin id\n1.0,uno decimal\n')
+    herramientas.limpiar_cache()
+    yield nombre
+    herramientas.limpiar_cache()
+    herramientas._indices_pk.clear()
+
+@pytest.mark.parametrize('expresion', EXPRESIONES)
+def test_mismo_resultado_con_y_sin_indice(tabla, expresion):
+    datos = herramientas.leer_archivo(tabla)
+    herramientas._indices_pk.clear()
+    assert herramientas.indice_pk_vigente(tabla, len(datos)) is None
+    sin_indice = filtros.posiciones(datos, expresion, tabla).tolist()
+
+    herramientas.indice_pk(tabla, datos)
+    assert herramientas.indice_pk_vigente(tabla, len(datos)) is not None
+    con_indice = filtros.posiciones(datos, expresion, tabla).tolist()
+
+    assert con_indice == sin_indice
+
+def test_numeros_comparan_como_numero(tabla):
+    datos = herramientas.leer_archivo(tabla)
+    herramientas.indice_pk(tabla, datos)
+    assert filtros.posiciones(datos, 'col0 = 7', tabla).tolist() == [1, 2]
+    assert filtros.posiciones(datos, 'col0 = 1.0', tabla).tolist() == [0, 5]
+    assert filtros.posiciones(datos, 'col0 = "8"', tabla).tolist() == [3]
@@ -0,0 +1,268 @@
+"""
+Módulo de versiones de las tablas guardadas como parches por ID.
+
+La versión 0 de cada tabla es su copia en tablas_hist. Cada vez que se guarda
+la tabla se registra un parche (metadatos/versiones/<tabla>/vNNNN.json) con
+solo las filas agregadas, modificadas y eliminadas respecto de la versión
+anterior, así el espacio ocupado depende del tamaño del cambio y no del de la
+tabla. Cualquier versión se reconstruye aplicando los parches sobre la base.
+
+Las filas se identifican por su ID más el número de aparición ("5#0", "5#1"),
+igual que en el comparador, para distinguir IDs repetidos.
+"""
+import os
+import json
+from datetime import datetime
+from perezoso import modulo_perezoso
+np = modulo_perezoso("numpy")
+pd = modulo_perezoso("pandas")
+from herramientas import (CARPETA_META, FORMATOS_TABLA, ruta_hist, firma_archivo, obtener_formato_archivo,
+                          _normalizar_como_lectura, _leer_ruta)
+from manifiestos import hashes_filas, _canonizar_df
+
+CARPETA_VERSIONES = os.path.join(CARPETA_META, "versiones")
+
+def _carpeta(nombre_archivo):
+    return os.path.join(CARPETA_VERSIONES, nombre_archivo)
+
+def _ruta_parche(nombre_archivo, numero):
+    return os.path.join(_carpeta(nombre_archivo), f"v{numero:04d}.json")
+
+def _escribir_json(ruta, contenido):
+    """Escritura atómica de un JSON de metadatos"""
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(contenido, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# --- Claves y filas ---
+
+def _ids(datos):
+    """ID (texto) de cada fila/elemento, o '' si el elemento no tiene ID"""
+    if isinstance(datos, pd.DataFrame):
+        if datos.empty:
+            return []
+        return _canonizar_df(datos.iloc[:, [0]])[0].tolist()
+    ids = []
+    for item in datos:
+        valor = ''
+        if isinstance(item, dict):
+            for key, val in item.items():
+                if 'id' in key.lower() or key == 'columna_0':
+                    valor = str(val)
+                    break
+        ids.append(valor)
+    return ids
+
+def _claves(ids):
+    """Clave única por fila: ID más número de aparición de ese ID"""
+    ocurrencias = {}
+    claves = []
+    for id_fila in ids:
+        n = ocurrencias.get(id_fila, 0)
+        ocurrencias[id_fila] = n + 1
+        claves.append(f"{id_fila}#{n}")
+    return claves
+
+def _filas_canonicas(datos):
+    """Filas como listas de textos (CSV) o elementos tal cual (JSON)"""
+    if isinstance(datos, pd.DataFrame):
+        return _canonizar_df(datos).values.tolist()
+    return list(datos)
+
+def _leer_base(nombre_archivo):
+    """Lee la versión 0 (tablas_hist) sin pasar por la caché de herramientas"""
+    ruta = ruta_hist(nombre_archivo)
+    if not os.path.exists(ruta):
+        return None
+    # Misma lectura que leer_archivo, para que los hashes de la base coincidan
+    # con los de los datos guardados
+    datos = _leer_ruta(ruta, nombre_archivo, obtener_formato_archivo(nombre_archivo))
+    return datos if isinstance(datos, (pd.DataFrame, list)) else None
+
+# --- Estado de la última versión ---
+
+def _cargar_estado(nombre_archivo):
+    """
+    Claves y hashes de la última versión registrada. Si la base cambió (se borró
+    o se volvió a crear el histórico) se descartan las versiones anteriores.
+    """
+    carpeta = _carpeta(nombre_archivo)
+    estado = _leer_json(os.path.join(carpeta, "estado.json"))
+    ruta_hashes = os.path.join(carpeta, "estado.hashes")
+    base = firma_archivo(ruta_hist(nombre_archivo))
+    if estado is None or base is None or estado['base'] != list(base) or not os.path.exists(ruta_hashes):
+        return None
+    estado['hashes'] = np.fromfile(ruta_hashes, dtype=np.uint64)
+    return estado
+
+def _guardar_estado(nombre_archivo, estado):
+    carpeta = _carpeta(nombre_archivo)
+    estado['hashes'].astype(np.uint64).tofile(os.path.join(carpeta, "estado.hashes"))
+    _escribir_json(os.path.join(carpeta, "estado.json"),
+                   {clave: valor for clave, valor in estado.items() if clave != 'hashes'})
+
+def _iniciar(nombre_archivo):
+    """Crea el almacén de versiones tomando el histórico como versión 0"""
+    datos = _leer_base(nombre_archivo)
+    if datos is None:
+        return None
+    carpeta = _carpeta(nombre_archivo)
+    if os.path.exists(carpeta):
+        for archivo in os.listdir(carpeta):
+            os.remove(os.path.join(carpeta, archivo))
+    os.makedirs(carpeta, exist_ok=True)
+
+    estado = {
+        'base': list(firma_archivo(ruta_hist(nombre_archivo))),
+        'version': 0,
+        'claves': _claves(_ids(datos)),
+        'hashes': hashes_filas(datos),
+    }
+    _guardar_estado(nombre_archivo, estado)
+    _escribir_json(os.path.join(carpeta, "historial.json"), [{
+        'version': 0, 'fecha': _ahora(), 'filas': len(estado['claves']),
+        'agregadas': 0, 'modificadas': 0, 'eliminadas': 0,
+    }])
+    return estado
+
+def _ahora():
+    return datetime.now().isoformat(timespec='seconds')
+
+def _agregar_al_historial(nombre_archivo, parche, numero, filas):
+    ruta = os.path.join(_carpeta(nombre_archivo), "historial.json")
+    historial = _leer_json(ruta) or []
+    historial.append({
+        'version': numero, 'fecha': _ahora(), 'filas': filas,
+        'agregadas': len(parche['agregadas']),
+        'modificadas': len(parche['modificadas']),
+        'eliminadas': len(parche['eliminadas']),
+    })
+    _escribir_json(ruta, historial)
+
+# --- Registro de versiones ---
+
+def registrar_version(nombre_archivo, datos):
+    """
+    Registra los datos recién guardados como nueva versión. El parche solo
+    contiene las filas que cambiaron respecto de la versión anterior.
+    Devuelve el número de versión, o None si la tabla no tiene histórico.
+    """
+    estado = _cargar_estado(nombre_archivo) or _iniciar(nombre_archivo)
+    if estado is None:
+        return None
+
+    claves = _claves(_ids(datos))
+    hashes = hashes_filas(datos)
+    anteriores = dict(zip(estado['claves'], estado['hashes'].tolist()))
+
+    cambiadas = []
+    parche = {'agregadas': [], 'modificadas': {}, 'eliminadas': [], 'orden': None}
+    for pos, (clave, hash_fila) in enumerate(zip(claves, hashes.tolist())):
+        hash_anterior = anteriores.pop(clave, None)
+        if hash_anterior is None:
+            cambiadas.append((pos, clave, 'agregadas'))
+        elif hash_anterior != hash_fila:
+            cambiadas.append((pos, clave, 'modificadas'))
+    parche['eliminadas'] = [clave for clave in estado['claves'] if clave in anteriores]
+
+    if not cambiadas and not parche['eliminadas'] and claves == estado['claves']:
+        return estado['version']  # Sin cambios: no hay versión nueva
+
+    # Solo se materializan las filas que cambiaron
+    posiciones = [pos for pos, _, _ in cambiadas]
+    if isinstance(datos, pd.DataFrame):
+        filas = _filas_canonicas(datos.iloc[posiciones]) if posiciones else []
+    else:
+        filas = [datos[pos] for pos in posiciones]
+    for (_, clave, tipo), fila in zip(cambiadas, filas):
+        if tipo == 'agregadas':
+            parche['agregadas'].append([clave, fila])
+        else:
+            parche['modificadas'][clave] = fila
+
+    # El orden solo se guarda si no es el que resulta de aplicar el parche
+    eliminadas = set(parche['eliminadas'])
+    esperado = [clave for clave in estado['claves'] if clave not in eliminadas]
+    esperado.extend(clave for clave, _ in parche['agregadas'])
+    if esperado != claves:
+        parche['orden'] = claves
+
+    numero = estado['version'] + 1
+    _escribir_json(_ruta_parche(nombre_archivo, numero), parche)
+    _guardar_estado(nombre_archivo, {**estado, 'version': numero, 'claves': claves, 'hashes': hashes})
+    _agregar_al_historial(nombre_archivo, parche, numero, len(claves))
+    return numero
+
+def registrar_anexo(nombre_archivo, fila):
+    """Registra como nueva versión una fila/elemento agregado al final de la tabla"""
+    estado = _cargar_estado(nombre_archivo)
+    if estado is None:
+        # Sin estado previo se registra la tabla completa contra el histórico
+        from herramientas import leer_archivo
+        datos = leer_archivo(nombre_archivo)
+        return registrar_version(nombre_archivo, datos) if datos is not None else None
+
+    if isinstance(fila, dict):
+        nueva = [fila]
+    else:
+        nueva = pd.DataFrame([list(fila)])
+    id_fila = _ids(nueva)[0]
+    prefijo = f"{id_fila}#"
+    clave = f"{id_fila}#{sum(1 for c in estado['claves'] if c.startswith(prefijo) and c[len(prefijo):].isdigit())}"
+    fila_canonica = _filas_canonicas(nueva)[0]
+
+    numero = estado['version'] + 1
+    parche = {'agregadas': [[clave, fila_canonica]], 'modificadas': {}, 'eliminadas': [], 'orden': None}
+    _escribir_json(_ruta_parche(nombre_archivo, numero), parche)
+    estado['claves'].append(clave)
+    _guardar_estado(nombre_archivo, {**estado, 'version': numero,
+                                     'hashes': np.append(estado['hashes'], hashes_filas(nueva))})
+    _agregar_al_historial(nombre_archivo, parche, numero, len(estado['claves']))
+    return numero
+
+# --- Consulta de versiones ---
+
+def listar_versiones(nombre_archivo):
+    """Historial de versiones registradas (lista vacía si no hay)"""
+    if _cargar_estado(nombre_archivo) is None:
+        return []
+    return _leer_json(os.path.join(_carpeta(nombre_archivo), "historial.json")) or []
+
+def reconstruir_version(nombre_archivo, numero):
+    """
+    Reconstruye la tabla tal como quedó en la versión indicada: DataFrame (CSV,
+    con el mismo formato que leer_archivo) o lista (JSON). None si no existe.
+    """
+    estado = _cargar_estado(nombre_archivo)
+    if estado is None or not 0 <= numero <= estado['version']:
+        return None
+    base = _leer_base(nombre_archivo)
+    if base is None:
+        return None
+
+    filas = dict(zip(_claves(_ids(base)), _filas_canonicas(base)))
+    for n in range(1, numero + 1):
+        parche = _leer_json(_ruta_parche(nombre_archivo, n))
+        if parche is None:
+            print(f"✗ Falta el parche de la versión {n} de {nombre_archivo}")
+            return None
+        for clave in parche['eliminadas']:
+            filas.pop(clave, None)
+        for clave, fila in parche['modificadas'].items():
+            filas[clave] = fila
+        for clave, fila in parche['agregadas']:
+            filas[clave] = fila
+        if parche['orden'] is not None:
+            filas = {clave: filas[clave] for clave in parche['orden']}
+
+    if obtener_formato_archivo(nombre_archivo) in FORMATOS_TABLA:
+        return _normalizar_como_lectura(pd.DataFrame(list(filas.values())))
+    return list(filas.values())
@@ -0,0 +1,189 @@
+"""
+Módulo de registro de escritura anticipada (WAL) de las tablas de database.
+
+Modificar o eliminar una fila no reescribe la tabla: el cambio se agrega como
+una línea JSON a metadatos/wal/<tabla>.wal (una línea por transacción, con
+una sola escritura y un fsync para todos sus cambios) y la tabla en memoria se
+actualiza en la caché. La tabla en disco se reescribe recién en un checkpoint,
+con guardar_archivo (archivo temporal + reemplazo atómico), que además vacía
+el WAL.
+
+Cada transacción además adelanta la fecha de modificación del archivo de la
+tabla y guarda la firma previa y la nueva: así la firma cambia con cada
+cambio confirmado y las cachés e índices de otros procesos se invalidan igual
+que si la tabla se hubiera reescrito. Al leer la tabla se reaplican las
+transacciones si forman una cadena que termina en la firma actual del archivo;
+una línea cortada por una caída se ignora. Si el archivo fue reemplazado
+(por ejemplo, el checkpoint llegó a escribirlo pero no a vaciar el WAL), la
+cadena ya no coincide y el WAL no aplica.
+"""
+import os
+import json
+import time
+from perezoso import modulo_perezoso
+np = modulo_perezoso("numpy")
+pd = modulo_perezoso("pandas")
+from herramientas import CARPETA_META, CARPETA_DATABASE, ruta_lectura, firma_archivo
+
+CARPETA_WAL = os.path.join(CARPETA_META, "wal")
+
+# Cantidad de transacciones en el WAL a partir de la cual se hace checkpoint
+MAX_TRANSACCIONES_WAL = 500
+
+def _ruta_wal(nombre_archivo):
+    return os.path.join(CARPETA_WAL, nombre_archivo + ".wal")
+
+def _valor_registro(valor):
+    """Valores de fila serializables: los nulos de pandas se guardan como null"""
+    if isinstance(valor, float) and np.isnan(valor):
+        return None
+    if valor is pd.NA or valor is pd.NaT:
+        return None
+    return valor
+
+def cambio_modificacion(posicion, fila):
+    """Cambio de WAL: la fila/elemento en esa posición pasa a tener estos valores"""
+    if isinstance(fila, dict):
+        return {'op': 'modificacion', 'pos': int(posicion), 'fila': dict(fila)}
+    return {'op': 'modificacion', 'pos': int(posicion), 'fila': [_valor_registro(v) for v in fila]}
+
+def cambio_baja(posicion):
+    """Cambio de WAL: se elimina la fila/elemento en esa posición"""
+    return {'op': 'baja', 'pos': int(posicion)}
+
+def registrar(nombre_archivo, cambios):
+    """
+    Confirma una transacción: todos sus cambios van en una sola línea, con una
+    escritura y un fsync. Después adelanta la fecha de modificación de la tabla
+    para que su firma refleje el cambio. Devuelve la cantidad de transacciones
+    en el WAL. Se debe llamar con el bloqueo de escritura de la tabla tomado.
+    """
+    ruta = ruta_lectura(nombre_archivo)
+    previa = firma_archivo(ruta) if ruta else None
+    if previa is None:
+        raise OSError(f"no existe la tabla {nombre_archivo}")
+    mtime = max(time.time_ns(), previa[0] + 1)
+    os.makedirs(CARPETA_WAL, exist_ok=True)
+    linea = json.dumps({'previa': list(previa), 'firma': [mtime, previa[1]], 'cambios': cambios},
+                       ensure_ascii=False) + '\n'
+    with open(_ruta_wal(nombre_archivo), 'a', encoding='utf-8') as f:
+        f.write(linea)
+        f.flush()
+        os.fsync(f.fileno())
+    os.utime(ruta, ns=(mtime, mtime))
+    return len(transacciones(nombre_archivo))
+
+def _leer_cadena(nombre_archivo):
+    """Transacciones completas del WAL, en orden (se corta en la primera línea dañada)"""
+    ruta_wal = _ruta_wal(nombre_archivo)
+    if not os.path.exists(ruta_wal):
+        return []
+    cadena = []
+    with open(ruta_wal, 'r', encoding='utf-8') as f:
+        for linea in f:
+            if not linea.endswith('\n'):
+                break  # Escritura cortada por una caída
+            try:
+                transaccion = json.loads(linea)
+            except ValueError:
+                break
+            if cadena and transaccion['previa'] != cadena[-1]['firma']:
+                break
+            cadena.append(transaccion)
+    return cadena
+
+def transacciones(nombre_archivo):
+    """Cambios de las transacciones confirmadas que aplican al archivo actual"""
+    ruta = ruta_lectura(nombre_archivo)
+    cadena = _leer_cadena(nombre_archivo)
+    if ruta is None or not cadena:
+        return []
+    firma = list(firma_archivo(ruta))
+    # La última transacción puede haberse confirmado sin llegar a cambiar la fecha
+    if firma not in (cadena[-1]['firma'], cadena[-1]['previa']):
+        return []
+    return [transaccion['cambios'] for transaccion in cadena]
+
+def hay_pendientes(nombre_archivo):
+    return os.path.exists(_ruta_wal(nombre_archivo))
+
+def aplicar(datos, cambios):
+    """Aplica los cambios de una transacción sobre los datos. Devuelve los datos"""
+    for cambio in cambios:
+        pos = cambio['pos']
+        if isinstance(datos, pd.DataFrame):
+            if cambio['op'] == 'modificacion':
+                datos.iloc[pos] = [np.nan if v is None else v for v in cambio['fila']]
+            elif cambio['op'] == 'baja':
+                datos = datos.drop(index=datos.index[pos]).reset_index(drop=True)
+        else:
+            if cambio['op'] == 'modificacion':
+                datos[pos] = cambio['fila']
+            elif cambio['op'] == 'baja':
+                datos.pop(pos)
+    return datos
+
+def aplicar_pendientes(nombre_archivo, datos):
+    """Reaplica sobre la tabla recién leída del disco las transacciones del WAL"""
+    for cambios in transacciones(nombre_archivo):
+        datos = aplicar(datos, cambios)
+    return datos
+
+def descartar(nombre_archivo):
+    """Vacía el WAL de la tabla (sus cambios ya están en el archivo)"""
+    ruta_wal = _ruta_wal(nombre_archivo)
+    if os.path.exists(ruta_wal):
+        os.remove(ruta_wal)
+
+def checkpoint(nombre_archivo):
+    """Escribe la tabla con los cambios del WAL (reemplazo atómico) y vacía el WAL"""
+    if not hay_pendientes(nombre_archivo):
+        return True
+    from herramientas import leer_archivo, guardar_archivo
+    from bloqueos import bloqueo_escritura, TablaBloqueada
+    try:
+        with bloqueo_escritura(nombre_archivo):
+            if not hay_pendientes(nombre_archivo):
+                return True  # Otro proceso ya hizo el checkpoint
+            if not transacciones(nombre_archivo):
+                descartar(nombre_archivo)
+                return True
+            datos = leer_archivo(nombre_archivo)
+            if datos is None:
+                return False
+            return guardar_archivo(datos, nombre_archivo) is not None
+    except TablaBloqueada as e:
+        print(f"✗ No se pudo hacer el checkpoint de {nombre_archivo}: {e}")
+        return False
+
+def tablas_pendientes():
+    if not os.path.exists(CARPETA_WAL):
+        return []
+    return sorted(f[:-len(".wal")] for f in os.listdir(CARPETA_WAL) if f.endswith(".wal"))
+
+def checkpoint_todos():
+    """Checkpoint de todas las tablas con cambios en el WAL"""
+    for nombre_archivo in tablas_pendientes():
+        checkpoint(nombre_archivo)
+
+def recuperar():
+    """
+    Al iniciar: borra temporales de escrituras interrumpidas y lleva a disco los
+    cambios confirmados en el WAL (solo se reaplica lo que quedó en el registro).
+    """
+    from bloqueos import bloqueo_escritura, TablaBloqueada
+    if os.path.exists(CARPETA_DATABASE):
+        for archivo in os.listdir(CARPETA_DATABASE):
+            if archivo.endswith(".tmp"):
+                # Con el bloqueo tomado: el temporal no es de una escritura de otro operador en curso
+                try:
+                    with bloqueo_escritura(archivo[:-len(".tmp")]):
+                        if os.path.exists(os.path.join(CARPETA_DATABASE, archivo)):
+                            os.remove(os.path.join(CARPETA_DATABASE, archivo))
+                except TablaBloqueada:
+                    pass  # Otro operador sigue escribiendo esa tabla
+    for nombre_archivo in tablas_pendientes():
+        cantidad = len(transacciones(nombre_archivo))
+        if cantidad:
+            print(f"✓ Recuperando {cantidad} cambios pendientes de {nombre_archivo}")
+        checkpoint(nombre_archivo)